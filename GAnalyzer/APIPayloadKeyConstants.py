@@ -35,6 +35,7 @@ GH_API_PR_BODY = "body"
 GH_API_PR_CR_DT = "created_at"
 GH_API_PR_CL_DT = "closed_at"
 GH_API_PR_MR_DT = "merged_at"
+GH_API_PR_UP_DT = "updated_at"
 # user that opened the PR
 GH_API_PR_USER = "user"
 GH_API_PR_USERNAME = "login"
@@ -45,6 +46,10 @@ GH_API_PR_BASE = "base"
 GH_API_PR_HEAD = "head"
 GH_API_PR_REF = "ref"
 GH_API_BRANCH_NAME = "name"
+GH_API_CMP_STATUS = "status"
+GH_API_CMP_TOTAL = "total_commits"
+GH_API_CMP_COMMITS = "commits"
+GH_API_COMMIT_PARENTS = "parents"
 
 GH_API_COMMIT_ADD = "additions"
 GH_API_COMMIT_DEL = "deletions"
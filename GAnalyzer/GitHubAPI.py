@@ -2,10 +2,14 @@
 Module to interact with the GitHub API
 """
 
-from urllib.request import Request, urlopen
-from urllib.parse import urlencode
+from urllib.request import Request
+from urllib.parse import urlencode, urlsplit, parse_qs
 from GTAnalyzer.settings import GH_API
 from commons.decorators import http_error_decorator
+from commons.http_client import urlopen
+from commons.paging import PageIterator
+from commons.ratelimit import RateLimitScheduler
+import functools
 import json
 import logging
 
@@ -18,22 +22,28 @@ def flight_check(token):
     endpoint = "{}{}".format(GH_API.get("BASE"),
                              GH_API.get("FLIGHT_CHECK"))
     request_obj = Request(endpoint, headers=get_headers(token))
-    response = urlopen(request_obj)
+    response = _urlopen(token, request_obj)
     return json.load(response)
 
 
 @http_error_decorator
 def get_repository_list(token, page,  _type=None, affiliation=None):
-    """get a list of repositories for a user"""
+    """get a page of the list of repositories for a user
+    Returns the repositories and the number of the last page"""
     endpoint = "{}{}".format(GH_API.get("BASE"),
                              GH_API.get("LIST_REPO").format(page))
+    params = {"per_page": GH_API.get("PER_PAGE")}
     if _type is not None:
-        endpoint += "type={}".format(_type)
+        params["type"] = _type
     if affiliation is not None:
-        endpoint += "affiliation={}".format(affiliation)
+        params["affiliation"] = affiliation
+    endpoint = _encode_get_request_url(endpoint, params)
     request_obj = Request(endpoint, headers=get_headers(token))
-    response = urlopen(request_obj)
-    return json.load(response)
+    response = _urlopen(token, request_obj, conditional=True)
+    last_url = _parse_link_header(response.getheader("Link")).get("last")
+    # no 'last' link when this is the only (or the last) page
+    last_page = page if last_url is None else int(parse_qs(urlsplit(last_url).query)["page"][0])
+    return json.load(response), last_page
 
 
 def get_headers(token):
@@ -54,7 +64,7 @@ def create_repository(token, payload):
                              GH_API.get("CREATE_REPO"))
     data = str(json.dumps(payload)).encode('utf-8')
     request_obj = Request(endpoint, headers=get_headers(token), data=data)
-    response = urlopen(request_obj)
+    response = _urlopen(token, request_obj)
     json.load(response)
 
 
@@ -70,7 +80,7 @@ def add_collaborator(token, owner, repo_name, collaborator_name):
     endpoint = "{}{}".format(GH_API.get("BASE"),
                              GH_API.get("ADD_COLLAB").format(owner, repo_name, collaborator_name))
     request_obj = Request(endpoint, headers=headers, method="PUT")
-    response = urlopen(request_obj)
+    response = _urlopen(token, request_obj)
     return json.load(response)
 
 
@@ -83,7 +93,7 @@ def enable_protections(token, owner, repo_name, branch="master"):
                              GH_API.get("BRANCH_PROTECT").format(owner, repo_name, branch))
     data = str(json.dumps(get_protection_config())).encode('utf-8')
     request_obj = Request(endpoint, headers=headers, method="PUT", data=data)
-    response = urlopen(request_obj)
+    response = _urlopen(token, request_obj)
     return json.load(response)
 
 
@@ -93,7 +103,7 @@ def delete_repository(token, owner, repo_name):
     endpoint = "{}{}".format(GH_API.get("BASE"),
                              GH_API.get("DELETE_REPO").format(owner, repo_name))
     request_obj = Request(endpoint, headers=get_headers(token), method="DELETE")
-    response = urlopen(request_obj)
+    response = _urlopen(token, request_obj)
     return json.load(response)
 
 
@@ -113,17 +123,15 @@ def get_protection_config():
 
 @http_error_decorator
 def get_commit(token, owner, repo_name, branch, start_date, end_date, author=None):
-    """Get commits for the given repository for the given date range """
+    """Get commits for the given repository for the given date range
+    Returns a PageIterator; later pages are fetched as they're reached"""
     endpoint = "{}{}".format(GH_API.get("BASE"),
                              GH_API.get("GET_COMMIT").format(owner, repo_name))
     params = {"sha": branch, "since": start_date, "until": end_date}
-    endpoint = _encode_get_request_url(endpoint, params)
     # Get commits only for a single author
     if author is not None:
-        endpoint += "&author={}".format(author)
-    request_obj = Request(endpoint, headers=get_headers(token))
-    response = urlopen(request_obj)
-    return json.load(response)
+        params["author"] = author
+    return _paginate(token, endpoint, params)
 
 
 @http_error_decorator
@@ -133,7 +141,7 @@ def get_single_commit(token, owner, repo_name, sha):
                              GH_API.get("GET_SINGLE_COMMIT")
                              .format(owner, repo_name, sha))
     request_obj = Request(endpoint, headers=get_headers(token))
-    response = urlopen(request_obj)
+    response = _urlopen(token, request_obj)
     return json.load(response)
 
 
@@ -144,40 +152,114 @@ def get_single_pr(token, owner, repo_name, pr_num):
                              GH_API.get("GET_SINGLE_PR")
                              .format(owner, repo_name, pr_num))
     request_obj = Request(endpoint, headers=get_headers(token))
-    response = urlopen(request_obj)
+    response = _urlopen(token, request_obj)
     return json.load(response)
 
 
 @http_error_decorator
 def get_collaborators(token, owner, repo_name):
-    """get a list of collaborators for a repositories"""
+    """get a list of collaborators for a repositories
+    Returns a PageIterator; later pages are fetched as they're reached"""
     endpoint = "{}{}".format(GH_API.get("BASE"),
                              GH_API.get("GET_COLLAB").format(owner, repo_name))
-    request_obj = Request(endpoint, headers=get_headers(token))
-    response = urlopen(request_obj)
-    return json.load(response)
+    return _paginate(token, endpoint)
 
 
 @http_error_decorator
-def get_pr(token, owner, repo_name, state="all"):
-    """Get PRs for the given repository"""
+def get_pr(token, owner, repo_name, state="all", sort="created", direction="desc"):
+    """Get PRs for the given repository
+    Returns a PageIterator; later pages are fetched as they're reached"""
     endpoint = "{}{}".format(GH_API.get("BASE"),
-                             GH_API.get("GET_PR").format(owner, repo_name, state))
+                             GH_API.get("GET_PR").format(owner, repo_name))
+    return _paginate(token, endpoint, {"state": state, "sort": sort, "direction": direction})
+
+
+@http_error_decorator
+def compare_commits(token, owner, repo_name, base, head):
+    """Compare two commits; lists up to 250 commits reachable from head but not from base"""
+    endpoint = "{}{}".format(GH_API.get("BASE"),
+                             GH_API.get("COMPARE")
+                             .format(owner, repo_name, base, head))
     request_obj = Request(endpoint, headers=get_headers(token))
-    response = urlopen(request_obj)
+    response = _urlopen(token, request_obj)
     return json.load(response)
 
 
 @http_error_decorator
 def get_branches(token, owner, repo_name):
-    """Get all branch names"""
+    """Get all branch names
+    Returns a PageIterator; later pages are fetched as they're reached"""
     endpoint = "{}{}".format(GH_API.get("BASE"),
                              GH_API.get("GET_BRANCHES").format(owner, repo_name))
+    return _paginate(token, endpoint)
+
+
+@http_error_decorator
+def get_rate_limit(token):
+    """Get the rate limit status for a token
+    Calling this doesn't count against the rate limit"""
+    endpoint = "{}{}".format(GH_API.get("BASE"),
+                             GH_API.get("RATE_LIMIT"))
     request_obj = Request(endpoint, headers=get_headers(token))
-    response = urlopen(request_obj)
+    response = _urlopen(token, request_obj)
     return json.load(response)
 
 
+@http_error_decorator
+def run_graphql_query(token, query, variables):
+    """Run a query against the GraphQL (v4) API"""
+    endpoint = "{}{}".format(GH_API.get("BASE"),
+                             GH_API.get("GRAPHQL"))
+    data = str(json.dumps({"query": query, "variables": variables})).encode('utf-8')
+    request_obj = Request(endpoint, headers=get_headers(token), data=data)
+    response = _urlopen(token, request_obj, "graphql")
+    result = json.load(response)
+    # GraphQL reports errors in the body of a 200 response
+    if result.get("errors"):
+        raise AssertionError(result["errors"])
+    return result["data"]
+
+
+def _paginate(token, endpoint, params=None):
+    """Fetch the first page of a listing and return a PageIterator over all pages"""
+    params = dict(params or {})
+    params["per_page"] = GH_API.get("PER_PAGE")
+    request_obj = Request(_encode_get_request_url(endpoint, params), headers=get_headers(token))
+    response = _urlopen(token, request_obj, conditional=True)
+    return PageIterator(json.load(response), _parse_link_header(response.getheader("Link")).get("next"),
+                        functools.partial(_get_page, token))
+
+
+@http_error_decorator
+def _get_page(token, url):
+    """Get a single page of a listing and the url of the next page"""
+    request_obj = Request(url, headers=get_headers(token))
+    response = _urlopen(token, request_obj, conditional=True)
+    return json.load(response), _parse_link_header(response.getheader("Link")).get("next")
+
+
+def _parse_link_header(header):
+    """Parse a 'Link' header into a dict of rel to url"""
+    links = {}
+    if not header:
+        return links
+    for link in header.split(","):
+        url, _sep, params = link.partition(";")
+        for param in params.split(";"):
+            key, _sep, value = param.strip().partition("=")
+            if key == "rel":
+                links[value.strip('"')] = url.strip().strip("<>")
+    return links
+
+
 def _encode_get_request_url(endpoint, params):
     encoded_params = urlencode(params, encoding="utf-8")
     return "{}{}".format(endpoint, encoded_params)
+
+
+def _urlopen(token, request_obj, resource="core", conditional=False):
+    """Open a request through the shared keep-alive client,
+    paced by the rate-limit budget of the token.
+    With conditional, the cached response is revalidated with its ETag"""
+    return RateLimitScheduler.get_instance().call(token, lambda: urlopen(request_obj, conditional),
+                                                  resource)
@@ -0,0 +1,124 @@
+"""
+Module to read commit data from a local clone or mirror of a GitHub repository
+"""
+
+import functools
+import os
+import re
+import subprocess
+from GTAnalyzer.settings import GH_ANALYSIS
+from commons.decorators import http_error_decorator
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+# each commit of the log starts with RECORD_SEP; its fields are separated by FIELD_SEP
+# and followed by its --numstat lines
+RECORD_SEP = "\x1e"
+FIELD_SEP = "\x1f"
+LOG_FORMAT = RECORD_SEP + FIELD_SEP.join(["%H", "%ct", "%cn", "%ce", "%B"]) + FIELD_SEP
+REMOTE_PREFIX = "refs/remotes/origin/"
+HEADS_PREFIX = "refs/heads/"
+# --diff-merges=first-parent, for a merge's line stats against its first parent as on GitHub;
+# -m --first-parent would also only walk first parents, leaving out commits GitHub lists
+GIT_MIN_VERSION = (2, 31)
+
+
+def get_git_version():
+    """Version of the git on PATH as a tuple of ints, None if there is no git"""
+    try:
+        output = subprocess.run(["git", "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                check=True, timeout=GH_ANALYSIS["LOCAL_GIT_TIMEOUT"]).stdout.decode()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"(\d+)\.(\d+)\.?(\d*)", output)
+    if match is None:
+        return None
+    return tuple(int(part or 0) for part in match.groups())
+
+
+@functools.lru_cache(maxsize=None)
+def has_supported_git():
+    """Whether the git on PATH can read commits for the local backend, checked once"""
+    version = get_git_version()
+    if version is not None and version[:2] >= GIT_MIN_VERSION:
+        return True
+    LOGGER.warning("The local backend needs git %s or later, found %s; repositories will be analysed "
+                   "over the API", ".".join(map(str, GIT_MIN_VERSION)),
+                   "no git" if version is None else ".".join(map(str, version)))
+    return False
+
+
+def find_repository(owner, repo_name):
+    """Path of the local copy of a repository under LOCAL_REPO_ROOT,
+    <owner>/<repo>.git (mirror) or <owner>/<repo> (clone). None if there isn't one"""
+    for name in (owner, repo_name):
+        if name in ("", ".", "..") or os.path.basename(name) != name:
+            return None
+    for owner_dir in dict.fromkeys((owner, owner.lower())):
+        for repo_dir in dict.fromkeys(("{}.git".format(repo_name), repo_name,
+                                       "{}.git".format(repo_name.lower()), repo_name.lower())):
+            path = os.path.join(GH_ANALYSIS["LOCAL_REPO_ROOT"], owner_dir, repo_dir)
+            if os.path.isdir(path):
+                return path
+    return None
+
+
+def _git(path, *args):
+    """Run a git command in the repository at path and return its output"""
+    try:
+        result = subprocess.run(["git", "-C", path] + list(args), stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, check=True,
+                                timeout=GH_ANALYSIS["LOCAL_GIT_TIMEOUT"])
+    except subprocess.CalledProcessError as cpe:
+        raise AssertionError(cpe.stderr.decode("utf-8", errors="replace").strip())
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+@http_error_decorator
+def fetch_repository(path):
+    """Bring the local copy up to date with GitHub"""
+    _git(path, "fetch", "--prune", "--quiet")
+
+
+@http_error_decorator
+def get_local_branches(path):
+    """Get branch names, as a dict of branch name to the ref to read it from.
+    Branches of origin in a clone, local branches in a mirror"""
+    refs = _git(path, "for-each-ref", "--format=%(refname)", HEADS_PREFIX, REMOTE_PREFIX).split()
+    branches = {ref[len(REMOTE_PREFIX):]: ref for ref in refs
+                if ref.startswith(REMOTE_PREFIX) and ref != REMOTE_PREFIX + "HEAD"}
+    if branches:
+        return branches
+    return {ref[len(HEADS_PREFIX):]: ref for ref in refs if ref.startswith(HEADS_PREFIX)}
+
+
+@http_error_decorator
+def get_local_commits(path, ref, start_date, end_date):
+    """Get commits of ref committed in the date range, newest first.
+    Line stats of a merge are against its first parent, as on GitHub"""
+    output = _git(path, "log", ref, "--since=" + start_date, "--until=" + end_date,
+                  "--no-color", "--numstat", "--diff-merges=first-parent",
+                  "--format=" + LOG_FORMAT, "--")
+    commits = []
+    for record in output.split(RECORD_SEP)[1:]:
+        sha, committed_at, name, email, message, numstat = record.split(FIELD_SEP)
+        additions = deletions = 0
+        for line in numstat.splitlines():
+            if not line:
+                continue
+            added, deleted, _path = line.split("\t", 2)
+            # binary files have no line counts
+            if added != "-":
+                additions += int(added)
+                deletions += int(deleted)
+        commits.append({
+            "sha": sha,
+            "committed_at": int(committed_at),
+            "committer_name": name,
+            "committer_email": email,
+            "message": message.rstrip("\n"),
+            "additions": additions,
+            "deletions": deletions
+        })
+    return commits
@@ -0,0 +1,111 @@
+""" GitHub GraphQL (v4) queries used by the GraphQL analysis backend"""
+
+# fields of a commit, matching what REST's commit listing + single commit return
+_COMMIT_HISTORY_FIELDS = """
+    pageInfo { hasNextPage endCursor }
+    nodes {
+        oid
+        url
+        message
+        committedDate
+        additions
+        deletions
+        comments { totalCount }
+        committer { name user { login } }
+    }
+"""
+
+# every branch along with the first page of its history in the date range
+GQL_BRANCHES_WITH_HISTORY = """
+query($owner: String!, $name: String!, $since: GitTimestamp!, $until: GitTimestamp!, $cursor: String) {
+    repository(owner: $owner, name: $name) {
+        refs(refPrefix: "refs/heads/", first: 100, after: $cursor) {
+            pageInfo { hasNextPage endCursor }
+            nodes {
+                name
+                target {
+                    ... on Commit {
+                        history(first: 100, since: $since, until: $until) {%s}
+                    }
+                }
+            }
+        }
+    }
+}
+""" % _COMMIT_HISTORY_FIELDS
+
+# further pages of the history of a single branch
+GQL_BRANCH_HISTORY = """
+query($owner: String!, $name: String!, $branch: String!, $since: GitTimestamp!,
+      $until: GitTimestamp!, $cursor: String) {
+    repository(owner: $owner, name: $name) {
+        ref(qualifiedName: $branch) {
+            target {
+                ... on Commit {
+                    history(first: 100, since: $since, until: $until, after: $cursor) {%s}
+                }
+            }
+        }
+    }
+}
+""" % _COMMIT_HISTORY_FIELDS
+
+GQL_COLLABORATORS = """
+query($owner: String!, $name: String!, $cursor: String) {
+    repository(owner: $owner, name: $name) {
+        collaborators(first: 100, after: $cursor) {
+            pageInfo { hasNextPage endCursor }
+            nodes { login }
+        }
+    }
+}
+"""
+
+# newest first, so paging can stop at the start of the date range
+GQL_PULL_REQUESTS = """
+query($owner: String!, $name: String!, $cursor: String) {
+    repository(owner: $owner, name: $name) {
+        pullRequests(first: 50, after: $cursor, orderBy: {field: CREATED_AT, direction: DESC}) {
+            pageInfo { hasNextPage endCursor }
+            nodes {
+                number
+                url
+                title
+                state
+                body
+                createdAt
+                closedAt
+                mergedAt
+                headRefName
+                baseRefName
+                author { login }
+                assignees(first: 20) { nodes { login } }
+                reviewRequests(first: 20) { nodes { requestedReviewer { ... on User { login } } } }
+                comments { totalCount }
+                reviews(first: 50) {
+                    pageInfo { hasNextPage endCursor }
+                    nodes { comments { totalCount } }
+                }
+                commits { totalCount }
+                additions
+                deletions
+                changedFiles
+            }
+        }
+    }
+}
+"""
+
+# further pages of the reviews of a single pull request
+GQL_PR_REVIEWS = """
+query($owner: String!, $name: String!, $number: Int!, $cursor: String) {
+    repository(owner: $owner, name: $name) {
+        pullRequest(number: $number) {
+            reviews(first: 100, after: $cursor) {
+                pageInfo { hasNextPage endCursor }
+                nodes { comments { totalCount } }
+            }
+        }
+    }
+}
+"""
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class GanalyzerConfig(AppConfig):
     name = 'GAnalyzer'
+
+    def ready(self):
+        from GTAnalyzer.settings import GH_ANALYSIS
+        from GAnalyzer.GitRepo import has_supported_git
+        # check the git version once at startup, not on the first analysis
+        if GH_ANALYSIS["BACKEND"] == "local":
+            has_supported_git()
@@ -1,13 +1,32 @@
 """
 Support Module for Views
 """
+import json
 import logging
+import re
+import sqlite3
+import threading
+import time
 from datetime import datetime, timezone
 from .GitHubAPI import *
 from commons.utils import *
+from commons.cache import TieredCache, TTLCache
+from commons.executors import bounded_map
+from commons.http_client import HTTPClient
+from commons.ratelimit import RateLimitScheduler, hash_token
+from GTAnalyzer.settings import GH_API, GH_ANALYSIS
 from .APIPayloadKeyConstants import *
+from .GraphQLQueries import *
+from .GitRepo import *
 
 LOGGER = logging.getLogger(__name__)
+# commit email GitHub gives users who keep their address private
+GH_NOREPLY_EMAIL = re.compile(r"^(?:\d+\+)?([^@]+)@users\.noreply\.github\.com$", re.IGNORECASE)
+# committer of commits made on github.com, like merged PRs
+GH_WEB_FLOW_EMAIL = "noreply@github.com"
+GH_WEB_FLOW_LOGIN = "web-flow"
+# seconds between prunes of the analysis history
+HISTORY_PRUNE_INTERVAL = 3600
 
 
 class FlightChecker(object):
@@ -32,35 +51,57 @@ class FlightChecker(object):
 
 class RepositoryListGetter(object):
     """Getter class for ListRepositoryView"""
+    # token hash to repository list
+    __cache = TTLCache(GH_API["REPO_LIST_CACHE_SIZE"], GH_API["REPO_LIST_CACHE_TTL"])
 
     @staticmethod
     def get_repository_list(data):
         token = FieldExtractor.get_auth_token(data, GH_TOKEN)
-        # paginated api
-        responses = []
-        page = 1
-        is_error = True
-        while True:
-            repo_list, _is_error = get_repository_list(token, page)
-            # empty response, invalid page
-            if _is_error or len(repo_list) == 0:
-                break
-            responses.extend(repo_list)
-            is_error &= _is_error
-            page += 1
-        return responses, is_error
+        cache_key = hash_token(token)
+        cached = RepositoryListGetter.__cache.get(cache_key)
+        if cached is not None:
+            return list(cached), False
+        # paginated api, the first page tells how many pages there are
+        first_page, is_error = get_repository_list(token, 1)
+        if is_error:
+            return {'error': first_page, 'saved': False}, True
+        repo_list, last_page = first_page
+        responses = list(repo_list)
+        # fetch the remaining pages concurrently
+        pages = bounded_map(lambda page: get_repository_list(token, page),
+                            range(2, last_page + 1), GH_API["REPO_LIST_WIDTH"])
+        for page, _is_error in pages:
+            if _is_error:
+                return {'error': page, 'saved': False}, True
+            responses.extend(page[0])
+        RepositoryListGetter.__cache.set(cache_key, responses)
+        return list(responses), False
 
 
-class DataExtractor(object):
-    """Extract 'data' from an HTTP Request"""
+class RateLimitGetter(object):
+    """Getter class for RateLimitView"""
 
     @staticmethod
-    def get_data_object(request):
-        return request.data
+    def get_rate_limit(data):
+        token = FieldExtractor.get_auth_token(data, GH_TOKEN)
+        scheduler = RateLimitScheduler.get_instance()
+        budget = scheduler.get_budget(token)
+        if budget["remaining"] is None:
+            # nothing has been sent with this token yet, ask GitHub
+            response, is_error = get_rate_limit(token)
+            if is_error:
+                return {'error': response, 'saved': False}, True
+            budget = scheduler.get_budget(token)
+        return budget, False
+
+
+class HTTPCacheStatsGetter(object):
+    """Getter class for HTTPCacheStatsView"""
 
     @staticmethod
-    def get_file_upload_object(request):
-        return request.FILES
+    def get_stats(data):
+        """Hit/miss counters of the conditional-request cache (GitHub and Taiga)"""
+        return HTTPClient.get_instance().conditional_cache.get_stats(), False
 
 
 class RepositoryCreator(object):
@@ -164,11 +205,175 @@ class RepositoryCreator(object):
         return flow_response
 
 
+class CommitStatsCache(object):
+    """A thread-safe singleton cache of commit stats keyed by (owner, repo, sha).
+    Stats never change for a given SHA, so entries never expire"""
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """Get the singleton instance"""
+        with CommitStatsCache.__instance_lock:
+            if CommitStatsCache.__instance is None:
+                CommitStatsCache.__instance = CommitStatsCache()
+            return CommitStatsCache.__instance
+
+    def __init__(self):
+        """Constructor"""
+        self._cache = TieredCache(GH_ANALYSIS["COMMIT_STATS_CACHE_DB"],
+                                  GH_ANALYSIS["COMMIT_STATS_CACHE_SIZE"], table="commit_stats")
+
+    @staticmethod
+    def _make_key(owner, repo_name, sha):
+        # owner and repository names are case-insensitive on GitHub
+        return "{}/{}@{}".format(owner.lower(), repo_name.lower(), sha)
+
+    def get_many(self, owner, repo_name, shas):
+        """Get cached stats as a dict of sha to stats"""
+        keys = {CommitStatsCache._make_key(owner, repo_name, sha): sha for sha in shas}
+        return {keys[key]: stats for key, stats in self._cache.get_many(keys.keys()).items()}
+
+    def set_many(self, owner, repo_name, stats):
+        """Cache a dict of sha to stats"""
+        self._cache.set_many({CommitStatsCache._make_key(owner, repo_name, sha): value
+                              for sha, value in stats.items()})
+
+
+class AnalysisHistoryStore(object):
+    """A thread-safe singleton store, in a sqlite file, of what earlier analyses fetched:
+    each commit once per repository; per branch, the analysed date range, its head SHA and
+    links to its commits in that range, in the order the API lists them; per PR, its stats
+    along with the updated_at they were fetched at. Branches and PRs no analysis has used
+    for HISTORY_TTL seconds are pruned, and so are commits no branch links to"""
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """Get the singleton instance"""
+        with AnalysisHistoryStore.__instance_lock:
+            if AnalysisHistoryStore.__instance is None:
+                AnalysisHistoryStore.__instance = AnalysisHistoryStore()
+            return AnalysisHistoryStore.__instance
+
+    def __init__(self):
+        """Constructor"""
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(GH_ANALYSIS["HISTORY_DB"], timeout=30, check_same_thread=False)
+        self._pruned_at = 0
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS history_commits "
+                               "(repo TEXT NOT NULL, sha TEXT NOT NULL, committed_at INTEGER NOT NULL, "
+                               "details TEXT NOT NULL, PRIMARY KEY (repo, sha))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS history_branches "
+                               "(repo TEXT NOT NULL, branch TEXT NOT NULL, since INTEGER NOT NULL, "
+                               "until INTEGER NOT NULL, head TEXT NOT NULL, used_at REAL NOT NULL, "
+                               "PRIMARY KEY (repo, branch))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS history_branch_commits "
+                               "(repo TEXT NOT NULL, branch TEXT NOT NULL, position INTEGER NOT NULL, "
+                               "sha TEXT NOT NULL, PRIMARY KEY (repo, branch, position))")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_branch_commits_sha "
+                               "ON history_branch_commits (repo, sha)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS history_prs "
+                               "(repo TEXT NOT NULL, number INTEGER NOT NULL, updated_at TEXT NOT NULL, "
+                               "stats TEXT NOT NULL, used_at REAL NOT NULL, PRIMARY KEY (repo, number))")
+
+    @staticmethod
+    def _make_repo(owner, repo_name):
+        # owner and repository names are case-insensitive on GitHub, branch names aren't
+        return "{}/{}".format(owner.lower(), repo_name.lower())
+
+    def get_branch(self, owner, repo_name, branch):
+        """Get the stored history of a branch, None if there is none"""
+        repo = AnalysisHistoryStore._make_repo(owner, repo_name)
+        with self._lock:
+            row = self._conn.execute("SELECT since, until, head FROM history_branches "
+                                     "WHERE repo = ? AND branch = ?", (repo, branch)).fetchone()
+            if row is None:
+                return None
+            commits = self._conn.execute("SELECT c.committed_at, c.details FROM history_branch_commits l "
+                                         "JOIN history_commits c ON c.repo = l.repo AND c.sha = l.sha "
+                                         "WHERE l.repo = ? AND l.branch = ? ORDER BY l.position",
+                                         (repo, branch)).fetchall()
+        return {"since": row[0], "until": row[1], "head": row[2],
+                "commits": [{"committed_at": committed_at, "commit": json.loads(details)}
+                            for committed_at, details in commits]}
+
+    def set_branch(self, owner, repo_name, branch, history):
+        """Store the history of a branch, replacing the one stored before"""
+        repo = AnalysisHistoryStore._make_repo(owner, repo_name)
+        commits = [(repo, entry["commit"]["sha"], entry["committed_at"],
+                    json.dumps(entry["commit"], separators=(",", ":"))) for entry in history["commits"]]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO history_commits (repo, sha, committed_at, details) "
+                                   "VALUES (?, ?, ?, ?)", commits)
+            self._conn.execute("INSERT OR REPLACE INTO history_branches "
+                               "(repo, branch, since, until, head, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                               (repo, branch, history["since"], history["until"], history["head"], time.time()))
+            self._conn.execute("DELETE FROM history_branch_commits WHERE repo = ? AND branch = ?", (repo, branch))
+            self._conn.executemany("INSERT INTO history_branch_commits (repo, branch, position, sha) "
+                                   "VALUES (?, ?, ?, ?)",
+                                   [(repo, branch, position, commit[1]) for position, commit in enumerate(commits)])
+            # commits that dropped out of the branch's range and aren't in any other branch's
+            self._conn.execute("DELETE FROM history_commits WHERE repo = ? AND sha NOT IN "
+                               "(SELECT sha FROM history_branch_commits WHERE repo = ?)", (repo, repo))
+            self._prune()
+
+    def get_pr_stats(self, owner, repo_name, pr_nums):
+        """Get stored PR stats as a dict of PR number to {"updated_at", "stats"}"""
+        repo = AnalysisHistoryStore._make_repo(owner, repo_name)
+        pr_nums = list(pr_nums)
+        found = {}
+        # stay below sqlite's bound-parameter limit
+        for i in range(0, len(pr_nums), 500):
+            chunk = pr_nums[i:i + 500]
+            with self._lock, self._conn:
+                rows = self._conn.execute("SELECT number, updated_at, stats FROM history_prs "
+                                          "WHERE repo = ? AND number IN ({})".format(",".join("?" * len(chunk))),
+                                          [repo] + chunk).fetchall()
+                # in use, so not to be pruned
+                self._conn.executemany("UPDATE history_prs SET used_at = ? WHERE repo = ? AND number = ?",
+                                       [(time.time(), repo, row[0]) for row in rows])
+            found.update((number, {"updated_at": updated_at, "stats": json.loads(stats)})
+                         for number, updated_at, stats in rows)
+        return found
+
+    def set_pr_stats(self, owner, repo_name, entries):
+        """Store a dict of PR number to {"updated_at", "stats"}"""
+        repo = AnalysisHistoryStore._make_repo(owner, repo_name)
+        rows = [(repo, pr_num, entry["updated_at"], json.dumps(entry["stats"], separators=(",", ":")),
+                 time.time()) for pr_num, entry in entries.items()]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO history_prs (repo, number, updated_at, stats, used_at) "
+                                   "VALUES (?, ?, ?, ?, ?)", rows)
+            self._prune()
+
+    def _prune(self):
+        """Drop the branches and PRs not used for HISTORY_TTL seconds and the commits
+        no branch links to any more, at most every HISTORY_PRUNE_INTERVAL seconds.
+        Caller holds the lock and a transaction"""
+        if time.monotonic() - self._pruned_at < HISTORY_PRUNE_INTERVAL and self._pruned_at:
+            return
+        self._pruned_at = time.monotonic()
+        expired_before = time.time() - GH_ANALYSIS["HISTORY_TTL"]
+        self._conn.execute("DELETE FROM history_branch_commits WHERE EXISTS (SELECT 1 FROM history_branches b "
+                           "WHERE b.repo = history_branch_commits.repo AND b.branch = history_branch_commits.branch "
+                           "AND b.used_at < ?)", (expired_before,))
+        self._conn.execute("DELETE FROM history_branches WHERE used_at < ?", (expired_before,))
+        self._conn.execute("DELETE FROM history_prs WHERE used_at < ?", (expired_before,))
+        self._conn.execute("DELETE FROM history_commits WHERE NOT EXISTS (SELECT 1 FROM history_branch_commits l "
+                           "WHERE l.repo = history_commits.repo AND l.sha = history_commits.sha)")
+
+
 class AnalysisPerformer(object):
     """Perform Analysis on GH repo"""
 
     @staticmethod
     def perform_analysis(repo, data):
+        if GH_ANALYSIS["BACKEND"] == "graphql":
+            return GraphQLAnalysisPerformer.perform_analysis(repo, data)
         token = FieldExtractor.get_auth_token(data, GH_TOKEN)
         username = FieldExtractor.get_username(data, GH_USERNAME)
         repo_name = repo.get(GH_ANALYSE_REPO_LIST_NAME)
@@ -176,6 +381,12 @@ class AnalysisPerformer(object):
                                             tz=timezone.utc)
         end_date = datetime.fromtimestamp(int(repo.get(GH_ANALYSE_REPO_LIST_ED_DT)),
                                           tz=timezone.utc)
+        if GH_ANALYSIS["BACKEND"] == "local":
+            path = find_repository(username, repo_name)
+            if path is not None and has_supported_git():
+                return LocalGitAnalysisPerformer.perform_analysis(repo, data, path)
+            if path is None:
+                LOGGER.info("No local copy of %s/%s, analysing over the API", username, repo_name)
 
         # Check for Taiga Integration
         integrate_tg = data[GH_ANALYSE_INTEGRATE_TAIGA]
@@ -195,17 +406,15 @@ class AnalysisPerformer(object):
             return c_names
         # complete data required for Analysis
         data_dump = {}
-        for branch in branches:
+        for branch, head in branches.items():
             data_dump[branch] = {name: {} for name in c_names}
             # Get commit data for each collaborator for the given date range
-            commit_data, is_error = AnalysisPerformer._get_commits(token, username, repo_name, branch,
-                                                                   start_date.isoformat(), end_date.isoformat())
+            commit_data, is_error = AnalysisPerformer._get_branch_commits(token, username, repo_name,
+                                                                          branch, head, start_date, end_date)
             if is_error:
                 for name in c_names:
                     data_dump[branch][name] = commit_data
             else:
-                commit_data = AnalysisPerformer._add_commit_stats(token,
-                                                                  username, repo_name, commit_data)
                 data_dump[branch] = AnalysisPerformer._merge(data_dump[branch],
                                                              commit_data, "commits")
         # Get PR data for each collaborator
@@ -225,18 +434,23 @@ class AnalysisPerformer(object):
         """Merge PR data into all data"""
         for branch, pr_details in c_pr.items():
             for author, pr in pr_details.items():
-                data_dump[branch][author].update(pr)
+                # newest PR first
+                data_dump[branch][author].update({key: sorted(pr_nums, reverse=True)
+                                                  for key, pr_nums in pr.items()})
         return data_dump
 
     @staticmethod
     def _get_branches(token, username, repo_name, step_name="Get Branches"):
-        """Get branches for the given repo"""
+        """Get branches for the given repo, as a dict of branch name to head SHA"""
         branches, is_error = get_branches(token, username, repo_name)
         if is_error:
             return {"repo_name": repo_name, "error": branches, "failed": True, "step": step_name}, \
                    is_error
-        # branch names
-        return [branch[GH_API_BRANCH_NAME] for branch in branches], is_error
+        names = {branch[GH_API_BRANCH_NAME]: branch[GH_API_COMMIT][GH_API_COMMIT_SHA] for branch in branches}
+        if branches.error is not None:
+            return {"repo_name": repo_name, "error": branches.error, "failed": True, "step": step_name}, \
+                   True
+        return names, is_error
 
     @staticmethod
     def _make_commit_details_object(data):
@@ -254,18 +468,141 @@ class AnalysisPerformer(object):
         }
 
     @staticmethod
-    def _get_commits(token, username, repo_name, branch, start_date, end_date, step_name="Get Commits"):
-        """get commits for a repository"""
+    def _get_committed_at(data):
+        """Commit timestamp of a commit, in seconds since the epoch"""
+        return int(DateTimeFormatter.parse_github_datetime(
+            data[GH_API_COMMIT][GH_API_COMMITTER][GH_API_COMMIT_DT]).timestamp())
+
+    @staticmethod
+    def _list_commits(token, username, repo_name, branch, start_date, end_date, step_name="Get Commits"):
+        """get commits of a branch as a list of (committed_at, commit details)"""
         commits_dump, is_error = get_commit(token, username, repo_name, branch,
                                             start_date, end_date)
         if is_error:
             return {"repo_name": repo_name, "error": commits_dump, "failed": True, "step": step_name}, \
                    is_error
+        commits = [(AnalysisPerformer._get_committed_at(commit_data),
+                    AnalysisPerformer._make_commit_details_object(commit_data))
+                   for commit_data in commits_dump]
+        if commits_dump.error is not None:
+            return {"repo_name": repo_name, "error": commits_dump.error, "failed": True, "step": step_name}, \
+                   True
+        return commits, is_error
+
+    @staticmethod
+    def _get_commits(token, username, repo_name, branch, start_date, end_date, step_name="Get Commits"):
+        """get commits for a repository"""
+        commits, is_error = AnalysisPerformer._list_commits(token, username, repo_name, branch,
+                                                            start_date, end_date, step_name)
+        if is_error:
+            return commits, is_error
+        return AnalysisPerformer._group_commits(commit for _committed_at, commit in commits), is_error
+
+    @staticmethod
+    def _group_commits(commits):
+        """author to list of commit details"""
         commit_map = defaultdict(list)
-        for commit_data in commits_dump:
-            commit_map[commit_data[GH_API_COMMITTER][GH_API_USERNAME]] \
-                .append(AnalysisPerformer._make_commit_details_object(commit_data))
-        return commit_map, is_error
+        for commit in commits:
+            commit_map[commit["author"]].append(commit)
+        return commit_map
+
+    @staticmethod
+    def _get_branch_commits(token, username, repo_name, branch, head, start_date, end_date):
+        """Commits of a branch in the date range, with stats, grouped by author.
+        With INCREMENTAL, only the commits the stored history of the branch
+        doesn't have are fetched, and the history is extended with them"""
+        if not GH_ANALYSIS["INCREMENTAL"]:
+            commit_data, is_error = AnalysisPerformer._get_commits(token, username, repo_name, branch,
+                                                                   start_date.isoformat(), end_date.isoformat())
+            if is_error:
+                return commit_data, is_error
+            return AnalysisPerformer._add_commit_stats(token, username, repo_name, commit_data), is_error
+        store = AnalysisHistoryStore.get_instance()
+        start, end = int(start_date.timestamp()), int(end_date.timestamp())
+        history, is_error = AnalysisPerformer._update_history(token, username, repo_name, branch, head,
+                                                              store.get_branch(username, repo_name, branch),
+                                                              start, end)
+        if is_error:
+            return history, is_error
+        store.set_branch(username, repo_name, branch, history)
+        # copies, in the order the commit listing has them, so the stored history isn't modified downstream
+        commits = [dict(entry["commit"]) for entry in history["commits"] if start <= entry["committed_at"] <= end]
+        # stats are kept once, in CommitStatsCache; these lookups are cache hits but for new commits
+        AnalysisPerformer._add_stats(token, username, repo_name, commits)
+        return AnalysisPerformer._group_commits(commits), is_error
+
+    @staticmethod
+    def _update_history(token, username, repo_name, branch, head, history, start, end):
+        """Bring the stored history of a branch up to date with its head and widen it
+        to cover start..end (seconds since the epoch). History is None if there isn't any.
+        Returns the new history: {"since", "until", "head", "commits"}, where commits
+        is a list of {"committed_at", "commit"} in the range since..until, newest first
+        in the order the commit listing has them"""
+        if history is not None and (history["since"] > end or history["until"] < start):
+            # not contiguous with the requested range
+            history = None
+        new_commits = []
+        if history is not None and history["head"] != head:
+            new_commits, is_error = AnalysisPerformer._get_new_commits(token, username, repo_name,
+                                                                       history["head"], head)
+            if is_error:
+                return new_commits, is_error
+            if new_commits is None:
+                # force-pushed, merged into or too far ahead; start over
+                history, new_commits = None, []
+        if history is None:
+            newer, older = [(start, end)], []
+            since, until = start, end
+        else:
+            newer = [(history["until"], end)] if end > history["until"] else []
+            older = [(start, history["since"])] if start < history["since"] else []
+            since, until = min(start, history["since"]), max(end, history["until"])
+        listed = {}
+        for range_start, range_end in newer + older:
+            fetched, is_error = AnalysisPerformer._list_commits(
+                token, username, repo_name, branch,
+                datetime.fromtimestamp(range_start, tz=timezone.utc).isoformat(),
+                datetime.fromtimestamp(range_end, tz=timezone.utc).isoformat())
+            if is_error:
+                return fetched, is_error
+            listed[(range_start, range_end)] = [{"committed_at": committed_at, "commit": commit}
+                                                for committed_at, commit in fetched]
+        # new commits are on top of the stored ones; the ranges' commits before and after them.
+        # A commit in more than one keeps its first place
+        entries = new_commits + [entry for key in newer for entry in listed[key]] + \
+            (history["commits"] if history is not None else []) + \
+            [entry for key in older for entry in listed[key]]
+        commits, seen = [], set()
+        for entry in entries:
+            if entry["commit"]["sha"] not in seen and since <= entry["committed_at"] <= until:
+                seen.add(entry["commit"]["sha"])
+                commits.append(entry)
+        return {"since": since, "until": until, "head": head, "commits": commits}, False
+
+    @staticmethod
+    def _get_new_commits(token, username, repo_name, base, head, step_name="Compare Commits"):
+        """Commits pushed on top of base up to head, newest first, as a list of
+        {"committed_at", "commit"}. None unless they form a single line of commits
+        from base: after a force-push or a merge, or too many to list in one request,
+        their order in the commit listing can't be told from the comparison"""
+        comparison, is_error = compare_commits(token, username, repo_name, base, head)
+        if is_error:
+            # base is gone if the branch was force-pushed
+            LOGGER.info("Comparing %s...%s of %s failed: %s", base, head, repo_name, comparison)
+            return None, False
+        commits = comparison[GH_API_CMP_COMMITS]
+        if comparison[GH_API_CMP_STATUS] != "ahead" or len(commits) < comparison[GH_API_CMP_TOTAL]:
+            return None, False
+        parent = base
+        for commit_data in commits:
+            if [data[GH_API_COMMIT_SHA] for data in commit_data[GH_API_COMMIT_PARENTS]] != [parent]:
+                return None, False
+            parent = commit_data[GH_API_COMMIT_SHA]
+        if parent != head:
+            return None, False
+        return [{"committed_at": AnalysisPerformer._get_committed_at(commit_data),
+                 "commit": AnalysisPerformer._make_commit_details_object(commit_data)}
+                for commit_data in reversed(commits)], False
 
     @staticmethod
     def _merge(data_dump, partial_data, key_name):
@@ -283,8 +620,11 @@ class AnalysisPerformer(object):
             return {"repo_name": repo_name, "error": collaborators, "failed": True, "step": step_name}, \
                    is_error
         # collaborator names
-        return [collaborator[GH_API_USERNAME] for collaborator in collaborators], \
-            is_error
+        names = [collaborator[GH_API_USERNAME] for collaborator in collaborators]
+        if collaborators.error is not None:
+            return {"repo_name": repo_name, "error": collaborators.error, "failed": True, "step": step_name}, \
+                   True
+        return names, is_error
 
     @staticmethod
     def _make_pr_details_object(data):
@@ -307,59 +647,96 @@ class AnalysisPerformer(object):
 
     @staticmethod
     def _get_pr(token, username, repo_name, c_names, branches, start_date, end_date, step_name="Get PR"):
-        """Get PRs for the given repository"""
-        pr_dump, is_error = get_pr(token, username, repo_name)
+        """Get PRs for the given repository created in the date range"""
+        # newest first, so paging can stop at the start of the date range
+        pr_dump, is_error = get_pr(token, username, repo_name, sort="created", direction="desc")
         if is_error:
             return {"repo_name": repo_name, "error": pr_dump, "failed": True, "step": step_name}, {}, \
                    is_error
         pr_details = {}
-        # branch to collaborator to PR
-        c_pr = {}
-        # c_pr = {branch: {name: {"assignee": [], "reviewer": [], "author": []}
-        #         for name in c_names} for branch in branches}
+        # PR number to updated_at, for the PRs whose stats are needed
+        updated_at = {}
+        c_pr = AnalysisPerformer._make_c_pr()
+        c_names = set(c_names)
+        branches = set(branches)
+        start_date = datetime.fromisoformat(start_date)
+        end_date = datetime.fromisoformat(end_date)
         for pr in pr_dump:
-            details = AnalysisPerformer._make_pr_details_object(pr)
-
+            created_at = DateTimeFormatter.parse_github_datetime(pr[GH_API_PR_CR_DT])
+            # the remaining PRs are all older, don't fetch their pages
+            if created_at < start_date:
+                break
             # Don't add PR if the PR date is not between the selected date range
-            if details.get("created") is None:
+            if created_at > end_date:
                 continue
-            else:
-                _date = datetime.fromisoformat(details.get("created"))
-                if datetime.fromisoformat(start_date) > _date > datetime.fromisoformat(end_date):
-                    continue
-
+            details = AnalysisPerformer._make_pr_details_object(pr)
             pr_num = details["number"]
-            head = details["head"]
-            base = details["base"]
-            c_pr = AnalysisPerformer._extract_assignee_reviewer(details.pop("assignees"),
-                                                                "assignee", pr_num, head, base,
-                                                                c_names, branches, c_pr)
-            c_pr = AnalysisPerformer._extract_assignee_reviewer(details.pop("requested_reviewers"),
-                                                                "reviewer", pr_num, head, base,
-                                                                c_names, branches, c_pr)
-            c_pr = AnalysisPerformer._extract_assignee_reviewer([{GH_API_PR_USERNAME: details["user"]}],
-                                                                "author", pr_num, head, base,
-                                                                c_names, branches, c_pr)
+            c_pr = AnalysisPerformer._map_pr_to_collaborators(details, c_names, branches, c_pr)
             if details["user"] in c_names:
-                single_pr = AnalysisPerformer._get_single_pr(token,
-                                                             username, repo_name, pr_num)
-                details.update(single_pr)
                 pr_details[pr_num] = details
+                updated_at[pr_num] = pr[GH_API_PR_UP_DT]
+        if pr_dump.error is not None:
+            return {"repo_name": repo_name, "error": pr_dump.error, "failed": True, "step": step_name}, {}, \
+                   True
+        pr_stats = AnalysisPerformer._get_pr_stats(token, username, repo_name, updated_at)
+        for pr_num, details in pr_details.items():
+            details.update(pr_stats[pr_num])
         return pr_details, c_pr, is_error
 
+    @staticmethod
+    def _get_pr_stats(token, username, repo_name, updated_at):
+        """Stats of PRs, given a dict of PR number to its updated_at.
+        With INCREMENTAL, stats stored for a PR that hasn't been updated since are reused"""
+        if not GH_ANALYSIS["INCREMENTAL"]:
+            return {pr_num: AnalysisPerformer._get_single_pr(token, username, repo_name, pr_num)
+                    for pr_num in updated_at}
+        store = AnalysisHistoryStore.get_instance()
+        pr_stats = {pr_num: entry["stats"]
+                    for pr_num, entry in store.get_pr_stats(username, repo_name, updated_at.keys()).items()
+                    if entry["updated_at"] == updated_at[pr_num]}
+        fetched = {pr_num: AnalysisPerformer._get_single_pr(token, username, repo_name, pr_num)
+                   for pr_num in updated_at if pr_num not in pr_stats}
+        # don't store failed lookups
+        store.set_pr_stats(username, repo_name, {pr_num: {"updated_at": updated_at[pr_num], "stats": stats}
+                                                 for pr_num, stats in fetched.items()
+                                                 if stats["num_commits"] is not None})
+        pr_stats.update(fetched)
+        return pr_stats
+
+    @staticmethod
+    def _make_c_pr():
+        """branch to collaborator to "assignee"/"reviewer"/"author" to set of PR numbers"""
+        return defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
+
+    @staticmethod
+    def _map_pr_to_collaborators(details, c_names, branches, c_pr):
+        """Add the PR to the assignees, reviewers and author of the PR,
+        for both its head and base branch"""
+        pr_num = details["number"]
+        head = details["head"]
+        base = details["base"]
+        c_pr = AnalysisPerformer._extract_assignee_reviewer(details.pop("assignees"),
+                                                            "assignee", pr_num, head, base,
+                                                            c_names, branches, c_pr)
+        c_pr = AnalysisPerformer._extract_assignee_reviewer(details.pop("requested_reviewers"),
+                                                            "reviewer", pr_num, head, base,
+                                                            c_names, branches, c_pr)
+        c_pr = AnalysisPerformer._extract_assignee_reviewer([{GH_API_PR_USERNAME: details["user"]}],
+                                                            "author", pr_num, head, base,
+                                                            c_names, branches, c_pr)
+        return c_pr
+
     @staticmethod
     def _extract_assignee_reviewer(data, insert_key, pr_num, head, base,
                                    c_names, branches, c_pr):
+        """Add pr_num under insert_key for each collaborator in data, on the head and base branch.
+        c_names and branches are sets"""
         for name in data:
             author = name[GH_API_PR_USERNAME]
             if author in c_names:
-                for branch in [head, base]:
+                for branch in (head, base):
                     if branch in branches:
-                        try:
-                            _val = c_pr[branch][author][insert_key]
-                        except KeyError:
-                            c_pr[branch] = {author: defaultdict(list)}
-                        c_pr[branch][author][insert_key].append(pr_num)
+                        c_pr[branch][author][insert_key].add(pr_num)
         return c_pr
 
     @staticmethod
@@ -375,14 +752,21 @@ class AnalysisPerformer(object):
             "num_files": None
         }
         if not is_error:
-            details["num_comments"] = pr_data[GH_API_PR_COMMENTS]
-            details["num_rev_comments"] = pr_data[GH_API_PR_REV_COMMENTS]
-            details["num_commits"] = pr_data[GH_API_PR_COMMITS]
-            details["num_add"] = pr_data[GH_API_PR_ADD]
-            details["num_del"] = pr_data[GH_API_PR_DEL]
-            details["num_files"] = pr_data[GH_API_PR_FILES]
+            details = AnalysisPerformer._make_pr_stats_object(pr_data)
         return details
 
+    @staticmethod
+    def _make_pr_stats_object(data):
+        """Create a dictionary with the stats of a single PR"""
+        return {
+            "num_comments": data[GH_API_PR_COMMENTS],
+            "num_rev_comments": data[GH_API_PR_REV_COMMENTS],
+            "num_commits": data[GH_API_PR_COMMITS],
+            "num_add": data[GH_API_PR_ADD],
+            "num_del": data[GH_API_PR_DEL],
+            "num_files": data[GH_API_PR_FILES]
+        }
+
     @staticmethod
     def _get_single_commit(token, username, repo_name, sha):
         """Get a single commit"""
@@ -397,11 +781,353 @@ class AnalysisPerformer(object):
 
     @staticmethod
     def _add_commit_stats(token, username, repo_name, commit_data):
-        """Add commit stats to the commit object"""
-        for _author, commit_list in commit_data.items():
-            for commit in commit_list:
-                # in-place modification
-                commit[GH_API_COMMIT_STATS] = AnalysisPerformer._get_single_commit(
-                    token, username, repo_name, commit["sha"]
-                )
+        """Add commit stats to the commit object
+        Cached stats are used where available, the rest are fetched
+        concurrently, at most COMMIT_STATS_WIDTH at a time"""
+        AnalysisPerformer._add_stats(token, username, repo_name,
+                                     [commit for commit_list in commit_data.values() for commit in commit_list])
         return commit_data
+
+    @staticmethod
+    def _add_stats(token, username, repo_name, commits):
+        """Add stats to each commit in a list of commit details, in place"""
+        cache = CommitStatsCache.get_instance()
+        stats = cache.get_many(username, repo_name, [commit["sha"] for commit in commits])
+        missing = [sha for sha in dict.fromkeys(commit["sha"] for commit in commits)
+                   if sha not in stats]
+        fetched = dict(zip(missing, bounded_map(lambda sha: AnalysisPerformer._get_single_commit(
+            token, username, repo_name, sha), missing, GH_ANALYSIS["COMMIT_STATS_WIDTH"])))
+        # don't cache failed lookups
+        cache.set_many(username, repo_name, {sha: commit_stats for sha, commit_stats in fetched.items()
+                                             if commit_stats[GH_API_COMMIT_TOT] is not None})
+        stats.update(fetched)
+        for commit in commits:
+            # in-place modification
+            commit[GH_API_COMMIT_STATS] = dict(stats[commit["sha"]])
+
+
+class LocalGitAnalysisPerformer(object):
+    """Perform Analysis on GH repo with commits read from a local clone or mirror
+    Builds the same data_dump as AnalysisPerformer; commits and their stats
+    cost no requests, collaborators and PRs still come from the REST API.
+    Git only has committer emails: commits whose committer no login is found for
+    are reported in "unmatched_committers", per branch, under the email"""
+
+    @staticmethod
+    def perform_analysis(repo, data, path):
+        token = FieldExtractor.get_auth_token(data, GH_TOKEN)
+        username = FieldExtractor.get_username(data, GH_USERNAME)
+        repo_name = repo.get(GH_ANALYSE_REPO_LIST_NAME)
+        start_date = datetime.fromtimestamp(int(repo.get(GH_ANALYSE_REPO_LIST_ST_DT)),
+                                            tz=timezone.utc)
+        end_date = datetime.fromtimestamp(int(repo.get(GH_ANALYSE_REPO_LIST_ED_DT)),
+                                          tz=timezone.utc)
+
+        if GH_ANALYSIS["LOCAL_FETCH"]:
+            fetched, is_error = fetch_repository(path)
+            if is_error:
+                return {"repo_name": repo_name, "error": fetched, "failed": True, "step": "Fetch Repository"}
+        # Get a list of branches for this repo
+        branches, is_error = get_local_branches(path)
+        if is_error:
+            return {"repo_name": repo_name, "error": branches, "failed": True, "step": "Get Branches"}
+        # Get a list of collaborators for this repo
+        c_names, is_error = AnalysisPerformer._get_collaborators(token, username, repo_name)
+        if is_error:
+            return c_names
+        logins = {name.lower(): name for name in c_names}
+        # complete data required for Analysis
+        data_dump = {}
+        # branch to committer email to commits, for committers no GitHub login was found for
+        unmatched = {}
+        for branch, ref in branches.items():
+            data_dump[branch] = {name: {} for name in c_names}
+            # Get commit data for each collaborator for the given date range
+            commit_data, is_error = LocalGitAnalysisPerformer._get_commits(path, username, repo_name, ref,
+                                                                           start_date.isoformat(),
+                                                                           end_date.isoformat(), logins)
+            if is_error:
+                for name in c_names:
+                    data_dump[branch][name] = commit_data
+            else:
+                data_dump[branch] = AnalysisPerformer._merge(data_dump[branch],
+                                                             commit_data, "commits")
+                # logins can't contain "@"
+                branch_unmatched = {author: commits for author, commits in commit_data.items() if "@" in author}
+                if branch_unmatched:
+                    unmatched[branch] = branch_unmatched
+        # Get PR data for each collaborator
+        # c_pr: collaborator to PR number mapping
+        pr_details, c_pr, is_error = AnalysisPerformer._get_pr(token, username, repo_name, c_names,
+                                                               branches, start_date.isoformat(), end_date.isoformat())
+        data_dump["pr_details"] = {}
+        if not is_error:
+            data_dump = AnalysisPerformer._merge_pr_data(data_dump, c_pr)
+            data_dump["pr_details"] = pr_details
+        data_dump["unmatched_committers"] = unmatched
+        data_dump["start_date"] = start_date.strftime("%Y-%m-%d")
+        data_dump["end_date"] = end_date.strftime("%Y-%m-%d")
+        return data_dump
+
+    @staticmethod
+    def _get_login(email, name, logins):
+        """GitHub login of a committer, None if it can't be told.
+        logins maps lowercased collaborator logins to the logins"""
+        match = GH_NOREPLY_EMAIL.match(email)
+        if match is not None:
+            return logins.get(match.group(1).lower(), match.group(1))
+        if email.lower() == GH_WEB_FLOW_EMAIL:
+            return GH_WEB_FLOW_LOGIN
+        # collaborators committing under their login or as <login>@...
+        for candidate in (name, email.split("@", 1)[0]):
+            login = logins.get(candidate.lower())
+            if login is not None:
+                return login
+        return None
+
+    @staticmethod
+    def _make_commit_details_object(data, username, repo_name, logins):
+        """make a dict object with required commit details, stats included"""
+        return {
+            # committers without a known login are grouped under their email
+            "author": LocalGitAnalysisPerformer._get_login(data["committer_email"], data["committer_name"],
+                                                          logins) or data["committer_email"].lower(),
+            "author_display": data["committer_name"],
+            "message": data["message"],
+            # commit comments only exist on GitHub
+            "comment_count": None,
+            "sha": data["sha"],
+            "url": "{}/{}/{}/commit/{}".format(GH_API.get("WEB_BASE"), username, repo_name, data["sha"]),
+            "date": datetime.fromtimestamp(data["committed_at"], tz=timezone.utc).strftime("%Y-%m-%d"),
+            GH_API_COMMIT_STATS: {
+                GH_API_COMMIT_ADD: data["additions"],
+                GH_API_COMMIT_DEL: data["deletions"],
+                GH_API_COMMIT_TOT: data["additions"] + data["deletions"]
+            }
+        }
+
+    @staticmethod
+    def _get_commits(path, username, repo_name, ref, start_date, end_date, logins, step_name="Get Commits"):
+        """get commits of a branch, with stats, from the local repository"""
+        commits, is_error = get_local_commits(path, ref, start_date, end_date)
+        if is_error:
+            return {"repo_name": repo_name, "error": commits, "failed": True, "step": step_name}, \
+                   is_error
+        return AnalysisPerformer._group_commits(
+            LocalGitAnalysisPerformer._make_commit_details_object(commit, username, repo_name, logins)
+            for commit in commits), is_error
+
+
+class GraphQLAnalysisPerformer(object):
+    """Perform Analysis on GH repo using batched GraphQL (v4) queries
+    Builds the same data_dump as AnalysisPerformer with a handful of requests"""
+
+    @staticmethod
+    def perform_analysis(repo, data):
+        token = FieldExtractor.get_auth_token(data, GH_TOKEN)
+        username = FieldExtractor.get_username(data, GH_USERNAME)
+        repo_name = repo.get(GH_ANALYSE_REPO_LIST_NAME)
+        start_date = datetime.fromtimestamp(int(repo.get(GH_ANALYSE_REPO_LIST_ST_DT)),
+                                            tz=timezone.utc)
+        end_date = datetime.fromtimestamp(int(repo.get(GH_ANALYSE_REPO_LIST_ED_DT)),
+                                          tz=timezone.utc)
+
+        # Get branches along with their commits in the date range
+        branch_commits, is_error = GraphQLAnalysisPerformer._get_branch_commits(
+            token, username, repo_name, start_date.isoformat(), end_date.isoformat())
+        if is_error:
+            return branch_commits
+        # Get a list of collaborators for this repo
+        c_names, is_error = GraphQLAnalysisPerformer._get_collaborators(token, username, repo_name)
+        if is_error:
+            return c_names
+        # complete data required for Analysis
+        data_dump = {}
+        for branch, (commit_data, is_error) in branch_commits.items():
+            data_dump[branch] = {name: {} for name in c_names}
+            if is_error:
+                for name in c_names:
+                    data_dump[branch][name] = commit_data
+            else:
+                data_dump[branch] = AnalysisPerformer._merge(data_dump[branch],
+                                                             commit_data, "commits")
+        # Get PR data for each collaborator
+        # c_pr: collaborator to PR number mapping
+        pr_details, c_pr, is_error = GraphQLAnalysisPerformer._get_pr(token, username, repo_name, c_names,
+                                                                      list(branch_commits), start_date, end_date)
+        data_dump["pr_details"] = {}
+        if not is_error:
+            data_dump = AnalysisPerformer._merge_pr_data(data_dump, c_pr)
+            data_dump["pr_details"] = pr_details
+        data_dump["start_date"] = start_date.strftime("%Y-%m-%d")
+        data_dump["end_date"] = end_date.strftime("%Y-%m-%d")
+        return data_dump
+
+    @staticmethod
+    def _query_all(token, query, variables, get_connection, cursor=None, stop=None):
+        """Run a paged query and collect the nodes of every page
+        get_connection picks the paged connection out of a page of results.
+        Paging stops early once stop(node) is true for the last node of a page"""
+        nodes = []
+        while True:
+            result, is_error = run_graphql_query(token, query, dict(variables, cursor=cursor))
+            if is_error:
+                return result, is_error
+            connection = get_connection(result)
+            nodes.extend(connection["nodes"])
+            page_info = connection["pageInfo"]
+            if not page_info["hasNextPage"] or \
+                    (stop is not None and nodes and stop(nodes[-1])):
+                return nodes, False
+            cursor = page_info["endCursor"]
+
+    @staticmethod
+    def _make_commit_details_object(data):
+        """make a dict object with required commit details, including stats"""
+        committer = data[GH_API_COMMITTER]
+        return {
+            "author": committer["user"][GH_API_USERNAME] if committer["user"] else None,
+            "author_display": committer[GH_API_AUTHOR_DISPLAY],
+            "message": data[GH_API_COMMIT_MESSAGE],
+            "comment_count": data["comments"]["totalCount"],
+            "sha": data["oid"],
+            "url": data["url"],
+            "date": DateTimeFormatter.format_github_date_to_str(data["committedDate"]),
+            GH_API_COMMIT_STATS: {
+                GH_API_COMMIT_ADD: data[GH_API_COMMIT_ADD],
+                GH_API_COMMIT_DEL: data[GH_API_COMMIT_DEL],
+                GH_API_COMMIT_TOT: data[GH_API_COMMIT_ADD] + data[GH_API_COMMIT_DEL]
+            }
+        }
+
+    @staticmethod
+    def _get_branch_commits(token, username, repo_name, start_date, end_date,
+                            step_name="Get Branches"):
+        """Get every branch with its commits, grouped by committer
+        Returns a dict of branch to (commit_map, is_error)"""
+        variables = {"owner": username, "name": repo_name, "since": start_date, "until": end_date}
+        refs, is_error = GraphQLAnalysisPerformer._query_all(
+            token, GQL_BRANCHES_WITH_HISTORY, variables,
+            lambda result: result["repository"]["refs"])
+        if is_error:
+            return {"repo_name": repo_name, "error": refs, "failed": True, "step": step_name}, \
+                   is_error
+        branch_commits = {}
+        stats = {}
+        for ref in refs:
+            branch = ref[GH_API_BRANCH_NAME]
+            history = ref["target"]["history"]
+            commits = history["nodes"]
+            # branches with more than one page of commits in range
+            if history["pageInfo"]["hasNextPage"]:
+                more, is_error = GraphQLAnalysisPerformer._query_all(
+                    token, GQL_BRANCH_HISTORY, dict(variables, branch="refs/heads/{}".format(branch)),
+                    lambda result: result["repository"]["ref"]["target"]["history"],
+                    cursor=history["pageInfo"]["endCursor"])
+                if is_error:
+                    branch_commits[branch] = ({"repo_name": repo_name, "error": more, "failed": True,
+                                               "step": "Get Commits"}, is_error)
+                    continue
+                commits = commits + more
+            commit_map = defaultdict(list)
+            for commit in commits:
+                details = GraphQLAnalysisPerformer._make_commit_details_object(commit)
+                stats[details["sha"]] = details[GH_API_COMMIT_STATS]
+                commit_map[details["author"]].append(details)
+            branch_commits[branch] = (commit_map, False)
+        # the stats came for free, keep them for the REST backend
+        CommitStatsCache.get_instance().set_many(username, repo_name, stats)
+        return branch_commits, False
+
+    @staticmethod
+    def _get_collaborators(token, username, repo_name, step_name="Get Collaborators"):
+        """get collaborators for a repository"""
+        collaborators, is_error = GraphQLAnalysisPerformer._query_all(
+            token, GQL_COLLABORATORS, {"owner": username, "name": repo_name},
+            lambda result: result["repository"]["collaborators"])
+        if is_error:
+            return {"repo_name": repo_name, "error": collaborators, "failed": True, "step": step_name}, \
+                   is_error
+        # collaborator names
+        return [collaborator[GH_API_USERNAME] for collaborator in collaborators], is_error
+
+    @staticmethod
+    def _make_rest_pr_object(data, review_comments):
+        """Reshape a GraphQL pull request into the fields the REST API returns"""
+        author = data[GH_API_AUTHOR]
+        return {
+            GH_API_PR_URL: data["url"],
+            GH_API_PR_TITLE: data[GH_API_PR_TITLE],
+            GH_API_PR_STATE: "open" if data[GH_API_PR_STATE] == "OPEN" else "closed",
+            GH_API_PR_NUM: data[GH_API_PR_NUM],
+            GH_API_PR_BODY: data[GH_API_PR_BODY],
+            GH_API_PR_CR_DT: data["createdAt"],
+            GH_API_PR_CL_DT: data["closedAt"],
+            GH_API_PR_MR_DT: data["mergedAt"],
+            GH_API_PR_ASG: data[GH_API_PR_ASG]["nodes"],
+            # team review requests have no login
+            GH_API_PR_REV: [request["requestedReviewer"] for request in data["reviewRequests"]["nodes"]
+                            if (request["requestedReviewer"] or {}).get(GH_API_PR_USERNAME)],
+            GH_API_PR_HEAD: {GH_API_PR_REF: data["headRefName"]},
+            GH_API_PR_BASE: {GH_API_PR_REF: data["baseRefName"]},
+            GH_API_PR_USER: {GH_API_PR_USERNAME: author[GH_API_PR_USERNAME] if author else None},
+            GH_API_PR_COMMENTS: data[GH_API_PR_COMMENTS]["totalCount"],
+            GH_API_PR_REV_COMMENTS: review_comments,
+            GH_API_PR_COMMITS: data[GH_API_PR_COMMITS]["totalCount"],
+            GH_API_PR_ADD: data[GH_API_PR_ADD],
+            GH_API_PR_DEL: data[GH_API_PR_DEL],
+            GH_API_PR_FILES: data["changedFiles"]
+        }
+
+    @staticmethod
+    def _parse_date(date_str):
+        """Parse a GraphQL DateTime"""
+        return DateTimeFormatter.parse_github_datetime(date_str)
+
+    @staticmethod
+    def _get_pr(token, username, repo_name, c_names, branches, start_date, end_date, step_name="Get PR"):
+        """Get PRs created in the date range, with their stats"""
+        # newest first, no need to page past the start of the date range
+        prs, is_error = GraphQLAnalysisPerformer._query_all(
+            token, GQL_PULL_REQUESTS, {"owner": username, "name": repo_name},
+            lambda result: result["repository"]["pullRequests"],
+            stop=lambda pr: GraphQLAnalysisPerformer._parse_date(pr["createdAt"]) < start_date)
+        if is_error:
+            return {"repo_name": repo_name, "error": prs, "failed": True, "step": step_name}, {}, \
+                   is_error
+        pr_details = {}
+        c_pr = AnalysisPerformer._make_c_pr()
+        c_names = set(c_names)
+        branches = set(branches)
+        for pr in prs:
+            if not start_date <= GraphQLAnalysisPerformer._parse_date(pr["createdAt"]) <= end_date:
+                continue
+            # only the PRs of collaborators keep their stats, don't page the reviews of others
+            review_comments = None
+            if (pr[GH_API_AUTHOR] or {}).get(GH_API_PR_USERNAME) in c_names:
+                review_comments = GraphQLAnalysisPerformer._count_review_comments(token, username, repo_name, pr)
+            pr = GraphQLAnalysisPerformer._make_rest_pr_object(pr, review_comments)
+            details = AnalysisPerformer._make_pr_details_object(pr)
+            c_pr = AnalysisPerformer._map_pr_to_collaborators(details, c_names, branches, c_pr)
+            if details["user"] in c_names:
+                details.update(AnalysisPerformer._make_pr_stats_object(pr))
+                pr_details[details["number"]] = details
+        return pr_details, c_pr, is_error
+
+    @staticmethod
+    def _count_review_comments(token, username, repo_name, pr):
+        """Review comments of a PR, paging through its reviews past the first page.
+        None if the remaining reviews couldn't be fetched"""
+        reviews = pr["reviews"]
+        count = sum(review[GH_API_PR_COMMENTS]["totalCount"] for review in reviews["nodes"])
+        if not reviews["pageInfo"]["hasNextPage"]:
+            return count
+        more, is_error = GraphQLAnalysisPerformer._query_all(
+            token, GQL_PR_REVIEWS, {"owner": username, "name": repo_name, "number": pr[GH_API_PR_NUM]},
+            lambda result: result["repository"]["pullRequest"]["reviews"],
+            cursor=reviews["pageInfo"]["endCursor"])
+        if is_error:
+            LOGGER.warning("Reviews of PR #%s of %s past the first page not counted: %s",
+                           pr[GH_API_PR_NUM], repo_name, more)
+            return None
+        return count + sum(review[GH_API_PR_COMMENTS]["totalCount"] for review in more)
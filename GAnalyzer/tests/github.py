@@ -0,0 +1,396 @@
+"""A fixture repository and a local stand-in for the GitHub REST and GraphQL APIs serving it"""
+
+import hashlib
+import random
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from unittest import mock
+from urllib.parse import urlencode
+
+from GTAnalyzer.settings import GH_API, GH_ANALYSIS
+from GAnalyzer import GraphQLQueries
+from GAnalyzer.dataapi import AnalysisPerformer, AnalysisHistoryStore, CommitStatsCache
+from commons.tests.server import StandInServer
+
+EPOCH = datetime(2020, 1, 6, tzinfo=timezone.utc)
+
+
+def to_github_time(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def make_sha(*parts):
+    return hashlib.sha1("/".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class FixtureRepository(object):
+    """An in-memory GitHub repository: branches of commits, collaborators and PRs.
+    Generated from a seed, so every run sees the same repository"""
+
+    def __init__(self, owner="octo", name="course-project", seed=7):
+        self.owner = owner
+        self.name = name
+        self.collaborators = ["alice", "bob", "carol"]
+        self.commits = {}
+        # branch name to list of SHAs, oldest first
+        self.branches = OrderedDict()
+        self.prs = []
+        self._rng = random.Random(seed)
+        committers = self.collaborators + ["outsider", "web-flow"]
+        # master: a commit every 12 hours from 10 days before EPOCH
+        self.branches["master"] = []
+        for i in range(180):
+            self.push("master", self._rng.choice(committers), EPOCH + timedelta(days=-10, hours=12 * i), i)
+        self.branches["dev"] = self.branches["master"][:100]
+        for i in range(30):
+            self.push("dev", self._rng.choice(committers), EPOCH + timedelta(days=40, hours=7 * i), i)
+        self.branches["feature/login"] = self.branches["master"][:20]
+        for i in range(5):
+            self.push("feature/login", "carol", EPOCH + timedelta(days=1, hours=3 * i), i, salt="feature")
+        for number in range(1, 71):
+            self.add_pr(number, EPOCH + timedelta(days=number - 5, hours=number % 7))
+        # a busy PR, with more reviews than one GraphQL page holds
+        self.prs[9]["user"] = "alice"
+        self.prs[9]["reviews"] = [1] * 60 + [2] * 60
+
+    def add_commit(self, login, moment, salt, index, parents=()):
+        sha = make_sha(self.owner, self.name, salt, index, login)
+        self.commits[sha] = {
+            "sha": sha,
+            "parents": list(parents),
+            "login": login,
+            "name": login.title(),
+            "message": "{} change {}".format(salt, index),
+            "date": moment,
+            "additions": self._rng.randint(0, 200),
+            "deletions": self._rng.randint(0, 80),
+            "comment_count": self._rng.choice([0, 0, 0, 1, 2]),
+        }
+        return sha
+
+    def push(self, branch, login, moment, index, salt=None):
+        """Commit on top of a branch"""
+        shas = self.branches[branch]
+        sha = self.add_commit(login, moment, salt or branch, index, shas[-1:])
+        shas.append(sha)
+        return sha
+
+    def force_push(self, branch, keep):
+        """Drop all but the first keep commits of a branch"""
+        del self.branches[branch][keep:]
+
+    def merge(self, branch, other, moment, index):
+        """Merge other into branch: its commits branch doesn't have, then a merge commit"""
+        shas = self.branches[branch]
+        parents = [shas[-1], self.head(other)]
+        merged = set(shas)
+        shas.extend(sha for sha in self.branches[other] if sha not in merged)
+        sha = self.add_commit("alice", moment, "merge-{}".format(branch), index, parents)
+        shas.append(sha)
+        return sha
+
+    def add_pr(self, number, created_at):
+        users = self.collaborators + ["outsider"]
+        state = self._rng.choice(["OPEN", "CLOSED", "MERGED"])
+        closed_at = None if state == "OPEN" else created_at + timedelta(hours=30)
+        self.prs.append({
+            "number": number,
+            "title": "PR {}".format(number),
+            "body": "Body of {}".format(number),
+            "state": state,
+            "created_at": created_at,
+            "updated_at": closed_at or created_at,
+            "closed_at": closed_at,
+            "merged_at": closed_at if state == "MERGED" else None,
+            "user": self._rng.choice(users),
+            "assignees": self._rng.sample(users, self._rng.randint(0, 2)),
+            "reviewers": self._rng.sample(users, self._rng.randint(0, 2)),
+            "head": self._rng.choice(list(self.branches) + ["deleted-branch"]),
+            "base": self._rng.choice(["master", "master", "dev"]),
+            "comments": self._rng.randint(0, 9),
+            "reviews": [self._rng.randint(0, 3) for _ in range(self._rng.randint(0, 4))],
+            "commits": self._rng.randint(1, 12),
+            "additions": self._rng.randint(0, 500),
+            "deletions": self._rng.randint(0, 300),
+            "changed_files": self._rng.randint(1, 20),
+        })
+
+    def head(self, branch):
+        return self.branches[branch][-1]
+
+    def history(self, branch, since=None, until=None):
+        """Commits of a branch in the date range, newest first"""
+        since = None if since is None else datetime.fromisoformat(since)
+        until = None if until is None else datetime.fromisoformat(until)
+        return [self.commits[sha] for sha in reversed(self.branches[branch])
+                if (since is None or since <= self.commits[sha]["date"])
+                and (until is None or self.commits[sha]["date"] <= until)]
+
+    def prs_newest_first(self):
+        return sorted(self.prs, key=lambda pr: pr["created_at"], reverse=True)
+
+    def commit_url(self, sha):
+        return "https://github.com/{}/{}/commit/{}".format(self.owner, self.name, sha)
+
+
+class GitHubStandIn(object):
+    """Request handler for StandInServer serving a FixtureRepository
+    the way the GitHub REST (v3) and GraphQL (v4) APIs do"""
+
+    def __init__(self, repository):
+        self.repository = repository
+        # GraphQL queries that answer with an error
+        self.failing_queries = set()
+        # SHAs whose single commit answers with a server error
+        self.failing_commits = set()
+        # token to the names of the repositories /user/repos lists for it
+        self.user_repositories = {}
+
+    def __call__(self, request):
+        if request.route == "/graphql":
+            return self._graphql(request.json())
+        if request.route == "/user/repos":
+            return self._user_repos(request)
+        prefix = "/repos/{}/{}".format(self.repository.owner, self.repository.name)
+        if not request.route.startswith(prefix):
+            return 404, {}, {"message": "Not Found"}
+        route = request.route[len(prefix):].split("/")[1:]
+        handler = getattr(self, "_rest_{}".format(route[0]), None)
+        if handler is None:
+            return 404, {}, {"message": "Not Found"}
+        return handler(request, *route[1:])
+
+    @staticmethod
+    def _page(request, items):
+        """A page of a listing, with a Link header to the next and the last page"""
+        per_page = int(request.query.get("per_page", 30))
+        page = int(request.query.get("page", 1))
+        headers = {}
+        if page * per_page < len(items):
+            last = (len(items) + per_page - 1) // per_page
+            links = []
+            for number, rel in ((page + 1, "next"), (last, "last")):
+                query = urlencode(dict(request.query, page=number))
+                links.append('<http://{}{}?{}>; rel="{}"'.format(request.headers["Host"], request.route, query, rel))
+            headers["Link"] = ", ".join(links)
+        return 200, headers, items[(page - 1) * per_page:page * per_page]
+
+    def _user_repos(self, request):
+        token = request.headers["Authorization"][len("token "):]
+        return self._page(request, [{"name": name, "full_name": "{}/{}".format(self.repository.owner, name)}
+                                    for name in self.user_repositories.get(token, [])])
+
+    # REST
+
+    def _rest_commit(self, commit, stats=False):
+        rest = {
+            "sha": commit["sha"],
+            "parents": [{"sha": sha} for sha in commit["parents"]],
+            "html_url": self.repository.commit_url(commit["sha"]),
+            "committer": {"login": commit["login"]},
+            "commit": {
+                "message": commit["message"],
+                "comment_count": commit["comment_count"],
+                "committer": {"name": commit["name"], "date": to_github_time(commit["date"])},
+            },
+        }
+        if stats:
+            rest["stats"] = {"additions": commit["additions"], "deletions": commit["deletions"],
+                             "total": commit["additions"] + commit["deletions"]}
+        return rest
+
+    def _rest_branches(self, request):
+        return self._page(request, [{"name": branch, "commit": {"sha": self.repository.head(branch)}}
+                                    for branch in self.repository.branches])
+
+    def _rest_collaborators(self, request):
+        return self._page(request, [{"login": login} for login in self.repository.collaborators])
+
+    def _rest_commits(self, request, sha=None):
+        if sha is not None:
+            if sha in self.failing_commits:
+                return 500, {}, {"message": "Server Error"}
+            if sha not in self.repository.commits:
+                return 404, {}, {"message": "Not Found"}
+            return 200, {}, self._rest_commit(self.repository.commits[sha], stats=True)
+        commits = self.repository.history(request.query["sha"], request.query.get("since"),
+                                          request.query.get("until"))
+        return self._page(request, [self._rest_commit(commit) for commit in commits])
+
+    def _rest_compare(self, request, spec):
+        base, head = spec.split("...")
+        for branch, shas in self.repository.branches.items():
+            if head in shas:
+                break
+        else:
+            return 404, {}, {"message": "Not Found"}
+        if base not in self.repository.commits:
+            return 404, {}, {"message": "Not Found"}
+        if base not in shas:
+            status = "diverged"
+            ahead = []
+        else:
+            ahead = shas[shas.index(base) + 1:shas.index(head) + 1]
+            status = "ahead" if ahead else "identical"
+        return 200, {}, {"status": status, "total_commits": len(ahead),
+                         "commits": [self._rest_commit(self.repository.commits[sha]) for sha in ahead[:250]]}
+
+    def _rest_pr(self, pr, stats=False):
+        rest = {
+            "html_url": "https://github.com/{}/{}/pull/{}".format(self.repository.owner, self.repository.name,
+                                                                  pr["number"]),
+            "title": pr["title"],
+            "state": "open" if pr["state"] == "OPEN" else "closed",
+            "number": pr["number"],
+            "body": pr["body"],
+            "created_at": to_github_time(pr["created_at"]),
+            "updated_at": to_github_time(pr["updated_at"]),
+            "closed_at": pr["closed_at"] and to_github_time(pr["closed_at"]),
+            "merged_at": pr["merged_at"] and to_github_time(pr["merged_at"]),
+            "assignees": [{"login": login} for login in pr["assignees"]],
+            "requested_reviewers": [{"login": login} for login in pr["reviewers"]],
+            "head": {"ref": pr["head"]},
+            "base": {"ref": pr["base"]},
+            "user": {"login": pr["user"]},
+        }
+        if stats:
+            rest.update({"comments": pr["comments"], "review_comments": sum(pr["reviews"]),
+                         "commits": pr["commits"], "additions": pr["additions"],
+                         "deletions": pr["deletions"], "changed_files": pr["changed_files"]})
+        return rest
+
+    def _rest_pulls(self, request, number=None):
+        if number is not None:
+            for pr in self.repository.prs:
+                if pr["number"] == int(number):
+                    return 200, {}, self._rest_pr(pr, stats=True)
+            return 404, {}, {"message": "Not Found"}
+        assert request.query.get("sort") == "created" and request.query.get("direction") == "desc"
+        return self._page(request, [self._rest_pr(pr) for pr in self.repository.prs_newest_first()])
+
+    # GraphQL
+
+    @staticmethod
+    def _connection(items, first, cursor):
+        offset = int(cursor or 0)
+        end = offset + first
+        return {"pageInfo": {"hasNextPage": end < len(items), "endCursor": str(end)},
+                "nodes": items[offset:end]}
+
+    def _graphql_commit(self, commit):
+        return {
+            "oid": commit["sha"],
+            "url": self.repository.commit_url(commit["sha"]),
+            "message": commit["message"],
+            "committedDate": to_github_time(commit["date"]),
+            "additions": commit["additions"],
+            "deletions": commit["deletions"],
+            "comments": {"totalCount": commit["comment_count"]},
+            "committer": {"name": commit["name"], "user": {"login": commit["login"]}},
+        }
+
+    def _graphql_history(self, branch, variables, cursor=None):
+        commits = self.repository.history(branch, variables["since"], variables["until"])
+        return self._connection([self._graphql_commit(commit) for commit in commits], 100, cursor)
+
+    def _graphql_pr(self, pr):
+        return {
+            "number": pr["number"],
+            "url": "https://github.com/{}/{}/pull/{}".format(self.repository.owner, self.repository.name,
+                                                             pr["number"]),
+            "title": pr["title"],
+            "state": pr["state"],
+            "body": pr["body"],
+            "createdAt": to_github_time(pr["created_at"]),
+            "closedAt": pr["closed_at"] and to_github_time(pr["closed_at"]),
+            "mergedAt": pr["merged_at"] and to_github_time(pr["merged_at"]),
+            "headRefName": pr["head"],
+            "baseRefName": pr["base"],
+            "author": {"login": pr["user"]},
+            "assignees": {"nodes": [{"login": login} for login in pr["assignees"]]},
+            "reviewRequests": {"nodes": [{"requestedReviewer": {"login": login}} for login in pr["reviewers"]]},
+            "comments": {"totalCount": pr["comments"]},
+            "reviews": self._graphql_reviews(pr, 50, None),
+            "commits": {"totalCount": pr["commits"]},
+            "additions": pr["additions"],
+            "deletions": pr["deletions"],
+            "changedFiles": pr["changed_files"],
+        }
+
+    def _graphql_reviews(self, pr, first, cursor):
+        return self._connection([{"comments": {"totalCount": count}} for count in pr["reviews"]], first, cursor)
+
+    def _graphql(self, body):
+        query, variables = body["query"], body["variables"]
+        if query in self.failing_queries:
+            return 200, {}, {"errors": [{"message": "Something went wrong"}]}
+        cursor = variables.get("cursor")
+        if query == GraphQLQueries.GQL_BRANCHES_WITH_HISTORY:
+            refs = [{"name": branch, "target": {"history": self._graphql_history(branch, variables)}}
+                    for branch in self.repository.branches]
+            data = {"repository": {"refs": self._connection(refs, 100, cursor)}}
+        elif query == GraphQLQueries.GQL_BRANCH_HISTORY:
+            branch = variables["branch"][len("refs/heads/"):]
+            data = {"repository": {"ref": {"target": {"history": self._graphql_history(branch, variables,
+                                                                                         cursor)}}}}
+        elif query == GraphQLQueries.GQL_COLLABORATORS:
+            collaborators = [{"login": login} for login in self.repository.collaborators]
+            data = {"repository": {"collaborators": self._connection(collaborators, 100, cursor)}}
+        elif query == GraphQLQueries.GQL_PULL_REQUESTS:
+            prs = [self._graphql_pr(pr) for pr in self.repository.prs_newest_first()]
+            data = {"repository": {"pullRequests": self._connection(prs, 50, cursor)}}
+        elif query == GraphQLQueries.GQL_PR_REVIEWS:
+            pr = next(pr for pr in self.repository.prs if pr["number"] == variables["number"])
+            data = {"repository": {"pullRequest": {"reviews": self._graphql_reviews(pr, 100, cursor)}}}
+        else:
+            return 200, {}, {"errors": [{"message": "Unknown query"}]}
+        return 200, {}, {"data": data}
+
+
+class GitHubStandInTestCase(unittest.TestCase):
+    """Runs analyses against a GitHubStandIn serving self.repository,
+    with the analysis caches and history in a temporary directory"""
+
+    def make_repository(self):
+        return FixtureRepository()
+
+    def setUp(self):
+        self.repository = self.make_repository()
+        self.github = GitHubStandIn(self.repository)
+        self.server = StandInServer(self.github).start()
+        self.addCleanup(self.server.stop)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        patches = [
+            mock.patch.dict(GH_API, {"BASE": self.server.base_url}),
+            mock.patch.dict(GH_ANALYSIS, {"BACKEND": "rest", "INCREMENTAL": False,
+                                          "COMMIT_STATS_CACHE_DB": "{}/commit_stats.sqlite3".format(directory),
+                                          "HISTORY_DB": "{}/history.sqlite3".format(directory)}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self._reset_singletons()
+        self.addCleanup(self._reset_singletons)
+
+    @staticmethod
+    def _reset_singletons():
+        # the stores are bound to the database paths they were created with
+        CommitStatsCache._CommitStatsCache__instance = None
+        AnalysisHistoryStore._AnalysisHistoryStore__instance = None
+
+    def analyse(self, start, end, **settings):
+        """Analyse self.repository over start..end (datetimes) with GH_ANALYSIS overridden by settings"""
+        repo = {"name": self.repository.name, "start_date": int(start.timestamp()),
+                "end_date": int(end.timestamp())}
+        data = {"token": "token", "username": self.repository.owner, "integrate_taiga": False}
+        with mock.patch.dict(GH_ANALYSIS, settings):
+            return AnalysisPerformer.perform_analysis(repo, data)
+
+    def count_requests(self, route_suffix=None, since=0):
+        """Requests the stand-in received, optionally only those whose route ends in route_suffix"""
+        return len([request for request in self.server.requests[since:]
+                    if route_suffix is None or request.route.endswith(route_suffix)])
@@ -0,0 +1,66 @@
+"""A FixtureRepository written to a bare git repository, for the local backend"""
+
+import os
+import subprocess
+
+# how each fixture login commits; outsider has no GitHub email, so no login can be found for them
+EMAILS = {
+    "alice": "1001+alice@users.noreply.github.com",
+    "bob": "bob@example.edu",
+    "carol": "carol@users.noreply.github.com",
+    "outsider": "Outsider@Example.com",
+    "web-flow": "noreply@github.com",
+}
+
+
+def write_git_repository(repository, path):
+    """Write the commits and branches of repository to a new bare repository at path.
+    Each commit appends its additions to a file and deletes its deletions from the
+    start of it, so git's line stats are the fixture's. A merge takes the tree of
+    its last parent; its stats are set to those against its first parent"""
+    os.makedirs(path)
+    subprocess.run(["git", "init", "--quiet", "--bare", path], check=True)
+    contents = {}
+    marks = {}
+    stream = []
+    for shas in repository.branches.values():
+        for sha in shas:
+            if sha in marks:
+                continue
+            commit = repository.commits[sha]
+            parents = commit["parents"]
+            if len(parents) > 1:
+                lines = list(contents[parents[-1]])
+                old = contents[parents[0]]
+                kept = len(set(old) & set(lines))
+                commit["additions"], commit["deletions"] = len(lines) - kept, len(old) - kept
+            else:
+                lines = list(contents[parents[0]]) if parents else []
+                commit["deletions"] = min(commit["deletions"], len(lines))
+                del lines[:commit["deletions"]]
+                lines.extend("{} {}".format(sha, i) for i in range(commit["additions"]))
+            contents[sha] = lines
+            marks[sha] = len(marks) + 1
+            data = "".join(line + "\n" for line in lines).encode("utf-8")
+            message = commit["message"].encode("utf-8")
+            if not parents:
+                # fast-import would otherwise build on the previous commit
+                stream.append(b"reset refs/heads/fixture-import\n")
+            stream.append(b"commit refs/heads/fixture-import\nmark :%d\n" % marks[sha])
+            stream.append("committer {} <{}> {} +0000\n".format(commit["name"], EMAILS[commit["login"]],
+                                                                 int(commit["date"].timestamp())).encode("utf-8"))
+            stream.append(b"data %d\n%s\n" % (len(message), message))
+            if parents:
+                stream.append(b"from :%d\n" % marks[parents[0]])
+                stream.extend(b"merge :%d\n" % marks[parent] for parent in parents[1:])
+            stream.append(b"M 644 inline changes.txt\ndata %d\n%s\n" % (len(data), data))
+    for branch, shas in repository.branches.items():
+        stream.append("reset refs/heads/{}\nfrom :{}\n\n".format(branch, marks[shas[-1]]).encode("utf-8"))
+    subprocess.run(["git", "-C", path, "fast-import", "--quiet", "--export-marks=marks"],
+                   input=b"".join(stream), check=True)
+    subprocess.run(["git", "-C", path, "update-ref", "-d", "refs/heads/fixture-import"], check=True)
+    with open(os.path.join(path, "marks")) as marks_file:
+        git_shas = dict(line.split() for line in marks_file)
+    os.remove(os.path.join(path, "marks"))
+    # fixture SHA to git SHA; the fixture's are made up
+    return {sha: git_shas[":{}".format(mark)] for sha, mark in marks.items()}
@@ -0,0 +1,60 @@
+"""Random PR details, and the list-based PR to collaborator mapping that the
+set/defaultdict one replaced, for tests and benchmarks"""
+
+import random
+from collections import defaultdict
+
+from GAnalyzer.APIPayloadKeyConstants import GH_API_PR_USERNAME
+
+
+def make_prs(seed, num_prs, num_collaborators, num_branches, num_outsiders=10):
+    """PR details as _make_pr_details_object makes them, newest first; with
+    the collaborators and branch names. Some users aren't collaborators and
+    some PRs are from or to branches that are gone"""
+    rng = random.Random(seed)
+    collaborators = ["user{}".format(i) for i in range(num_collaborators)]
+    users = collaborators + ["outsider{}".format(i) for i in range(num_outsiders)]
+    branches = ["master"] + ["branch{}".format(i) for i in range(num_branches - 1)]
+    refs = branches + ["deleted{}".format(i) for i in range(num_branches // 5 + 1)]
+    prs = []
+    for number in range(num_prs, 0, -1):
+        base = "master" if rng.random() < 0.7 else rng.choice(refs)
+        prs.append({"number": number, "user": rng.choice(users),
+                    "head": rng.choice(refs) if rng.random() < 0.95 else base, "base": base,
+                    "assignees": [{GH_API_PR_USERNAME: name} for name in rng.sample(users, rng.randint(0, 2))],
+                    "requested_reviewers": [{GH_API_PR_USERNAME: name}
+                                            for name in rng.sample(users, rng.randint(0, 3))]})
+    return prs, collaborators, branches
+
+
+def copy_prs(prs):
+    """Mapping pops the assignees and reviewers; map copies"""
+    return [dict(pr) for pr in prs]
+
+
+def legacy_map_prs(prs, c_names, branches, reset_branch=True):
+    """The mapping before sets and nested defaultdicts: lists for the collaborators
+    and branches, and lists of PR numbers. With reset_branch, a missing
+    (branch, collaborator, role) entry replaces the whole branch, as it used to"""
+    c_pr = {}
+    for details in prs:
+        pr_num = details["number"]
+        head = details["head"]
+        base = details["base"]
+        people = [(details.pop("assignees"), "assignee"), (details.pop("requested_reviewers"), "reviewer"),
+                  ([{GH_API_PR_USERNAME: details["user"]}], "author")]
+        for data, insert_key in people:
+            for name in data:
+                author = name[GH_API_PR_USERNAME]
+                if author in c_names:
+                    for branch in [head, base]:
+                        if branch in branches:
+                            try:
+                                _val = c_pr[branch][author][insert_key]
+                            except KeyError:
+                                if reset_branch:
+                                    c_pr[branch] = {author: defaultdict(list)}
+                                else:
+                                    c_pr.setdefault(branch, {}).setdefault(author, defaultdict(list))
+                            c_pr[branch][author][insert_key].append(pr_num)
+    return c_pr
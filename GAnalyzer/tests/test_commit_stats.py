@@ -0,0 +1,77 @@
+"""Tests of fetching commit stats against the GitHub stand-in"""
+
+import shutil
+import tempfile
+from unittest import mock
+
+from GTAnalyzer.settings import GH_ANALYSIS
+from GAnalyzer.dataapi import AnalysisPerformer
+from GAnalyzer.tests.github import GitHubStandInTestCase
+
+
+class CommitStatsTest(GitHubStandInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.shas = self.repository.branches["master"][:40]
+
+    def add_stats(self, shas, width, cache_name="commit_stats"):
+        """Commits with the stats _add_stats gives them, COMMIT_STATS_WIDTH at a time,
+        with the stats cache in its own database"""
+        commits = [{"sha": sha} for sha in shas]
+        self._reset_singletons()
+        with mock.patch.dict(GH_ANALYSIS, {"COMMIT_STATS_WIDTH": width, "COMMIT_STATS_CACHE_DB":
+                                           "{}/{}.sqlite3".format(self.cache_dir, cache_name)}):
+            AnalysisPerformer._add_stats("token", self.repository.owner, self.repository.name, commits)
+        return commits
+
+    def expected_stats(self, sha):
+        commit = self.repository.commits[sha]
+        return {"additions": commit["additions"], "deletions": commit["deletions"],
+                "total": commit["additions"] + commit["deletions"]}
+
+    def test_concurrent_stats_match_the_sequential_ones(self):
+        # a SHA listed on two branches is fetched once
+        shas = self.shas + self.shas[:5]
+        concurrent = self.add_stats(shas, 8, "concurrent")
+        self.assertEqual(self.count_requests(), len(self.shas))
+        self.assertEqual(concurrent, self.add_stats(shas, 1, "sequential"))
+        self.assertEqual([commit["stats"] for commit in concurrent], [self.expected_stats(sha) for sha in shas])
+
+    def test_failed_commit_only_affects_that_commit(self):
+        failing = self.shas[7]
+        self.github.failing_commits.add(failing)
+        commits = self.add_stats(self.shas, 8)
+        for sha, commit in zip(self.shas, commits):
+            if sha == failing:
+                self.assertEqual(commit["stats"], {"additions": None, "deletions": None, "total": None})
+            else:
+                self.assertEqual(commit["stats"], self.expected_stats(sha))
+        # and the failure isn't cached
+        self.github.failing_commits.clear()
+        mark = len(self.server.requests)
+        commits = self.add_stats(self.shas, 8)
+        self.assertEqual([request.route.split("/")[-1] for request in self.server.requests[mark:]], [failing])
+        self.assertEqual(commits[7]["stats"], self.expected_stats(failing))
+
+    def single_commit_requests(self, since=0):
+        """Requests for single commits, the only requests for stats"""
+        return [request for request in self.server.requests[since:]
+                if request.route.split("/")[4:5] == ["commits"] and len(request.route.split("/")) == 6]
+
+    def test_second_analysis_of_the_same_commits_fetches_no_stats(self):
+        start, end = self.repository.commits[self.shas[0]]["date"], self.repository.commits[self.shas[-1]]["date"]
+        first = self.analyse(start, end)
+        fetched = self.single_commit_requests()
+        self.assertGreater(len(fetched), 20)
+        self.assertEqual(len(fetched), len(set(request.route for request in fetched)))
+        mark = len(self.server.requests)
+        self.assertEqual(self.analyse(start, end), first)
+        self.assertEqual(self.single_commit_requests(mark), [])
+        # nor once the process restarts, from the on-disk tier
+        self._reset_singletons()
+        mark = len(self.server.requests)
+        self.assertEqual(self.analyse(start, end), first)
+        self.assertEqual(self.single_commit_requests(mark), [])
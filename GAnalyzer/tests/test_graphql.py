@@ -0,0 +1,46 @@
+"""The GraphQL backend against the REST backend, on the same fixture repository"""
+
+import json
+from datetime import timedelta
+
+from GAnalyzer import GraphQLQueries
+from GAnalyzer.tests.github import GitHubStandInTestCase, EPOCH
+
+
+class GraphQLBackendTest(GitHubStandInTestCase):
+
+    start = EPOCH
+    end = EPOCH + timedelta(days=60)
+
+    def test_matches_rest_backend(self):
+        rest = self.analyse(self.start, self.end, BACKEND="rest")
+        graphql = self.analyse(self.start, self.end, BACKEND="graphql")
+        self.assertEqual(json.loads(json.dumps(graphql)), json.loads(json.dumps(rest)))
+
+    def test_fixture_exercises_paging(self):
+        # more than a page of master's history and of PRs, in either API
+        self.assertGreater(len(self.repository.history("master", self.start.isoformat(), self.end.isoformat())), 100)
+        rest = self.analyse(self.start, self.end, BACKEND="rest")
+        self.assertGreater(len([pr for pr in self.repository.prs if self.start <= pr["created_at"] <= self.end]), 50)
+        self.assertTrue(all(rest["master"][name]["commits"] for name in self.repository.collaborators))
+        self.assertTrue(rest["pr_details"])
+
+    def test_reviews_past_the_first_page_are_counted(self):
+        graphql = self.analyse(self.start, self.end, BACKEND="graphql")
+        self.assertEqual(graphql["pr_details"][10]["num_rev_comments"], 60 + 2 * 60)
+
+    def test_unfetched_reviews_are_reported_not_undercounted(self):
+        self.github.failing_queries.add(GraphQLQueries.GQL_PR_REVIEWS)
+        with self.assertLogs("GAnalyzer.dataapi", "WARNING"):
+            graphql = self.analyse(self.start, self.end, BACKEND="graphql")
+        self.assertIsNone(graphql["pr_details"][10]["num_rev_comments"])
+        # PRs with a single page of reviews are unaffected
+        rest = self.analyse(self.start, self.end, BACKEND="rest")
+        for number, details in rest["pr_details"].items():
+            if number != 10:
+                self.assertEqual(graphql["pr_details"][number], details)
+
+    def test_request_count(self):
+        self.analyse(self.start, self.end, BACKEND="graphql")
+        # refs with history, the rest of master's history, collaborators, 2 pages of PRs, 1 of reviews
+        self.assertLessEqual(self.count_requests("/graphql"), 7)
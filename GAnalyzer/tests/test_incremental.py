@@ -0,0 +1,151 @@
+"""Incremental analysis against full analyses, on the same fixture repository"""
+
+import json
+import sqlite3
+from datetime import datetime, timedelta
+from unittest import mock
+
+from GTAnalyzer.settings import GH_ANALYSIS
+from GAnalyzer.dataapi import AnalysisHistoryStore
+from GAnalyzer.tests.github import GitHubStandInTestCase, EPOCH
+
+
+class IncrementalAnalysisTest(GitHubStandInTestCase):
+
+    start = EPOCH
+    end = EPOCH + timedelta(days=60)
+
+    def full(self, start=None, end=None):
+        return json.loads(json.dumps(self.analyse(start or self.start, end or self.end)))
+
+    def incremental(self, start=None, end=None):
+        return json.loads(json.dumps(self.analyse(start or self.start, end or self.end, INCREMENTAL=True)))
+
+    def requests_to(self, endpoint, since):
+        """Requests for an endpoint of the repository: "commits" listings, "compare" or "pulls" """
+        return [request for request in self.server.requests[since:]
+                if request.route.split("/")[4:5] == [endpoint]]
+
+    def listed_ranges(self, since):
+        """(branch, since, until) of the commit listings, first pages only"""
+        return sorted((request.query["sha"], datetime.fromisoformat(request.query["since"]),
+                       datetime.fromisoformat(request.query["until"]))
+                      for request in self.requests_to("commits", since)
+                      if len(request.route.split("/")) == 5 and "page" not in request.query)
+
+    def history_db(self):
+        conn = sqlite3.connect(GH_ANALYSIS["HISTORY_DB"])
+        self.addCleanup(conn.close)
+        return conn
+
+    def test_unchanged_reanalysis_fetches_no_commits_or_prs(self):
+        first = self.incremental()
+        mark = len(self.server.requests)
+        second = self.incremental()
+        for endpoint in ("commits", "compare"):
+            self.assertEqual(self.requests_to(endpoint, mark), [], endpoint)
+        # the PR listing, but none of the single PRs
+        self.assertTrue(all(len(request.route.split("/")) == 5 for request in self.requests_to("pulls", mark)))
+        self.assertEqual(second, first)
+        self.assertEqual(second, self.full())
+
+    def test_widened_range_lists_only_the_missing_ranges(self):
+        inner_start, inner_end = self.start + timedelta(days=10), self.end - timedelta(days=10)
+        self.incremental(inner_start, inner_end)
+        mark = len(self.server.requests)
+        incremental = self.incremental()
+        self.assertEqual(self.listed_ranges(mark),
+                         sorted((branch, since, until) for branch in self.repository.branches
+                                for since, until in ((self.start, inner_start), (inner_end, self.end))))
+        self.assertEqual(incremental, self.full())
+
+    def test_range_not_contiguous_with_the_stored_one_is_listed_in_full(self):
+        self.incremental(self.start, self.start + timedelta(days=10))
+        later = self.start + timedelta(days=20)
+        mark = len(self.server.requests)
+        incremental = self.incremental(later, self.end)
+        self.assertEqual(self.listed_ranges(mark),
+                         sorted((branch, later, self.end) for branch in self.repository.branches))
+        self.assertEqual(incremental, self.full(later, self.end))
+
+    def test_linear_push_is_compared_and_keeps_the_listing_order(self):
+        self.incremental()
+        moment = self.end - timedelta(days=1)
+        self.repository.push("master", "alice", moment, 0, salt="pushed")
+        # two commits in the same second, and one dated inside the stored range
+        self.repository.push("master", "bob", moment + timedelta(hours=1), 1, salt="pushed")
+        self.repository.push("master", "carol", moment + timedelta(hours=1), 2, salt="pushed")
+        self.repository.push("master", "alice", self.start + timedelta(days=5), 3, salt="pushed")
+        mark = len(self.server.requests)
+        incremental = self.incremental()
+        self.assertEqual(len(self.requests_to("compare", mark)), 1)
+        self.assertEqual(self.listed_ranges(mark), [])
+        self.assertEqual(incremental, self.full())
+        shas = [commit["sha"] for commit in incremental["master"]["alice"]["commits"]]
+        self.assertEqual(shas[0], self.repository.head("master"))
+
+    def assert_falls_back_to_listing(self):
+        mark = len(self.server.requests)
+        incremental = self.incremental()
+        self.assertEqual(len(self.requests_to("compare", mark)), 1)
+        self.assertIn(("master", self.start, self.end), self.listed_ranges(mark))
+        self.assertEqual(incremental, self.full())
+
+    def test_force_push_falls_back_to_listing(self):
+        self.incremental()
+        self.repository.force_push("master", 120)
+        self.repository.push("master", "bob", self.end - timedelta(days=2), 0, salt="rewritten")
+        self.assert_falls_back_to_listing()
+
+    def test_merge_falls_back_to_listing(self):
+        self.incremental()
+        self.repository.merge("master", "dev", self.end - timedelta(days=2), 0)
+        self.assert_falls_back_to_listing()
+
+    def test_push_of_more_than_a_comparison_holds_falls_back_to_listing(self):
+        self.incremental()
+        for i in range(260):
+            self.repository.push("master", "carol", self.end - timedelta(days=2, minutes=i), i, salt="bulk")
+        self.assert_falls_back_to_listing()
+
+    def test_commits_are_stored_once_per_repository(self):
+        self.incremental()
+        shas = [[commit["sha"] for commit in self.repository.history(branch, self.start.isoformat(),
+                                                                      self.end.isoformat())]
+                for branch in self.repository.branches]
+        conn = self.history_db()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM history_commits").fetchone()[0],
+                         len(set(sha for branch in shas for sha in branch)))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM history_branch_commits").fetchone()[0],
+                         sum(len(branch) for branch in shas))
+        # stats live in the commit stats cache
+        self.assertFalse([details for details, in conn.execute("SELECT details FROM history_commits")
+                          if "stats" in json.loads(details)])
+
+    def test_commits_dropped_by_a_force_push_are_deleted(self):
+        self.incremental()
+        dropped = self.repository.branches["master"][120:]
+        self.repository.force_push("master", 120)
+        self.incremental()
+        conn = self.history_db()
+        stored = set(sha for sha, in conn.execute("SELECT sha FROM history_commits"))
+        self.assertFalse(stored & set(dropped))
+
+    def test_unused_history_is_pruned(self):
+        self.incremental()
+        conn = self.history_db()
+        with conn:
+            conn.execute("UPDATE history_branches SET used_at = 0 WHERE branch = 'dev'")
+            conn.execute("UPDATE history_prs SET used_at = 0 WHERE number = 10")
+        dev_only = set(self.repository.branches["dev"]) - set(self.repository.branches["master"])
+        with mock.patch("GAnalyzer.dataapi.HISTORY_PRUNE_INTERVAL", 0):
+            AnalysisHistoryStore.get_instance().set_pr_stats(self.repository.owner, self.repository.name, {})
+        self.assertEqual(conn.execute("SELECT branch FROM history_branches ORDER BY branch").fetchall(),
+                         [("feature/login",), ("master",)])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM history_branch_commits "
+                                      "WHERE branch = 'dev'").fetchone()[0], 0)
+        self.assertFalse(set(sha for sha, in conn.execute("SELECT sha FROM history_commits")) & dev_only)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM history_prs WHERE number = 10").fetchone()[0], 0)
+        self.assertGreater(conn.execute("SELECT COUNT(*) FROM history_prs").fetchone()[0], 0)
+        # and a later analysis fetches them again
+        self.assertEqual(self.incremental(), self.full())
@@ -0,0 +1,105 @@
+"""The local git backend against the REST backend, on the same fixture repository"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from GAnalyzer import GitRepo
+from GAnalyzer.GitRepo import get_git_version, has_supported_git, GIT_MIN_VERSION
+from GAnalyzer.tests.github import GitHubStandInTestCase, EPOCH
+from GAnalyzer.tests.gitrepo import write_git_repository, EMAILS
+
+SUPPORTED_GIT = (get_git_version() or (0, 0))[:2] >= GIT_MIN_VERSION
+
+
+@unittest.skipUnless(SUPPORTED_GIT, "needs git {}.{} or later".format(*GIT_MIN_VERSION))
+class LocalGitBackendTest(GitHubStandInTestCase):
+
+    start = EPOCH
+    end = EPOCH + timedelta(days=60)
+
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def write(self):
+        """Write the fixture repository as a mirror under the local root; git SHA to fixture SHA"""
+        git_shas = write_git_repository(self.repository, os.path.join(self.root, self.repository.owner,
+                                                                       "{}.git".format(self.repository.name)))
+        return {git_sha: sha for sha, git_sha in git_shas.items()}
+
+    def local(self, fixture_shas):
+        """A local analysis, with the fixture's SHAs in place of git's"""
+        analysis = json.loads(json.dumps(self.analyse(self.start, self.end, BACKEND="local",
+                                                      LOCAL_REPO_ROOT=self.root)))
+        for key, value in analysis.items():
+            if key in self.repository.branches:
+                for commits in value.values():
+                    for commit in commits.get("commits", []):
+                        commit["sha"] = fixture_shas[commit["sha"]]
+                        commit["url"] = self.repository.commit_url(commit["sha"])
+        return analysis
+
+    def rest(self):
+        analysis = json.loads(json.dumps(self.analyse(self.start, self.end, BACKEND="rest")))
+        for key, value in analysis.items():
+            if key in self.repository.branches:
+                for commits in value.values():
+                    for commit in commits.get("commits", []):
+                        # commit comments only exist on GitHub
+                        commit["comment_count"] = None
+        return analysis
+
+    def test_matches_rest_backend(self):
+        local = self.local(self.write())
+        # commits and their stats come from git
+        self.assertEqual(self.count_requests("/commits"), 0)
+        self.assertEqual(len([request for request in self.server.requests if "/commits/" in request.route]), 0)
+        del local["unmatched_committers"]
+        self.assertEqual(local, self.rest())
+        self.assertTrue(all(local["master"][name]["commits"] for name in self.repository.collaborators))
+
+    def test_committers_without_a_login_are_reported_under_their_email(self):
+        fixture_shas = self.write()
+        unmatched = self.local(fixture_shas)["unmatched_committers"]
+        email = EMAILS["outsider"].lower()
+        for branch in self.repository.branches:
+            expected = [commit["sha"] for commit in self.repository.history(branch, self.start.isoformat(),
+                                                                             self.end.isoformat())
+                        if commit["login"] == "outsider"]
+            self.assertEqual(list(unmatched.get(branch, {})), [email] if expected else [], branch)
+            if expected:
+                self.assertEqual([fixture_shas[commit["sha"]] for commit in unmatched[branch][email]], expected)
+                self.assertTrue(all(commit["author"] == email for commit in unmatched[branch][email]))
+        self.assertTrue(unmatched)
+
+    def test_merge_stats_are_against_the_first_parent(self):
+        merge = self.repository.merge("master", "dev", self.end - timedelta(days=1), 0)
+        fixture_shas = self.write()
+        local = self.local(fixture_shas)
+        commit = next(commit for commit in local["master"]["alice"]["commits"] if commit["sha"] == merge)
+        fixture = self.repository.commits[merge]
+        self.assertGreater(fixture["additions"], 0)
+        self.assertEqual(commit["stats"], {"additions": fixture["additions"], "deletions": fixture["deletions"],
+                                           "total": fixture["additions"] + fixture["deletions"]})
+        # the merged commits are listed too, as on GitHub
+        self.assertEqual(sorted(commit["sha"] for name in self.repository.collaborators
+                                for commit in local["master"][name]["commits"]),
+                         sorted(commit["sha"] for commit in self.repository.history("master", self.start.isoformat(),
+                                                                                   self.end.isoformat())
+                                if commit["login"] in self.repository.collaborators))
+
+    def test_older_git_falls_back_to_rest(self):
+        self.write()
+        has_supported_git.cache_clear()
+        self.addCleanup(has_supported_git.cache_clear)
+        with mock.patch.object(GitRepo, "get_git_version", return_value=(2, 30, 1)), \
+                self.assertLogs("GAnalyzer.GitRepo", "WARNING"):
+            analysis = self.analyse(self.start, self.end, BACKEND="local", LOCAL_REPO_ROOT=self.root)
+        self.assertGreater(self.count_requests("/commits"), 0)
+        self.assertNotIn("unmatched_committers", analysis)
@@ -0,0 +1,55 @@
+"""Tests of the REST PR listing against the GitHub stand-in: the date range, and paging stopping at its start"""
+
+from datetime import timedelta
+from unittest import mock
+
+from GTAnalyzer.settings import GH_API
+from GAnalyzer.dataapi import AnalysisPerformer
+from GAnalyzer.tests.github import GitHubStandInTestCase, EPOCH
+
+
+class PRListingTest(GitHubStandInTestCase):
+
+    # PR n is created n - 5 days after EPOCH: 30 to 44 are in range
+    start = EPOCH + timedelta(days=25)
+    end = EPOCH + timedelta(days=40)
+
+    def setUp(self):
+        super().setUp()
+        # 10 PRs a page, newest first: PR 29, the first one older than the range, is on the fifth page
+        patch = mock.patch.dict(GH_API, {"PER_PAGE": 10})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def get_pr(self, c_names):
+        pr_details, _c_pr, is_error = AnalysisPerformer._get_pr(
+            "token", self.repository.owner, self.repository.name, c_names, list(self.repository.branches),
+            self.start.isoformat(), self.end.isoformat())
+        self.assertFalse(is_error, pr_details)
+        return pr_details
+
+    def test_only_prs_created_in_the_range_are_returned(self):
+        users = set(pr["user"] for pr in self.repository.prs)
+        pr_details = self.get_pr(users)
+        in_range = [pr["number"] for pr in self.repository.prs_newest_first()
+                    if self.start <= pr["created_at"] <= self.end]
+        self.assertEqual(in_range, list(range(44, 29, -1)))
+        self.assertEqual(sorted(pr_details), sorted(in_range))
+        # stats are fetched for those PRs only
+        self.assertEqual(sorted(int(request.route.split("/")[-1]) for request in self.server.requests
+                                if request.route.split("/")[-2] == "pulls"),
+                         sorted(in_range))
+
+    def test_only_collaborators_prs_are_returned(self):
+        pr_details = self.get_pr(["alice", "bob"])
+        self.assertEqual(sorted(pr_details),
+                         sorted(pr["number"] for pr in self.repository.prs
+                                if self.start <= pr["created_at"] <= self.end and pr["user"] in ("alice", "bob")))
+        self.assertTrue(pr_details)
+
+    def test_no_pages_are_requested_past_the_first_older_pr(self):
+        self.get_pr(["alice"])
+        pages = [int(request.query.get("page", 1)) for request in self.server.requests
+                 if request.route.endswith("/pulls")]
+        self.assertEqual(pages, [1, 2, 3, 4, 5])
+        self.assertLess(5 * 10, len(self.repository.prs))
@@ -0,0 +1,53 @@
+"""Tests of the PR to collaborator mapping against the list-based one it replaced"""
+
+import unittest
+
+from GAnalyzer.dataapi import AnalysisPerformer
+from GAnalyzer.tests.prs import make_prs, copy_prs, legacy_map_prs
+
+
+def map_prs(prs, c_names, branches):
+    c_pr = AnalysisPerformer._make_c_pr()
+    for details in prs:
+        c_pr = AnalysisPerformer._map_pr_to_collaborators(details, set(c_names), set(branches), c_pr)
+    return c_pr
+
+
+def normalise(c_pr):
+    """branch to collaborator to role to PR numbers, newest first, as _merge_pr_data lists them"""
+    return {branch: {author: {key: sorted(set(pr_nums), reverse=True) for key, pr_nums in roles.items() if pr_nums}
+                     for author, roles in authors.items()}
+            for branch, authors in c_pr.items()}
+
+
+class PRMappingTest(unittest.TestCase):
+
+    def test_same_mapping_as_the_list_version(self):
+        for seed in range(20):
+            prs, c_names, branches = make_prs(seed, 300, 8, 6)
+            mapped = normalise(map_prs(copy_prs(prs), c_names, branches))
+            self.assertEqual(mapped, normalise(legacy_map_prs(copy_prs(prs), c_names, branches,
+                                                              reset_branch=False)))
+            self.assertGreater(sum(len(authors) for authors in mapped.values()), 20)
+
+    def test_keeps_the_prs_the_list_version_dropped(self):
+        prs, c_names, branches = make_prs(1, 300, 8, 6)
+        mapped = normalise(map_prs(copy_prs(prs), c_names, branches))
+        legacy = normalise(legacy_map_prs(copy_prs(prs), c_names, branches))
+        self.assertLess(sum(len(authors) for authors in legacy.values()),
+                        sum(len(authors) for authors in mapped.values()))
+
+    def test_pr_between_the_same_branch_is_listed_once(self):
+        prs = [{"number": 5, "user": "alice", "head": "master", "base": "master",
+                "assignees": [{"login": "alice"}], "requested_reviewers": []}]
+        self.assertEqual(normalise(map_prs(prs, ["alice"], ["master"])),
+                         {"master": {"alice": {"assignee": [5], "author": [5]}}})
+
+    def test_merge_lists_newest_first(self):
+        prs, c_names, branches = make_prs(3, 200, 5, 4)
+        c_pr = map_prs(copy_prs(prs), c_names, branches)
+        data_dump = {branch: {author: {} for author in c_names} for branch in branches}
+        merged = AnalysisPerformer._merge_pr_data(data_dump, c_pr)
+        for branch, authors in normalise(c_pr).items():
+            for author, roles in authors.items():
+                self.assertEqual(merged[branch][author], roles)
@@ -0,0 +1,67 @@
+"""Tests of the repository list against the GitHub stand-in: concurrent pages and the per-token cache"""
+
+import time
+from unittest import mock
+
+from GTAnalyzer.settings import GH_API
+from GAnalyzer.dataapi import RepositoryListGetter
+from GAnalyzer.tests.github import GitHubStandInTestCase
+from commons import cache
+from commons.cache import TTLCache
+
+
+class Clock(object):
+    """Stands in for the time module in commons.cache"""
+
+    def __init__(self):
+        self.offset = 0
+
+    def monotonic(self):
+        return time.monotonic() + self.offset
+
+
+class RepositoryListTest(GitHubStandInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = Clock()
+        self.github.user_repositories = {"token": ["repo-{:02d}".format(i) for i in range(45)],
+                                         "other-token": ["other-repo"]}
+        patches = [mock.patch.dict(GH_API, {"PER_PAGE": 10}),
+                   mock.patch.object(cache, "time", self.clock),
+                   # a cache of its own, not shared with the other tests
+                   mock.patch.object(RepositoryListGetter, "_RepositoryListGetter__cache",
+                                     TTLCache(10, GH_API["REPO_LIST_CACHE_TTL"]))]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def get(self, token="token"):
+        repo_list, is_error = RepositoryListGetter.get_repository_list({"token": token})
+        self.assertFalse(is_error, repo_list)
+        return [repo["name"] for repo in repo_list]
+
+    def test_all_pages_are_merged_in_order(self):
+        self.assertEqual(self.get(), self.github.user_repositories["token"])
+        self.assertEqual(sorted(int(request.query["page"]) for request in self.server.requests), [1, 2, 3, 4, 5])
+
+    def test_single_page(self):
+        self.assertEqual(self.get("other-token"), ["other-repo"])
+        self.assertEqual(self.count_requests(), 1)
+
+    def test_repeat_within_the_ttl_makes_no_requests(self):
+        first = self.get()
+        mark = len(self.server.requests)
+        self.clock.offset = GH_API["REPO_LIST_CACHE_TTL"] - 1
+        self.assertEqual(self.get(), first)
+        self.assertEqual(self.count_requests(since=mark), 0)
+        self.clock.offset = GH_API["REPO_LIST_CACHE_TTL"] + 1
+        self.assertEqual(self.get(), first)
+        self.assertEqual(self.count_requests(since=mark), 5)
+
+    def test_tokens_do_not_share_a_cache_entry(self):
+        self.get()
+        mark = len(self.server.requests)
+        self.assertEqual(self.get("other-token"), ["other-repo"])
+        self.assertEqual([request.headers["Authorization"] for request in self.server.requests[mark:]],
+                         ["token other-token"])
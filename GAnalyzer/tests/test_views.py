@@ -0,0 +1,35 @@
+"""Tests of the GAnalyzer views"""
+
+import unittest
+from unittest import mock
+
+from rest_framework.test import APIRequestFactory
+
+from GAnalyzer.views import AnalyzeView, AnalysisResultsStreamView
+
+
+class AnalyzeViewTest(unittest.TestCase):
+
+    def _analyze(self):
+        with mock.patch("GAnalyzer.views.Analyzer.perform_analysis_async",
+                        side_effect=lambda data, *args: ({"request_id": data["request_id"]}, False)):
+            response = AnalyzeView.as_view()(APIRequestFactory().post("/analyze/", {}, format="json"))
+        self.assertEqual(response.status_code, 200)
+        return response.data["request_id"]
+
+    def test_request_ids_are_unguessable_and_unique(self):
+        request_ids = {self._analyze() for _ in range(50)}
+        self.assertEqual(len(request_ids), 50)
+        for request_id in request_ids:
+            self.assertRegex(request_id, r"\A[0-9a-f]{32}\Z")
+
+
+class AnalysisResultsStreamViewTest(unittest.TestCase):
+
+    def test_invalid_cursor_or_timeout_is_a_bad_request(self):
+        for payload in ({"cursor": "abc"}, {"cursor": -1}, {"cursor": [1]},
+                        {"timeout": "soon"}, {"timeout": "nan"}, {"timeout": "inf"}):
+            request = APIRequestFactory().post("/results/stream/", dict(payload, request_id="r"), format="json")
+            response = AnalysisResultsStreamView.as_view()(request)
+            self.assertEqual(response.status_code, 400, payload)
+            self.assertIn("error", response.data)
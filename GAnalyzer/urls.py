@@ -6,6 +6,10 @@ urlpatterns = [
     re_path(r'^api/v1/ganalyzer/listrepository/$', ListRepositoryView.as_view()),
     re_path(r'^api/v1/ganalyzer/createrepository/$', CreateRepositoryView.as_view()),
     re_path(r'^api/v1/ganalyzer/flightcheck/$', FlightCheckView.as_view()),
+    re_path(r'^api/v1/ganalyzer/ratelimit/$', RateLimitView.as_view()),
+    re_path(r'^api/v1/ganalyzer/httpcache/$', HTTPCacheStatsView.as_view()),
     re_path(r'^api/v1/ganalyzer/analyze/$', AnalyzeView.as_view()),
-    re_path(r'^api/v1/ganalyzer/results/$', AnalysisResultsPollView.as_view())
+    re_path(r'^api/v1/ganalyzer/results/$', AnalysisResultsPollView.as_view()),
+    re_path(r'^api/v1/ganalyzer/results/stream/$', AnalysisResultsStreamView.as_view()),
+    re_path(r'^api/v1/ganalyzer/results/usage/$', AnalysisResultsUsageView.as_view())
 ]
@@ -3,12 +3,13 @@ from rest_framework.response import Response
 from rest_framework.throttling import UserRateThrottle
 from rest_framework import status
 from .dataapi import DataExtractor, RepositoryListGetter, RepositoryCreator,\
-    FlightChecker, AnalysisPerformer
+    FlightChecker, AnalysisPerformer, RateLimitGetter, HTTPCacheStatsGetter
 from commons.decorators import error_decorator
 from commons.utils import AnalysisResultsPoller, Analyzer
+from commons.workers import AnalysisQueueFull
 from .APIPayloadKeyConstants import *
 import logging
-import random
+import uuid
 
 
 LOGGER = logging.getLogger(__name__)
@@ -59,6 +60,38 @@ class FlightCheckView(APIView):
         return Response(response)
 
 
+class RateLimitView(APIView):
+    """Current GitHub rate-limit budget of a token"""
+    throttle_classes = (UserRateThrottle,)
+    http_method_names = ['post']
+
+    @staticmethod
+    @error_decorator
+    def post(request):
+        """GET the rate-limit budget"""
+        data = DataExtractor.get_data_object(request)
+        response, is_error = RateLimitGetter.get_rate_limit(data)
+        if is_error:
+            return Response(response, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(response)
+
+
+class HTTPCacheStatsView(APIView):
+    """Hit/miss counters of the conditional-request cache"""
+    throttle_classes = (UserRateThrottle,)
+    http_method_names = ['post']
+
+    @staticmethod
+    @error_decorator
+    def post(request):
+        """GET the cache counters"""
+        data = DataExtractor.get_data_object(request)
+        response, is_error = HTTPCacheStatsGetter.get_stats(data)
+        if is_error:
+            return Response(response, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(response)
+
+
 class AnalyzeView(APIView):
     """Analyze the GH repository"""
     throttle_classes = (UserRateThrottle,)
@@ -69,12 +102,16 @@ class AnalyzeView(APIView):
     def post(request):
         """Perform Analysis"""
         data = DataExtractor.get_data_object(request)
-        request_id = random.randint(9999, 99999)
+        request_id = uuid.uuid4().hex
         data['request_id'] = request_id
-        response, is_error = Analyzer.perform_analysis_async(data,
-                                                             GH_ANALYSE_REPO_LIST,
-                                                             GH_ANALYSE_REPO_LIST_NAME,
-                                                             AnalysisPerformer)
+        try:
+            response, is_error = Analyzer.perform_analysis_async(data,
+                                                                 GH_ANALYSE_REPO_LIST,
+                                                                 GH_ANALYSE_REPO_LIST_NAME,
+                                                                 AnalysisPerformer,
+                                                                 DataExtractor.get_client_ident(request))
+        except AnalysisQueueFull as ex:
+            return Response({'error': ex.args[0], 'saved': False}, status.HTTP_429_TOO_MANY_REQUESTS)
         if is_error:
             return Response(response, status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response(response)
@@ -94,3 +131,35 @@ class AnalysisResultsPollView(APIView):
         if is_error:
             return Response(response, status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response(response)
+
+
+class AnalysisResultsStreamView(APIView):
+    """Long-poll for Analysis Results newer than a cursor"""
+    throttle_classes = (UserRateThrottle,)
+    http_method_names = ['post']
+
+    @staticmethod
+    @error_decorator
+    def post(request):
+        """Wait for new Results"""
+        data = DataExtractor.get_data_object(request)
+        response, is_error = AnalysisResultsPoller.long_poll(data)
+        if is_error:
+            return Response(response, status.HTTP_400_BAD_REQUEST)
+        return Response(response)
+
+
+class AnalysisResultsUsageView(APIView):
+    """Size and expiry of stored Analysis Results"""
+    throttle_classes = (UserRateThrottle,)
+    http_method_names = ['post']
+
+    @staticmethod
+    @error_decorator
+    def post(request):
+        """GET the usage of a request's results"""
+        data = DataExtractor.get_data_object(request)
+        response, is_error = AnalysisResultsPoller.get_usage(data)
+        if is_error:
+            return Response(response, status.HTTP_404_NOT_FOUND)
+        return Response(response)
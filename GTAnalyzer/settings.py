@@ -149,7 +149,8 @@ USE_TZ = True
 
 GH_API = {
     "GH_TOKEN": os.environ.get("GITHUB_TOKEN"),
-    "BASE": "https://api.github.com",
+    "BASE": os.environ.get("GITHUB_API_BASE", "https://api.github.com"),
+    "WEB_BASE": os.environ.get("GITHUB_WEB_BASE", "https://github.com"),
     "V3_HEADER": "application/vnd.github.v3+json",
     "LIST_REPO": "/user/repos?page={}&",
     "CREATE_REPO": "/user/repos",
@@ -160,15 +161,23 @@ GH_API = {
     "GET_COMMIT": "/repos/{}/{}/commits?",  # /repos/:owner/:repo/commits
     "GET_SINGLE_COMMIT": "/repos/{}/{}/commits/{}",  # /repos/:owner/:repo/commits/:ref
     "GET_COLLAB": "/repos/{}/{}/collaborators?",  # /repos/:owner/:repo/collaborators
-    "GET_PR": "/repos/{}/{}/pulls?state={}",  # /repos/:owner/:repo/pulls
-    "GET_BRANCHES": "/repos/{}/{}/branches",  # /repos/:owner/:repo/branches
+    "GET_PR": "/repos/{}/{}/pulls?",  # /repos/:owner/:repo/pulls
+    "GET_BRANCHES": "/repos/{}/{}/branches?",  # /repos/:owner/:repo/branches
     "GET_SINGLE_PR": "/repos/{}/{}/pulls/{}",  # /repos/:owner/:repo/pulls/:pull_number
+    "COMPARE": "/repos/{}/{}/compare/{}...{}",  # /repos/:owner/:repo/compare/:base...:head
+    "RATE_LIMIT": "/rate_limit",
+    "GRAPHQL": "/graphql",
+    "PER_PAGE": 100,  # largest page size GitHub allows for listings
+    "REPO_LIST_WIDTH": 8,  # repository list pages fetched concurrently
+    "REPO_LIST_CACHE_TTL": int(os.environ.get("GH_REPO_LIST_CACHE_TTL", 60)),  # seconds
+    "REPO_LIST_CACHE_SIZE": 1000,  # tokens
 }
 
 TG_API = {
     "TG_TOKEN": os.environ.get("TAIGA_TOKEN"),
     "BASE": "https://api.taiga.io/api/v1",
     "AUTH": "/auth",
+    "AUTH_REFRESH": "/auth/refresh",
     "MEMBERSHIP": "/projects?member={}",
     "CREATE_PROJECT": "/projects",
     "ADD_MEMBERS": "/memberships/bulk_create",
@@ -182,6 +191,99 @@ TG_API = {
     "MEDIA": "https://media-protected.taiga.io/exports/{}/{}-{}.json"  # /project-id/project-slug-export_id.json
 }
 
+TG_AUTH = {
+    "CACHE_SIZE": int(os.environ.get("TG_AUTH_CACHE_SIZE", 1000)),  # logged in credentials kept
+    "TOKEN_TTL": int(os.environ.get("TG_AUTH_TOKEN_TTL", 3600)),  # seconds, for tokens that don't say when they expire
+    "EXPIRY_MARGIN": 60,  # seconds before expiry a token is no longer handed out
+    # seconds after logging in that credentials are trusted without logging in again; tokens
+    # handed out from the cache or refreshed don't check the password against Taiga
+    "MAX_CREDENTIAL_AGE": int(os.environ.get("TG_AUTH_MAX_CREDENTIAL_AGE", 3600)),
+}
+
+TG_ANALYSIS = {
+    # where board data is collected from: "api" (a request per user story and task for
+    # their history) or "export" (the histories from a single project export dump,
+    # about 5 requests per board)
+    "BACKEND": os.environ.get("TG_ANALYSIS_BACKEND", "api"),
+    "EXPORT_POLL_INTERVAL": float(os.environ.get("TG_EXPORT_POLL_INTERVAL", 2)),  # seconds
+    "EXPORT_TIMEOUT": float(os.environ.get("TG_EXPORT_TIMEOUT", 300)),  # seconds to wait for the dump
+    "EXPORT_CHUNK_SIZE": 1024 * 1024,  # characters of the dump read at a time
+    "HISTORY_WIDTH": int(os.environ.get("TG_HISTORY_WIDTH", 8)),  # concurrent history requests per board
+}
+
+GH_ANALYSIS = {
+    # where repository data is collected from: "rest" (v3), "graphql" (v4, far fewer requests)
+    # or "local": commits from a copy under LOCAL_REPO_ROOT, the rest over REST
+    "BACKEND": os.environ.get("GH_ANALYSIS_BACKEND", "rest"),
+    # <owner>/<repo>.git mirrors or <owner>/<repo> clones; repositories
+    # without a local copy are analysed over REST
+    "LOCAL_REPO_ROOT": os.environ.get("GH_LOCAL_REPO_ROOT", os.path.join(BASE_DIR, 'repos')),
+    "LOCAL_FETCH": os.environ.get("GH_LOCAL_FETCH", "0") == "1",  # git fetch before each analysis
+    "LOCAL_GIT_TIMEOUT": int(os.environ.get("GH_LOCAL_GIT_TIMEOUT", 300)),  # seconds
+    # concurrent single-commit requests per repository analysis; GitHub's secondary
+    # rate limits penalise heavy concurrency from one token, so keep this small
+    "COMMIT_STATS_WIDTH": int(os.environ.get("GH_COMMIT_STATS_WIDTH", 8)),
+    # commit stats never change for a SHA; cached in-process and on disk
+    "COMMIT_STATS_CACHE_SIZE": int(os.environ.get("GH_COMMIT_STATS_CACHE_SIZE", 20000)),
+    "COMMIT_STATS_CACHE_DB": os.environ.get("GH_COMMIT_STATS_CACHE_DB",
+                                            os.path.join(BASE_DIR, 'commit_stats.sqlite3')),
+    # keep each branch's analysed commits and each PR's stats between analyses,
+    # so re-analysing a repository only fetches what changed since the last run
+    "INCREMENTAL": os.environ.get("GH_ANALYSIS_INCREMENTAL", "0") == "1",
+    "HISTORY_DB": os.environ.get("GH_ANALYSIS_HISTORY_DB",
+                                 os.path.join(BASE_DIR, 'analysis_history.sqlite3')),
+    # seconds a branch's or PR's history is kept after the last analysis that used it
+    "HISTORY_TTL": int(os.environ.get("GH_ANALYSIS_HISTORY_TTL", 30 * 24 * 3600)),
+}
+
+GH_RATE_LIMIT = {
+    "MAX_CONCURRENCY": int(os.environ.get("GH_MAX_CONCURRENCY", 10)),  # in-flight requests per token
+    "RESERVE": 50,  # requests per window left untouched
+    "PACE_BELOW": 500,  # spread requests evenly over the window once fewer than this remain
+    "MAX_RETRIES": 5,  # retries of a rate-limited (403/429) request
+    "BACKOFF_BASE": 1.0,  # seconds
+    "BACKOFF_MAX": 120.0,  # seconds
+    "MAX_WAIT": float(os.environ.get("GH_RATE_LIMIT_MAX_WAIT", 3600)),  # longest a request is queued, seconds
+}
+
+ANALYSIS_WORKERS = {
+    "SIZE": int(os.environ.get("ANALYSIS_WORKERS", 4)),  # analyses running at once, per process
+    "MAX_QUEUED": int(os.environ.get("ANALYSIS_MAX_QUEUED", 100)),  # beyond this new analyses get a 429
+    "MAX_QUEUED_PER_USER": int(os.environ.get("ANALYSIS_MAX_QUEUED_PER_USER", 10)),
+    "DRAIN_TIMEOUT": int(os.environ.get("ANALYSIS_DRAIN_TIMEOUT", 25)),  # seconds to finish work on shutdown
+    # repos/boards of one analysis analysed at once; GitHub requests stay within the token's MAX_CONCURRENCY
+    "ENTITY_WIDTH": int(os.environ.get("ANALYSIS_ENTITY_WIDTH", 4)),
+}
+
+ANALYSIS_RESULTS = {
+    # "sqlite" (shared by the workers on one machine), "redis" (shared across machines)
+    # or "memory" (this process only)
+    "BACKEND": os.environ.get("ANALYSIS_RESULTS_BACKEND", "sqlite"),
+    "SQLITE_PATH": os.environ.get("ANALYSIS_RESULTS_SQLITE_PATH",
+                                  os.path.join(BASE_DIR, 'analysis_results.sqlite3')),
+    "REDIS_URL": os.environ.get("REDIS_URL", "redis://localhost:6379/0"),
+    "REDIS_PREFIX": "gtanalyzer:results:",
+    # seconds a request's results are kept after its last write; reads don't extend it
+    "TTL": int(os.environ.get("ANALYSIS_RESULTS_TTL", 3600)),
+    # total size of stored results; least recently written requests are evicted beyond it.
+    # The redis backend leaves this to the server's maxmemory policy
+    "MAX_BYTES": int(os.environ.get("ANALYSIS_RESULTS_MAX_BYTES", 256 * 1024 * 1024)),
+    # longest a results/stream/ request waits for new results; below the gunicorn worker timeout
+    "LONG_POLL_TIMEOUT": float(os.environ.get("ANALYSIS_LONG_POLL_TIMEOUT", 20)),
+    "LONG_POLL_INTERVAL": 0.5,  # seconds between checks for results written by other processes
+}
+
+HTTP_CLIENT = {
+    "POOL_SIZE": int(os.environ.get("HTTP_POOL_SIZE", 10)),  # idle keep-alive connections per host
+    "TIMEOUT": float(os.environ.get("HTTP_TIMEOUT", 30)),  # seconds
+    "IDLE_TIMEOUT": float(os.environ.get("HTTP_IDLE_TIMEOUT", 30)),  # seconds before an idle connection is dropped
+    "MAX_REDIRECTS": 5,
+    "CONDITIONAL_CACHE_SIZE": int(os.environ.get("HTTP_CONDITIONAL_CACHE_SIZE", 1000)),  # revalidatable GET responses
+    # total body bytes of the cached responses; listings of large repositories are big
+    "CONDITIONAL_CACHE_BYTES": int(os.environ.get("HTTP_CONDITIONAL_CACHE_BYTES", 64 * 1024 * 1024)),
+    "CA_FILE": os.environ.get("HTTP_CA_FILE"),  # CA bundle to verify against, e.g. for a local HTTPS stand-in server
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
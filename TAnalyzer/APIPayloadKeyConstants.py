@@ -24,6 +24,7 @@ TG_USERNAME = "username"
 TG_PASSWORD = "password"
 TG_AUTH_TOKEN = "auth_token"
 TG_USER_ID = "user_id"
+TG_REFRESH_TOKEN = "refresh"
 TG_PROJECT_ID = "id"
 TG_PROJECT_PRIVACY = "is_private"
 
@@ -89,4 +90,11 @@ TG_ANLS_PRJ_HIS_DIFF = "values_diff"
 TG_ANLS_PRJ_HIS_STS = "status"
 TG_ANLS_PRJ_HIS_MS = "milestone"
 
-
+# Project Export
+TG_EXP_US = "user_stories"
+TG_EXP_TSK = "tasks"
+TG_EXP_REF = "ref"
+TG_EXP_HIS = "history"
+TG_EXP_HIS_DIFF = "diff"
+TG_EXP_HIS_VALUES = "values"
+TG_EXP_ATTACH = "attachments"  # base64 file contents
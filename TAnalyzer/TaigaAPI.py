@@ -2,12 +2,20 @@
 Module to interact with the GitHub API
 """
 
-from urllib.request import Request, urlopen, urlretrieve
+import urllib.request
+from urllib.error import HTTPError
+from urllib.request import Request
 from GTAnalyzer.settings import TG_API
 from commons.decorators import http_error_decorator
+from commons.http_client import urlopen
+from commons.paging import PageIterator
 from .APIPayloadKeyConstants import *
+import functools
 import json
 import logging
+import os
+import shutil
+import tempfile
 
 
 LOGGER = logging.getLogger(__name__)
@@ -24,6 +32,17 @@ def get_auth_token(payload):
     return json.load(response)
 
 
+@http_error_decorator
+def refresh_auth_token(payload):
+    """Get a new authentication token using a refresh token"""
+    endpoint = "{}{}".format(TG_API.get("BASE"),
+                             TG_API.get("AUTH_REFRESH"))
+    data = str(json.dumps(payload)).encode('utf-8')
+    request_obj = Request(endpoint, data=data, headers=get_headers())
+    response = urlopen(request_obj)
+    return json.load(response)
+
+
 def get_headers(token=None):
     """Get headers for the GitHub API"""
     headers = {
@@ -34,6 +53,13 @@ def get_headers(token=None):
     return headers
 
 
+def get_list_headers(token):
+    """Get headers for a listing, asking for all of it in one response"""
+    headers = get_headers(token)
+    headers.update({"x-disable-pagination": "True"})
+    return headers
+
+
 @http_error_decorator
 def get_membership_details(payload):
     """Get details of a user's memberships"""
@@ -42,7 +68,7 @@ def get_membership_details(payload):
     endpoint = "{}{}".format(TG_API.get("BASE"),
                              TG_API.get("MEMBERSHIP").format(user_id))
     request_obj = Request(endpoint, headers=get_headers(auth_token))
-    response = urlopen(request_obj)
+    response = urlopen(request_obj, conditional=True)
     return json.load(response)
 
 
@@ -78,20 +104,36 @@ def get_project_details(payload):
     endpoint = "{}{}".format(TG_API.get("BASE"),
                              TG_API.get("PROJECT_BY_SLUG").format(project_slug))
     request_obj = Request(endpoint, headers=get_headers(auth_token))
-    response = urlopen(request_obj)
+    response = urlopen(request_obj, conditional=True)
     return json.load(response)
 
 
 @http_error_decorator
 def get_milestones(payload, milestone_key):
-    """Get project milestones/user-stories/tasks"""
+    """Get project milestones/user-stories/tasks.
+    Returns a PageIterator over all of them. Normally the whole listing comes in the
+    first response; should the server paginate anyway, 'x-pagination-next' is followed"""
     project_id = payload.pop(TG_PROJECT_ID)
     auth_token = payload.pop(TG_AUTH_TOKEN)
     endpoint = "{}{}".format(TG_API.get("BASE"),
                              TG_API.get(milestone_key).format(project_id))
-    request_obj = Request(endpoint, headers=get_headers(auth_token))
-    response = urlopen(request_obj)
-    return json.load(response)
+    request_obj = Request(endpoint, headers=get_list_headers(auth_token))
+    response = urlopen(request_obj, conditional=True)
+    return PageIterator(json.load(response), _get_next_page_url(response),
+                        functools.partial(_get_page, auth_token))
+
+
+@http_error_decorator
+def _get_page(auth_token, url):
+    """Get a single page of a listing and the url of the next page"""
+    request_obj = Request(url, headers=get_list_headers(auth_token))
+    response = urlopen(request_obj, conditional=True)
+    return json.load(response), _get_next_page_url(response)
+
+
+def _get_next_page_url(response):
+    """Url of the next page, None on the last (or only) page"""
+    return response.getheader("x-pagination-next") or None
 
 
 @http_error_decorator
@@ -100,7 +142,7 @@ def get_history(_id, auth_token, key):
     endpoint = "{}{}".format(TG_API.get("BASE"),
                              TG_API.get(key).format(_id))
     request_obj = Request(endpoint, headers=get_headers(auth_token))
-    response = urlopen(request_obj)
+    response = urlopen(request_obj, conditional=True)
     return json.load(response)
 
 
@@ -117,15 +159,24 @@ def get_project_export(payload):
 
 
 @http_error_decorator
-def get_exported_data(payload, board_name):
-    """Get project export data dump"""
+def get_exported_data(payload):
+    """Download a project export dump to a temporary file and return its filename.
+    None while the export is still running and the dump isn't there yet"""
     auth_token = payload.pop(TG_AUTH_TOKEN)
     url = payload.pop(TG_EXPORT_DONE)
-    LOGGER.info("URL: %s", url)
-
-    # request_obj = Request(url, headers=get_headers(auth_token))
-    # filename = '{}-dump.json'.format(board_name)
-    filename, headers = urlretrieve(url)
-    LOGGER.info("Filename: %s", filename)
-    LOGGER.info("Headers: %s", headers)
-    return filename
+    request_obj = Request(url, headers=get_headers(auth_token))
+    try:
+        # not through the pooled client, which reads whole responses
+        # into memory; a dump can be 100s of MB
+        response = urllib.request.urlopen(request_obj)
+    except HTTPError as http_e:
+        if http_e.code == 404:
+            return None
+        raise
+    with response, tempfile.NamedTemporaryFile(suffix=".json", delete=False) as dump_file:
+        try:
+            shutil.copyfileobj(response, dump_file)
+        except BaseException:
+            os.remove(dump_file.name)
+            raise
+    return dump_file.name
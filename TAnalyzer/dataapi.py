@@ -1,13 +1,25 @@
 """
 Support Module for Views
 """
+import base64
+import hashlib
+import hmac
 import logging
-from GTAnalyzer.settings import TG_API
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from GTAnalyzer.settings import SECRET_KEY, TG_API, TG_ANALYSIS, TG_AUTH
 from TAnalyzer import TaigaAPI
 from commons.utils import *
+from commons.cache import LRUCache
 from commons.decorators import dataapi_response_decorator
+from commons.executors import bounded_map
+from commons.jsonstream import JSONStreamReader
 
 LOGGER = logging.getLogger(__name__)
+# dates in a project export; fractional seconds are left out when zero
+TG_EXPORT_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
 
 
 class AuthTokenGetter(object):
@@ -17,7 +29,87 @@ class AuthTokenGetter(object):
     @dataapi_response_decorator
     def get_auth_token(data):
         payload = PayloadCreator.create_password_username_payload(data)
-        return TaigaAPI.get_auth_token(payload)
+        return AuthTokenCache.get_instance().get_auth_token(payload)
+
+
+class AuthTokenCache(object):
+    """A thread-safe singleton cache of Taiga logins keyed by an HMAC of the credentials.
+    A token is handed out until shortly before it expires, then refreshed
+    with its refresh token, or failing that the credentials log in again.
+    Neither a cached nor a refreshed token checks the password, so credentials
+    log in again MAX_CREDENTIAL_AGE seconds after they last did"""
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """Get the singleton instance"""
+        with AuthTokenCache.__instance_lock:
+            if AuthTokenCache.__instance is None:
+                AuthTokenCache.__instance = AuthTokenCache()
+            return AuthTokenCache.__instance
+
+    def __init__(self):
+        """Constructor"""
+        # key to (expires_at, logged_in_at, auth response)
+        self._cache = LRUCache(TG_AUTH["CACHE_SIZE"])
+
+    @staticmethod
+    def _make_key(payload):
+        """Keyed with SECRET_KEY, so a leaked key can't be checked against guessed passwords"""
+        credentials = "{}\0{}".format(payload[TG_USERNAME], payload[TG_PASSWORD])
+        return hmac.new(SECRET_KEY.encode("utf-8"), credentials.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def get_auth_token(self, payload):
+        """Auth response for the credentials in payload, logging in only when needed"""
+        key = AuthTokenCache._make_key(payload)
+        entry = self._cache.get(key)
+        if entry is not None:
+            expires_at, logged_in_at, response = entry
+            # after a password change, the old one works here no longer than this
+            if time.time() < logged_in_at + TG_AUTH["MAX_CREDENTIAL_AGE"]:
+                if time.time() < expires_at - TG_AUTH["EXPIRY_MARGIN"]:
+                    return response, False
+                response = AuthTokenCache._refresh(response)
+                if response is not None:
+                    self._store(key, logged_in_at, response)
+                    return response, False
+        response, is_error = TaigaAPI.get_auth_token(payload)
+        if is_error:
+            self._cache.delete(key)
+            return response, is_error
+        self._store(key, time.time(), response)
+        return response, is_error
+
+    def _store(self, key, logged_in_at, response):
+        expires_at = time.time() + TG_AUTH["TOKEN_TTL"]
+        token_expiry = AuthTokenCache._get_token_expiry(response[TG_AUTH_TOKEN])
+        if token_expiry is not None:
+            expires_at = min(expires_at, token_expiry)
+        self._cache.set(key, (expires_at, logged_in_at, response))
+
+    @staticmethod
+    def _refresh(response):
+        """The auth response with a refreshed token, None if it can't be refreshed"""
+        if response.get(TG_REFRESH_TOKEN) is None:
+            return None
+        refreshed, is_error = TaigaAPI.refresh_auth_token({TG_REFRESH_TOKEN: response[TG_REFRESH_TOKEN]})
+        if is_error:
+            LOGGER.info("Token refresh failed: %s", refreshed)
+            return None
+        response = dict(response)
+        response.update(refreshed)
+        return response
+
+    @staticmethod
+    def _get_token_expiry(auth_token):
+        """Expiry (epoch seconds) of a JWT auth token; None for tokens without one"""
+        try:
+            claims = auth_token.split(".")[1]
+            claims += "=" * (-len(claims) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(claims))["exp"])
+        except (IndexError, KeyError, TypeError, ValueError, AttributeError):
+            return None
 
 
 class MembershipDetailsGetter(object):
@@ -124,23 +216,27 @@ class ProjectDetailsGetter(object):
         }
         details, is_error = TaigaAPI.get_project_details(payload)
         if is_error:
-            return {"error": details,
-                    "failed": True, "board_name": board_name}, is_error
+            return ProjectDetailsGetter.make_error(board_name, details), is_error
         return details, is_error
 
     @staticmethod
     def get_milestones(board_name, project_id, auth_token, milestone_key):
-        """Get project milestones/user-stories/tasks"""
+        """Get project milestones/user-stories/tasks, as an iterator over all of them.
+        Its `error` is set if a later page can't be fetched"""
         payload = {
             TG_PROJECT_ID: project_id,
             TG_AUTH_TOKEN: auth_token
         }
         details, is_error = TaigaAPI.get_milestones(payload, milestone_key)
         if is_error:
-            return {"error": details,
-                    "failed": True, "board_name": board_name}, is_error
+            return ProjectDetailsGetter.make_error(board_name, details), is_error
         return details, is_error
 
+    @staticmethod
+    def make_error(board_name, error):
+        return {"error": error,
+                "failed": True, "board_name": board_name}
+
 
 class AnalysisPerformer(object):
     """Perform Analysis on GH repo"""
@@ -155,29 +251,39 @@ class AnalysisPerformer(object):
             .get_project_details_by_slug(board_name, auth_token)
         if is_error:
             return project_details
+        project_slug = project_details[TG_API_PROJECT_SLUG]
         project_details = AnalysisPerformer._extract_project_details(project_details)
+        # the histories of the user stories and tasks in a project export, by (history key, ref)
+        exported_histories = dict()
+        if TG_ANALYSIS["BACKEND"] == "export":
+            exported_histories = AnalysisPerformer._get_export_histories(board_name, project_details.id,
+                                                                         project_slug, auth_token)
         # Get Project Milestones - Provided both Sprint and US
         milestones, is_error = ProjectDetailsGetter\
             .get_milestones(board_name, project_details.id, auth_token, "MILESTONES")
         if is_error:
             return milestones
         project_details.milestones = AnalysisPerformer._extract_milestones(milestones)
+        if milestones.error is not None:
+            return ProjectDetailsGetter.make_error(board_name, milestones.error)
 
         # Get Project Tasks
         tasks, is_error = ProjectDetailsGetter \
             .get_milestones(board_name, project_details.id, auth_token, "TASKS")
         if is_error:
             return tasks
-        tasks = AnalysisPerformer._extract_tasks(tasks)
+        extracted_tasks = AnalysisPerformer._extract_tasks(tasks)
+        if tasks.error is not None:
+            return ProjectDetailsGetter.make_error(board_name, tasks.error)
+        tasks = extracted_tasks
 
         # Integrate Tasks with US
         project_details = AnalysisPerformer._integrate_tasks(project_details, tasks)
 
-        # Get History - For each US and Task
-        project_details = AnalysisPerformer._get_history(project_details, auth_token)
+        # Get History - For each US and Task not in the export
+        project_details = AnalysisPerformer._get_history(project_details, auth_token, exported_histories)
 
-        project_details = json.loads(project_details.to_json())
-        return project_details
+        return project_details.to_dict()
 
     @staticmethod
     def _integrate_tasks(project_details, tasks):
@@ -191,25 +297,120 @@ class AnalysisPerformer(object):
         return project_details
 
     @staticmethod
-    def _get_history(project_details, auth_token):
-        """Get history for user stories and tasks"""
+    def _get_history(project_details, auth_token, exported_histories):
+        """Get history for user stories and tasks, HISTORY_WIDTH requests at a time.
+        Items with a history in exported_histories, keyed by (history key, ref), aren't requested"""
+        # (history key, id) to the user stories/tasks with that id; each history is fetched once
+        items = defaultdict(list)
         for milestone in project_details.milestones:
             for user_story in milestone.user_stories:
-                history, is_error = TaigaAPI.get_history(user_story.id,
-                                                         auth_token, "HISTORY_US")
-                if is_error:
-                    user_story.history = None
-                else:
-                    user_story.history = AnalysisPerformer._extract_history(history)
+                items[("HISTORY_US", user_story.id)].append(user_story)
                 for task in user_story.tasks:
-                    history, is_error = TaigaAPI.get_history(user_story.id,
-                                                             auth_token, "HISTORY_TASK")
-                    if is_error:
-                        task.history = None
-                    else:
-                        task.history = AnalysisPerformer._extract_history(history)
+                    items[("HISTORY_TASK", task.id)].append(task)
+        for key in list(items):
+            history = exported_histories.get((key[0], items[key][0].ref))
+            if history is not None:
+                for item in items.pop(key):
+                    item.history = history
+        keys = list(items)
+        histories = bounded_map(lambda key: TaigaAPI.get_history(key[1], auth_token, key[0]),
+                                keys, TG_ANALYSIS["HISTORY_WIDTH"])
+        for key, (history, is_error) in zip(keys, histories):
+            extracted = None if is_error else AnalysisPerformer._extract_history(history)
+            for item in items[key]:
+                item.history = extracted
         return project_details
 
+    @staticmethod
+    def _get_export_histories(board_name, project_id, project_slug, auth_token):
+        """The histories of the user stories and tasks in a project export, by (history key, ref).
+        The export names users by email and has no ids, so the rest of the board still
+        comes from the listings; only the request per item for its history is saved.
+        Empty if the export can't be had, to request every history instead"""
+        filename = AnalysisPerformer._get_export_dump(board_name, project_id, project_slug, auth_token)
+        if filename is None:
+            return dict()
+        history_keys = {TG_EXP_US: "HISTORY_US", TG_EXP_TSK: "HISTORY_TASK"}
+        try:
+            with open(filename, encoding="utf-8") as dump_file:
+                # dumps inline attachments as base64 and can be 100s of MB;
+                # read only the items needed and skip over the attachments
+                items = JSONStreamReader(dump_file, TG_ANALYSIS["EXPORT_CHUNK_SIZE"])\
+                    .iter_arrays(tuple(history_keys), skip_keys=(TG_EXP_ATTACH,))
+                return {(history_keys[key], item[TG_EXP_REF]):
+                        AnalysisPerformer._extract_export_history(item.get(TG_EXP_HIS) or [])
+                        for key, item in items}
+        except (ValueError, KeyError) as ex:
+            # a truncated or malformed dump, or items without the fields read
+            LOGGER.warning("Export dump of '%s' can't be read: %r", board_name, ex)
+            return dict()
+        finally:
+            os.remove(filename)
+
+    @staticmethod
+    def _get_export_dump(board_name, project_id, project_slug, auth_token):
+        """Request a project export and wait for its dump. Returns the dump's filename,
+        None if the export fails or isn't done within EXPORT_TIMEOUT"""
+        export, is_error = TaigaAPI.get_project_export({TG_PROJECT_ID: project_id,
+                                                        TG_AUTH_TOKEN: auth_token})
+        if is_error:
+            LOGGER.warning("Export of '%s' failed: %s", board_name, export)
+            return None
+        export = export["response"]
+        if TG_EXPORT_DONE in export:
+            # small projects are exported synchronously
+            url = export[TG_EXPORT_DONE]
+        else:
+            url = AnalysisPerformer._make_project_export_url(project_id, project_slug,
+                                                             export[TG_EXPORT_REQUESTED])
+        deadline = time.monotonic() + TG_ANALYSIS["EXPORT_TIMEOUT"]
+        while True:
+            filename, is_error = TaigaAPI.get_exported_data({TG_AUTH_TOKEN: auth_token,
+                                                             TG_EXPORT_DONE: url})
+            if is_error:
+                LOGGER.warning("Export dump of '%s' failed: %s", board_name, filename)
+                return None
+            if filename is not None:
+                return filename
+            # the dump isn't there until the export finishes
+            if time.monotonic() >= deadline:
+                LOGGER.warning("Export of '%s' not ready after %ss", board_name,
+                               TG_ANALYSIS["EXPORT_TIMEOUT"])
+                return None
+            time.sleep(TG_ANALYSIS["EXPORT_POLL_INTERVAL"])
+
+    @staticmethod
+    def _extract_export_history(history):
+        """Extract history details from the history of an exported item"""
+        extracted = list()
+        for event in history:
+            tmp = HistoryEventDetails()
+            tmp.created_at = AnalysisPerformer._extract_export_date(event.get(TG_ANLS_PRJ_HIS_CR_DT))
+            tmp.diff = AnalysisPerformer._make_values_diff(event.get(TG_EXP_HIS_DIFF) or {},
+                                                           event.get(TG_EXP_HIS_VALUES) or {})
+            extracted.append(tmp)
+        return extracted
+
+    @staticmethod
+    def _make_values_diff(diff, values):
+        """The values_diff of the history API: ids in the raw diff replaced by the names in values"""
+        values_diff = dict()
+        for key, change in diff.items():
+            names = values.get(key)
+            if isinstance(names, dict) and isinstance(change, list):
+                change = [names.get(str(value), value) for value in change]
+            values_diff[key] = change
+        return values_diff
+
+    @staticmethod
+    def _extract_export_date(date_str):
+        """Exported dates are full ISO 8601 datetimes with an offset; their date
+        in UTC, as the API's dates have it"""
+        if date_str is None:
+            return date_str
+        _format = TG_EXPORT_DATETIME_FORMAT if "." in date_str else TG_EXPORT_DATETIME_FORMAT.replace(".%f", "")
+        return datetime.strptime(date_str, _format).astimezone(timezone.utc).date().isoformat()
+
     @staticmethod
     def _make_project_export_url(project_id, project_slug, export_id):
         """Get the export url string"""
@@ -339,5 +540,7 @@ class MilestonesGetter(object):
             tmp.estimated_start = milestone[TG_ANLS_PRJ_MS_EST_SRT]
             tmp.modified_date = DateTimeFormatter\
                 .format_isodate_to_date(milestone[TG_ANLS_PRJ_MS_MD_DT])
-            details.append(json.loads(tmp.to_json()))
+            details.append(tmp.to_dict())
+        if milestones.error is not None:
+            return ProjectDetailsGetter.make_error(data[TG_API_PROJECT_NAME], milestones.error), True
         return details, is_error
@@ -0,0 +1,217 @@
+"""A Taiga board served by a local stand-in for the Taiga API and its export media"""
+
+import base64
+import re
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from GTAnalyzer.settings import TG_API, TG_ANALYSIS
+from commons.tests.server import StandInServer
+
+PROJECT_ID = 7
+PROJECT_SLUG = "team-board"
+EXPORT_ID = "3f2a"
+STATUSES = {1: "New", 2: "In progress", 3: "Done"}
+
+
+class FixtureBoard(object):
+    """Members, milestones, user stories and tasks, each with a history,
+    as the API lists them and as a project export dumps them"""
+
+    def __init__(self, num_milestones=3, stories_per_milestone=4, tasks_per_story=3):
+        # the UTC offset the export gives its dates in
+        self.export_offset = timedelta(0)
+        self.members = [{"id": 100 + i, "username": name, "email": "{}@example.com".format(name),
+                         "full_name_display": name.title()}
+                        for i, name in enumerate(("alice", "bob", "carol"))]
+        self.milestones = []
+        self.user_stories = []
+        self.tasks = []
+        ref = 0
+        for m in range(num_milestones):
+            self.milestones.append({"id": 500 + m, "name": "Sprint {}".format(m + 1),
+                                    "slug": "sprint-{}".format(m + 1), "closed": m == 0,
+                                    "total_points": 20.0, "closed_points": 5.0 * m,
+                                    "created_date": "2020-01-0{}T09:00:00.000000Z".format(m + 1),
+                                    "modified_date": "2020-01-0{}T18:30:00.250000Z".format(m + 2),
+                                    "estimated_start": "2020-01-0{}".format(m + 1),
+                                    "estimated_finish": "2020-01-1{}".format(m + 1)})
+        # the last user story is in the backlog, with no milestone
+        for s in range(num_milestones * stories_per_milestone + 1):
+            ref += 1
+            milestone = self.milestones[s // stories_per_milestone] \
+                if s < num_milestones * stories_per_milestone else None
+            self.user_stories.append(self._make_item(2000 + s, ref, s, milestone=milestone))
+            for t in range(tasks_per_story):
+                ref += 1
+                task = self._make_item(3000 + s * tasks_per_story + t, ref, s + t)
+                task["user_story"] = self.user_stories[-1]
+                self.tasks.append(task)
+
+    def _make_item(self, item_id, ref, seed, milestone=None):
+        member = self.members[seed % len(self.members)] if seed % 4 else None
+        status = seed % 3 + 1
+        return {"id": item_id, "ref": ref, "subject": "Item {}".format(ref), "milestone": milestone,
+                "status": status, "assigned_to": member, "is_closed": status == 3,
+                "total_points": float(seed % 5),
+                "created_date": "2020-02-{:02d}T08:15:00.000000Z".format(seed % 28 + 1),
+                "modified_date": "2020-03-{:02d}T23:59:59.999999Z".format(seed % 28 + 1),
+                "finish_date": "2020-04-01T00:00:00.000001Z" if status == 3 else None,
+                "due_date": None,
+                "history": [{"at": "2020-02-{:02d}T10:00:00.{:06d}".format(seed % 28 + 1, day),
+                             "from": 1, "to": status} for day in range(seed % 3)]}
+
+    @staticmethod
+    def _api_item(item):
+        member = item["assigned_to"]
+        return {"id": item["id"], "ref": item["ref"], "subject": item["subject"],
+                "status_extra_info": {"name": STATUSES[item["status"]]},
+                "assigned_to_extra_info": None if member is None else {"username": member["username"]},
+                "is_closed": item["is_closed"], "total_points": item["total_points"],
+                "created_date": item["created_date"], "modified_date": item["modified_date"],
+                "finish_date": item["finish_date"], "finished_date": item["finish_date"],
+                "due_date": item["due_date"]}
+
+    def api_project(self):
+        return {"id": PROJECT_ID, "name": "Team Board", "slug": PROJECT_SLUG,
+                "members": [{key: member[key] for key in ("id", "username", "full_name_display")}
+                            for member in self.members]}
+
+    def api_milestones(self):
+        milestones = []
+        for milestone in self.milestones:
+            milestone = dict(milestone)
+            milestone["user_stories"] = [FixtureBoard._api_item(us) for us in self.user_stories
+                                         if us["milestone"] is not None and us["milestone"]["id"] == milestone["id"]]
+            milestones.append(milestone)
+        return milestones
+
+    def api_tasks(self):
+        return [dict(FixtureBoard._api_item(task), user_story=task["user_story"]["id"]) for task in self.tasks]
+
+    def api_history(self, kind, item_id):
+        """The history of the user story ("userstory") or task ("task") with that id"""
+        items = self.user_stories if kind == "userstory" else self.tasks
+        item = next(item for item in items if item["id"] == item_id)
+        return [{"created_at": event["at"] + "Z",
+                 "values_diff": {"status": [STATUSES[event["from"]], STATUSES[event["to"]]]}}
+                for event in item["history"]]
+
+    def _export_date(self, date_str):
+        """An API date (UTC) as the export has it, in export_offset"""
+        moment = datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+        return moment.astimezone(timezone(self.export_offset)).strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+
+    def _export_item(self, item):
+        member = item["assigned_to"]
+        return {"ref": item["ref"], "subject": item["subject"], "status": STATUSES[item["status"]],
+                "assigned_to": None if member is None else member["email"],
+                "is_closed": item["is_closed"],
+                "created_date": item["created_date"].replace("Z", "+0000"),
+                "modified_date": item["modified_date"].replace("Z", "+0000"),
+                "history": [{"created_at": self._export_date(event["at"] + "Z"),
+                             "diff": {"status": [event["from"], event["to"]]},
+                             "values": {"status": {str(key): name for key, name in STATUSES.items()}}}
+                            for event in item["history"]],
+                "attachments": [{"name": "notes.txt",
+                                 "attached_file": {"data": base64.b64encode(b"x" * 3000).decode("ascii")}}]}
+
+    def export_dump(self):
+        """The dump of a project export; users by email, items by ref, no ids"""
+        return {"slug": PROJECT_SLUG, "name": "Team Board",
+                "memberships": [{"user": member["email"], "email": member["email"], "role": "Back"}
+                                for member in self.members],
+                "milestones": [{"name": m["name"], "slug": m["slug"], "closed": m["closed"]}
+                               for m in self.milestones],
+                "user_stories": [dict(self._export_item(us),
+                                      milestone=None if us["milestone"] is None else us["milestone"]["name"])
+                                 for us in self.user_stories],
+                "tasks": [dict(self._export_item(task), user_story=task["user_story"]["ref"])
+                          for task in self.tasks]}
+
+
+class TaigaStandIn(object):
+    """Serves a FixtureBoard. The export dump is missing (404) for the first
+    `pending_polls` downloads, as while an export runs; `dump_status` overrides it,
+    and `dump_body`, if set, is sent instead of the dump. The histories of the
+    (kind, id) pairs in `failing_histories` answer with a server error"""
+
+    ROUTES = (
+        (re.compile(r"/api/v1/projects/by_slug\Z"), "_project"),
+        (re.compile(r"/api/v1/milestones\Z"), "_milestones"),
+        (re.compile(r"/api/v1/tasks\Z"), "_tasks"),
+        (re.compile(r"/api/v1/history/(userstory|task)/(\d+)\Z"), "_history"),
+        (re.compile(r"/api/v1/exporter/(\d+)\Z"), "_export"),
+        (re.compile(r"/media/exports/(\d+)/([\w-]+)\.json\Z"), "_dump"),
+    )
+
+    def __init__(self, board):
+        self.board = board
+        self.pending_polls = 0
+        self.dump_status = None
+        self.dump_body = None
+        self.failing_histories = set()
+        self.server = StandInServer(self.handle)
+
+    def handle(self, request):
+        for pattern, name in TaigaStandIn.ROUTES:
+            match = pattern.match(request.route)
+            if match is not None:
+                return getattr(self, name)(request, *match.groups())
+        return 404, {}, {"_error_message": "Not found."}
+
+    def _project(self, request):
+        return 200, {}, self.board.api_project()
+
+    def _milestones(self, request):
+        return 200, {}, self.board.api_milestones()
+
+    def _tasks(self, request):
+        return 200, {}, self.board.api_tasks()
+
+    def _history(self, request, kind, item_id):
+        if (kind, int(item_id)) in self.failing_histories:
+            return 500, {}, {"_error_message": "Server error."}
+        return 200, {}, self.board.api_history(kind, int(item_id))
+
+    def _export(self, request, project_id):
+        return 202, {}, {"export_id": EXPORT_ID}
+
+    def _dump(self, request, project_id, name):
+        if self.dump_status is not None:
+            return self.dump_status, {}, {"_error_message": "No."}
+        if self.pending_polls > 0:
+            self.pending_polls -= 1
+            return 404, {}, {"_error_message": "Not found."}
+        if self.dump_body is not None:
+            return 200, {}, self.dump_body
+        return 200, {}, self.board.export_dump()
+
+
+class TaigaStandInTestCase(unittest.TestCase):
+    """Runs a TaigaStandIn serving a FixtureBoard; TG_API points at it"""
+
+    def setUp(self):
+        self.board = FixtureBoard()
+        self.taiga = TaigaStandIn(self.board)
+        self.taiga.server.start()
+        self.addCleanup(self.taiga.server.stop)
+        base_url = self.taiga.server.base_url
+        patches = [mock.patch.dict(TG_API, {"BASE": base_url + "/api/v1",
+                                            "MEDIA": base_url + "/media/exports/{}/{}-{}.json"}),
+                   mock.patch.dict(TG_ANALYSIS, {"BACKEND": "api", "EXPORT_POLL_INTERVAL": 0.01,
+                                                 "EXPORT_CHUNK_SIZE": 1024})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def analyse(self, **settings):
+        """The analysis of the board, with TG_ANALYSIS settings overridden"""
+        from TAnalyzer.dataapi import AnalysisPerformer
+        with mock.patch.dict(TG_ANALYSIS, settings):
+            return AnalysisPerformer.perform_analysis({"name": PROJECT_SLUG}, {"auth_token": "token"})
+
+    def count_requests(self, route_prefix="", since=0):
+        return sum(1 for request in self.taiga.server.requests[since:]
+                   if request.route.startswith(route_prefix))
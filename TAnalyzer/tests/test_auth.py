@@ -0,0 +1,139 @@
+"""Tests of the Taiga login cache"""
+
+import base64
+import hashlib
+import json
+import time
+import unittest
+from unittest import mock
+
+from GTAnalyzer.settings import TG_AUTH
+from TAnalyzer import dataapi
+from TAnalyzer.dataapi import AuthTokenCache
+
+CREDENTIALS = {"username": "alice", "password": "pw"}
+
+
+def make_jwt(expires_at, name):
+    """An unsigned JWT; only its exp claim is read"""
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": expires_at, "name": name}).encode()).rstrip(b"=")
+    return "header.{}.signature".format(claims.decode("ascii"))
+
+
+class Clock(object):
+    """Stands in for the time module in TAnalyzer.dataapi"""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+
+class AuthTokenCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = AuthTokenCache()
+
+    def test_key_is_a_full_keyed_digest(self):
+        payload = {"username": "alice", "password": "hunter2"}
+        key = AuthTokenCache._make_key(payload)
+        self.assertRegex(key, r"\A[0-9a-f]{64}\Z")
+        self.assertNotEqual(key, hashlib.sha256(b"alice\0hunter2").hexdigest())
+        with mock.patch("TAnalyzer.dataapi.SECRET_KEY", "another secret"):
+            self.assertNotEqual(AuthTokenCache._make_key(payload), key)
+
+    def test_logs_in_once_per_credentials(self):
+        login = mock.Mock(side_effect=lambda payload: ({"auth_token": payload["username"]}, False))
+        with mock.patch("TAnalyzer.dataapi.TaigaAPI.get_auth_token", login):
+            for username in ("alice", "bob", "alice"):
+                response, is_error = self.cache.get_auth_token({"username": username, "password": "pw"})
+                self.assertEqual((response, is_error), ({"auth_token": username}, False))
+        self.assertEqual(login.call_count, 2)
+
+
+class AuthTokenRefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = AuthTokenCache()
+        self.clock = Clock()
+        self.logins = 0
+        self.refreshes = []
+        # refresh fails when refresh_error is set
+        self.refresh_error = None
+        patches = [mock.patch.object(dataapi, "time", self.clock),
+                   mock.patch("TAnalyzer.dataapi.TaigaAPI.get_auth_token", self._login),
+                   mock.patch("TAnalyzer.dataapi.TaigaAPI.refresh_auth_token", self._refresh)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _login(self, payload):
+        self.logins += 1
+        return {"auth_token": make_jwt(self.clock.now + 600, "login{}".format(self.logins)),
+                "refresh": "refresh{}".format(self.logins), "id": 5}, False
+
+    def _refresh(self, payload):
+        self.refreshes.append(payload["refresh"])
+        if self.refresh_error is not None:
+            return self.refresh_error, True
+        return {"auth_token": make_jwt(self.clock.now + 600, "refreshed{}".format(len(self.refreshes))),
+                "refresh": "refresh-r{}".format(len(self.refreshes))}, False
+
+    def get_token(self):
+        response, is_error = self.cache.get_auth_token(dict(CREDENTIALS))
+        self.assertFalse(is_error)
+        return response
+
+    def test_token_is_reused_until_within_the_expiry_margin(self):
+        first = self.get_token()
+        self.clock.now += 600 - TG_AUTH["EXPIRY_MARGIN"] - 1
+        self.assertEqual(self.get_token(), first)
+        self.assertEqual(self.refreshes, [])
+        self.clock.now += 2
+        self.assertNotEqual(self.get_token(), first)
+        self.assertEqual((self.logins, self.refreshes), (1, ["refresh1"]))
+
+    def test_refreshed_token_is_handed_out_and_cached(self):
+        self.get_token()
+        self.clock.now += 590
+        refreshed = self.get_token()
+        self.assertEqual(refreshed["auth_token"], make_jwt(self.clock.now + 600, "refreshed1"))
+        # the rest of the login response is kept
+        self.assertEqual((refreshed["refresh"], refreshed["id"]), ("refresh-r1", 5))
+        self.clock.now += 10
+        self.assertEqual(self.get_token(), refreshed)
+        # the next refresh uses the new refresh token
+        self.clock.now += 590
+        self.get_token()
+        self.assertEqual((self.logins, self.refreshes), (1, ["refresh1", "refresh-r1"]))
+
+    def test_failed_refresh_logs_in_again(self):
+        self.get_token()
+        self.clock.now += 590
+        self.refresh_error = {"type": "HTTPError", "message": "Unauthorized"}
+        with self.assertLogs("TAnalyzer.dataapi", "INFO"):
+            response = self.get_token()
+        self.assertEqual(response["auth_token"], make_jwt(self.clock.now + 600, "login2"))
+        self.assertEqual((self.logins, self.refreshes), (2, ["refresh1"]))
+
+    def test_credentials_log_in_again_after_the_maximum_age(self):
+        self.get_token()
+        # refreshed again and again, never logging in
+        for _ in range(TG_AUTH["MAX_CREDENTIAL_AGE"] // 590):
+            self.clock.now += 590
+            self.get_token()
+        self.assertEqual(self.logins, 1)
+        self.clock.now += 590
+        self.get_token()
+        self.assertEqual(self.logins, 2)
+
+    def test_failed_login_is_not_cached(self):
+        self.get_token()
+        self.clock.now += TG_AUTH["MAX_CREDENTIAL_AGE"]
+        with mock.patch("TAnalyzer.dataapi.TaigaAPI.get_auth_token",
+                        return_value=({"type": "HTTPError", "message": "Unauthorized"}, True)):
+            _response, is_error = self.cache.get_auth_token(dict(CREDENTIALS))
+        self.assertTrue(is_error)
+        self.get_token()
+        self.assertEqual(self.logins, 2)
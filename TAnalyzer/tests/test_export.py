@@ -0,0 +1,79 @@
+"""Tests of the project export analysis backend against the per-item API one"""
+
+import json
+from datetime import timedelta
+
+from TAnalyzer.dataapi import AnalysisPerformer
+from TAnalyzer.tests.taiga import TaigaStandInTestCase
+
+
+class ExportAnalysisTest(TaigaStandInTestCase):
+
+    def test_export_builds_the_same_tree_as_the_api(self):
+        expected = self.analyse(BACKEND="api")
+        self.assertIn("milestones", expected)
+        self.assertGreater(self.count_requests("/api/v1/history/"), 40)
+        since = len(self.taiga.server.requests)
+        self.taiga.pending_polls = 2
+        self.assertEqual(self.analyse(BACKEND="export"), expected)
+        # project, export, 3 dump downloads (two while pending), milestones, tasks
+        self.assertEqual(self.count_requests(since=since), 7)
+        self.assertEqual(self.count_requests("/api/v1/history/", since), 0)
+
+    def test_dump_is_fetched_with_the_auth_token(self):
+        self.analyse(BACKEND="export")
+        dump_requests = [request for request in self.taiga.server.requests
+                         if request.route.startswith("/media/")]
+        self.assertEqual([request.headers["Authorization"] for request in dump_requests], ["Bearer token"])
+
+    def test_auth_error_on_dump_falls_back_at_once(self):
+        expected = self.analyse(BACKEND="api")
+        since = len(self.taiga.server.requests)
+        self.taiga.dump_status = 403
+        with self.assertLogs("TAnalyzer.dataapi", "WARNING"):
+            self.assertEqual(self.analyse(BACKEND="export", EXPORT_TIMEOUT=60), expected)
+        self.assertEqual(self.count_requests("/media/", since), 1)
+
+    def test_export_not_ready_in_time_falls_back(self):
+        expected = self.analyse(BACKEND="api")
+        self.taiga.pending_polls = 10 ** 6
+        with self.assertLogs("TAnalyzer.dataapi", "WARNING"):
+            self.assertEqual(self.analyse(BACKEND="export", EXPORT_TIMEOUT=0.05), expected)
+
+    def test_dates_with_an_offset_are_taken_in_utc(self):
+        expected = self.analyse(BACKEND="api")
+        # 10:00 UTC, the time of every history event, is the day before at -11:00
+        self.board.export_offset = timedelta(hours=-11)
+        self.assertEqual(self.analyse(BACKEND="export"), expected)
+        self.board.export_offset = timedelta(hours=14)
+        self.assertEqual(self.analyse(BACKEND="export"), expected)
+
+    def test_extract_export_date(self):
+        self.assertEqual(AnalysisPerformer._extract_export_date("2020-02-01T23:30:00.000000-0100"), "2020-02-02")
+        self.assertEqual(AnalysisPerformer._extract_export_date("2020-02-01T00:30:00+01:00"), "2020-01-31")
+        self.assertEqual(AnalysisPerformer._extract_export_date("2020-02-01T00:30:00.5+0000"), "2020-02-01")
+        self.assertIsNone(AnalysisPerformer._extract_export_date(None))
+
+    def assert_unreadable_dump_falls_back(self, body):
+        expected = self.analyse(BACKEND="api")
+        histories = self.count_requests("/api/v1/history/")
+        since = len(self.taiga.server.requests)
+        self.taiga.dump_body = body
+        with self.assertLogs("TAnalyzer.dataapi", "WARNING"):
+            self.assertEqual(self.analyse(BACKEND="export"), expected)
+        # every history is requested instead
+        self.assertEqual(self.count_requests("/api/v1/history/", since), histories)
+
+    def test_truncated_dump_falls_back(self):
+        dump = json.dumps(self.board.export_dump()).encode("utf-8")
+        self.assert_unreadable_dump_falls_back(dump[:len(dump) // 2])
+
+    def test_item_without_a_ref_falls_back(self):
+        dump = self.board.export_dump()
+        del dump["tasks"][3]["ref"]
+        self.assert_unreadable_dump_falls_back(json.dumps(dump).encode("utf-8"))
+
+    def test_bad_date_falls_back(self):
+        dump = self.board.export_dump()
+        dump["user_stories"][1]["history"] = [{"created_at": "yesterday"}]
+        self.assert_unreadable_dump_falls_back(json.dumps(dump).encode("utf-8"))
@@ -0,0 +1,64 @@
+"""Tests of the per-item history requests of the API analysis backend"""
+
+from TAnalyzer.dataapi import AnalysisPerformer
+from TAnalyzer.tests.taiga import TaigaStandInTestCase
+
+
+class HistoryTest(TaigaStandInTestCase):
+
+    def items(self, analysis):
+        """(kind, id) to the history of each user story and task in an analysis, in board order"""
+        items = []
+        for milestone in analysis["milestones"]:
+            for user_story in milestone["user_stories"]:
+                items.append((("userstory", user_story["id"]), user_story["history"]))
+                items.extend((("task", task["id"]), task["history"]) for task in user_story["tasks"])
+        return items
+
+    def history_requests(self):
+        return [tuple(request.route.split("/")[-2:]) for request in self.taiga.server.requests
+                if request.route.startswith("/api/v1/history/")]
+
+    def expected_history(self, kind, item_id):
+        return [event.to_dict() for event in
+                AnalysisPerformer._extract_history(self.board.api_history(kind, item_id))]
+
+    def test_every_item_gets_its_own_history(self):
+        items = self.items(self.analyse())
+        self.assertTrue(any(kind == "task" for (kind, _item_id), _history in items))
+        for (kind, item_id), history in items:
+            self.assertEqual(history, self.expected_history(kind, item_id), (kind, item_id))
+        # tasks are asked for under their own id
+        self.assertEqual(sorted(self.history_requests()),
+                         sorted((kind, str(item_id)) for (kind, item_id), _history in items))
+
+    def test_task_sharing_an_id_with_a_user_story_is_asked_for_as_a_task(self):
+        self.board.tasks[4]["id"] = self.board.user_stories[0]["id"]
+        items = dict(self.items(self.analyse()))
+        item_id = self.board.user_stories[0]["id"]
+        self.assertNotEqual(self.expected_history("task", item_id), self.expected_history("userstory", item_id))
+        self.assertEqual(items[("task", item_id)], self.expected_history("task", item_id))
+        self.assertEqual(items[("userstory", item_id)], self.expected_history("userstory", item_id))
+
+    def test_each_history_is_requested_once(self):
+        # the first tasks listed twice, so attached twice to their user story
+        tasks = self.board.api_tasks()
+        self.board.api_tasks = lambda: tasks + tasks[:2]
+        analysis = self.analyse()
+        requests = self.history_requests()
+        self.assertEqual(len(requests), len(set(requests)))
+        twice = [task for milestone in analysis["milestones"] for user_story in milestone["user_stories"]
+                 for task in user_story["tasks"] if task["id"] == tasks[0]["id"]]
+        self.assertEqual(len(twice), 2)
+        self.assertEqual(twice[0]["history"], self.expected_history("task", tasks[0]["id"]))
+        self.assertEqual(twice[1]["history"], twice[0]["history"])
+
+    def test_failed_history_leaves_only_that_item_without_one(self):
+        expected = dict(self.items(self.analyse()))
+        failing = ("task", self.board.tasks[2]["id"])
+        self.assertTrue(expected[failing])
+        self.taiga.failing_histories.add(failing)
+        items = dict(self.items(self.analyse()))
+        self.assertIsNone(items.pop(failing))
+        del expected[failing]
+        self.assertEqual(items, expected)
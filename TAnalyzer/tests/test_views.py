@@ -0,0 +1,24 @@
+"""Tests of the TAnalyzer views"""
+
+import unittest
+from unittest import mock
+
+from rest_framework.test import APIRequestFactory
+
+from TAnalyzer.views import AnalyzeView
+
+
+class AnalyzeViewTest(unittest.TestCase):
+
+    def _analyze(self):
+        with mock.patch("TAnalyzer.views.Analyzer.perform_analysis_async",
+                        side_effect=lambda data, *args: ({"request_id": data["request_id"]}, False)):
+            response = AnalyzeView.as_view()(APIRequestFactory().post("/analyze/", {}, format="json"))
+        self.assertEqual(response.status_code, 200)
+        return response.data["request_id"]
+
+    def test_request_ids_are_unguessable_and_unique(self):
+        request_ids = {self._analyze() for _ in range(50)}
+        self.assertEqual(len(request_ids), 50)
+        for request_id in request_ids:
+            self.assertRegex(request_id, r"\A[0-9a-f]{32}\Z")
@@ -8,5 +8,7 @@ urlpatterns = [
     re_path(r'^api/v1/tanalyzer/createboard/$', CreateBoardView.as_view()),
     re_path(r'^api/v1/tanalyzer/analyze/$', AnalyzeView.as_view()),
     re_path(r'^api/v1/tanalyzer/milestones/$', MilestonesView.as_view()),
-    re_path(r'^api/v1/tanalyzer/results/$', AnalysisResultsPollView.as_view())
+    re_path(r'^api/v1/tanalyzer/results/$', AnalysisResultsPollView.as_view()),
+    re_path(r'^api/v1/tanalyzer/results/stream/$', AnalysisResultsStreamView.as_view()),
+    re_path(r'^api/v1/tanalyzer/results/usage/$', AnalysisResultsUsageView.as_view())
 ]
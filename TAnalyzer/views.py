@@ -1,9 +1,10 @@
-import random
+import uuid
 
 from rest_framework.views import APIView
 from rest_framework.throttling import UserRateThrottle
 from commons.decorators import *
 from commons.utils import DataExtractor, Analyzer, AnalysisResultsPoller
+from commons.workers import AnalysisQueueFull
 from .APIPayloadKeyConstants import *
 from .dataapi import AuthTokenGetter, MembershipDetailsGetter, \
     ProjectBoardCreator, AnalysisPerformer, MilestonesGetter
@@ -61,12 +62,16 @@ class AnalyzeView(APIView):
     def post(request):
         """Perform Analysis"""
         data = DataExtractor.get_data_object(request)
-        request_id = random.randint(9999, 99999)
+        request_id = uuid.uuid4().hex
         data['request_id'] = request_id
-        response, is_error = Analyzer.perform_analysis_async(data,
-                                                             TG_ANLS_RP_LST,
-                                                             TG_ANLS_RP_LST_NAME,
-                                                             AnalysisPerformer)
+        try:
+            response, is_error = Analyzer.perform_analysis_async(data,
+                                                                 TG_ANLS_RP_LST,
+                                                                 TG_ANLS_RP_LST_NAME,
+                                                                 AnalysisPerformer,
+                                                                 DataExtractor.get_client_ident(request))
+        except AnalysisQueueFull as ex:
+            return Response({'error': ex.args[0], 'saved': False}, status.HTTP_429_TOO_MANY_REQUESTS)
         if is_error:
             return Response(response, status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response(response)
@@ -88,6 +93,38 @@ class AnalysisResultsPollView(APIView):
         return Response(response)
 
 
+class AnalysisResultsStreamView(APIView):
+    """Long-poll for Analysis Results newer than a cursor"""
+    throttle_classes = (UserRateThrottle,)
+    http_method_names = ['post']
+
+    @staticmethod
+    @error_decorator
+    def post(request):
+        """Wait for new Results"""
+        data = DataExtractor.get_data_object(request)
+        response, is_error = AnalysisResultsPoller.long_poll(data)
+        if is_error:
+            return Response(response, status.HTTP_400_BAD_REQUEST)
+        return Response(response)
+
+
+class AnalysisResultsUsageView(APIView):
+    """Size and expiry of stored Analysis Results"""
+    throttle_classes = (UserRateThrottle,)
+    http_method_names = ['post']
+
+    @staticmethod
+    @error_decorator
+    def post(request):
+        """GET the usage of a request's results"""
+        data = DataExtractor.get_data_object(request)
+        response, is_error = AnalysisResultsPoller.get_usage(data)
+        if is_error:
+            return Response(response, status.HTTP_404_NOT_FOUND)
+        return Response(response)
+
+
 class MilestonesView(APIView):
     """Get Milestones for a board"""
     throttle_classes = (UserRateThrottle,)
@@ -0,0 +1,24 @@
+"""Reproducible micro-benchmarks; run one with `python -m benchmarks.<name>` from the repository root"""
+
+import os
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "GTAnalyzer.settings")
+
+
+def timeit(func, repeat=5):
+    """Best wall-clock time of repeat calls of func, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, seconds, baseline=None):
+    line = "{:<40} {:>10.4f}s".format(name, seconds)
+    if baseline is not None:
+        line += "  {:>6.1f}x".format(baseline / seconds)
+    print(line)
@@ -0,0 +1,56 @@
+"""DateTimeFormatter's regex fast path and cache vs plain strptime,
+on seeded GitHub and Taiga timestamps with the repetition of real payloads"""
+
+import random
+from datetime import datetime, timezone
+
+from benchmarks import timeit, report
+from commons.utils import DateTimeFormatter, GITHUB_DATETIME_FORMAT, TAIGA_DATETIME_FORMAT
+
+NUM_TIMESTAMPS = 100000
+# distinct timestamps among them; commits, PRs and history events often share one
+NUM_DISTINCT = 20000
+
+
+def make_timestamps(seed, _format):
+    rng = random.Random(seed)
+    distinct = [datetime.fromtimestamp(rng.randint(1500000000, 1700000000) + rng.random(),
+                                     timezone.utc).strftime(_format)
+                for _ in range(NUM_DISTINCT)]
+    return [rng.choice(distinct) for _ in range(NUM_TIMESTAMPS)]
+
+
+def with_strptime(timestamps, _format):
+    for date_str in timestamps:
+        datetime.strptime(date_str, _format).date().isoformat()
+
+
+def main():
+    github = make_timestamps(1, GITHUB_DATETIME_FORMAT)
+    taiga = make_timestamps(2, TAIGA_DATETIME_FORMAT)
+
+    def uncached(func):
+        # every timing starts from an empty cache
+        def run():
+            DateTimeFormatter._to_date_str.cache_clear()
+            DateTimeFormatter.parse_github_datetime.cache_clear()
+            func()
+        return run
+
+    print("{} timestamps, {} distinct".format(NUM_TIMESTAMPS, NUM_DISTINCT))
+    baseline = timeit(lambda: with_strptime(github, GITHUB_DATETIME_FORMAT))
+    report("GitHub date, strptime", baseline)
+    report("GitHub date, DateTimeFormatter", timeit(uncached(
+        lambda: [DateTimeFormatter.format_github_date_to_str(date_str) for date_str in github])), baseline)
+    baseline = timeit(lambda: [datetime.strptime(date_str, GITHUB_DATETIME_FORMAT) for date_str in github])
+    report("GitHub datetime, strptime", baseline)
+    report("GitHub datetime, DateTimeFormatter", timeit(uncached(
+        lambda: [DateTimeFormatter.parse_github_datetime(date_str) for date_str in github])), baseline)
+    baseline = timeit(lambda: with_strptime(taiga, TAIGA_DATETIME_FORMAT))
+    report("Taiga date, strptime", baseline)
+    report("Taiga date, DateTimeFormatter", timeit(uncached(
+        lambda: [DateTimeFormatter.format_isodate_to_date(date_str) for date_str in taiga])), baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Pooled keep-alive client vs a new connection per request (urllib),
+against a local HTTPS stand-in server"""
+
+import ssl
+import sys
+from unittest import mock
+from urllib.request import Request, urlopen
+
+from benchmarks import timeit, report
+from GTAnalyzer.settings import HTTP_CLIENT
+from commons.http_client import HTTPClient
+from commons.tests.server import StandInServer, TemporaryCertificate, has_openssl
+
+NUM_REQUESTS = 200
+BODY = {"items": list(range(100))}
+
+
+def main():
+    if not has_openssl():
+        sys.exit("needs openssl to make a certificate")
+    with TemporaryCertificate() as certificate, \
+            StandInServer(lambda request: (200, {}, BODY), certificate.certfile, certificate.keyfile) as server:
+        context = ssl.create_default_context(cafile=certificate.certfile)
+        with mock.patch.dict(HTTP_CLIENT, {"CA_FILE": certificate.certfile}):
+            client = HTTPClient()
+        url = server.base_url + "/repos/o/r/commits"
+
+        def with_urllib():
+            for _ in range(NUM_REQUESTS):
+                urlopen(Request(url), context=context).read()
+
+        def with_pool():
+            for _ in range(NUM_REQUESTS):
+                client.urlopen(Request(url)).read()
+
+        print("{} sequential HTTPS GETs".format(NUM_REQUESTS))
+        baseline = timeit(with_urllib, repeat=3)
+        report("urllib, new connection each", baseline)
+        connections = len(server.connections)
+        report("HTTPClient, pooled keep-alive", timeit(with_pool, repeat=3), baseline)
+        print("connections opened by HTTPClient: {}".format(len(server.connections) - connections))
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
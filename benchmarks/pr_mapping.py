@@ -0,0 +1,36 @@
+"""Mapping PRs to collaborators: sets and nested defaultdicts vs the lists it replaced,
+on seeded PRs"""
+
+from benchmarks import timeit, report
+from GAnalyzer.dataapi import AnalysisPerformer
+from GAnalyzer.tests.prs import make_prs, copy_prs, legacy_map_prs
+
+NUM_PRS = 20000
+NUM_COLLABORATORS = 40
+NUM_BRANCHES = 30
+REPEAT = 5
+
+
+def with_sets(prs, c_names, branches):
+    c_pr = AnalysisPerformer._make_c_pr()
+    c_names = set(c_names)
+    branches = set(branches)
+    for details in prs:
+        c_pr = AnalysisPerformer._map_pr_to_collaborators(details, c_names, branches, c_pr)
+    return c_pr
+
+
+def main():
+    prs, c_names, branches = make_prs(2023, NUM_PRS, NUM_COLLABORATORS, NUM_BRANCHES)
+    # mapping pops from the details; each run gets its own copy, made outside the timing
+    legacy_copies = [copy_prs(prs) for _ in range(REPEAT)]
+    copies = [copy_prs(prs) for _ in range(REPEAT)]
+    print("{} PRs, {} collaborators, {} branches".format(NUM_PRS, NUM_COLLABORATORS, NUM_BRANCHES))
+    baseline = timeit(lambda: legacy_map_prs(legacy_copies.pop(), c_names, branches), REPEAT)
+    report("lists", baseline)
+    report("sets and nested defaultdicts", timeit(lambda: with_sets(copies.pop(), c_names, branches), REPEAT),
+           baseline)
+
+
+if __name__ == "__main__":
+    main()
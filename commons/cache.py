@@ -0,0 +1,153 @@
+"""Cache implementations"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+LOGGER = logging.getLogger(__name__)
+
+
+class LRUCache(object):
+    """A thread-safe, size-bounded in-process LRU cache.
+    With max_bytes, the total sizeof(value) of the entries is bounded too"""
+
+    def __init__(self, maxsize, max_bytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data = OrderedDict()
+        # key to size, only with max_bytes
+        self._sizes = {}
+        self.num_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        size = 0 if self.max_bytes is None else self._sizeof(value)
+        with self._lock:
+            self._pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # would evict everything else and still not fit
+                return
+            self._data[key] = value
+            if self.max_bytes is not None:
+                self._sizes[key] = size
+                self.num_bytes += size
+            while len(self._data) > self.maxsize or \
+                    (self.max_bytes is not None and self.num_bytes > self.max_bytes):
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key):
+        self._data.pop(key, None)
+        self.num_bytes -= self._sizes.pop(key, 0)
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache(object):
+    """A thread-safe, size-bounded in-process cache whose entries expire
+    ttl seconds after they were set"""
+
+    def __init__(self, maxsize, ttl):
+        self.ttl = ttl
+        self._cache = LRUCache(maxsize)
+
+    def get(self, key, default=None):
+        entry = self._cache.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._cache.delete(key)
+            return default
+        return value
+
+    def set(self, key, value):
+        self._cache.set(key, (time.monotonic() + self.ttl, value))
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+
+class SqliteStore(object):
+    """A thread-safe key-value store of JSON values backed by a sqlite file.
+    The file can be shared by several processes"""
+
+    def __init__(self, path, table="kv"):
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS {} "
+                               "(key TEXT PRIMARY KEY, value TEXT NOT NULL)".format(table))
+
+    def get_many(self, keys):
+        """Get the stored values for keys. Missing keys are left out"""
+        found = {}
+        keys = list(keys)
+        # stay below sqlite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            query = "SELECT key, value FROM {} WHERE key IN ({})"\
+                .format(self.table, ",".join("?" * len(chunk)))
+            with self._lock:
+                rows = self._conn.execute(query, chunk).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def set_many(self, items):
+        """Store a dict of key-values in a single transaction"""
+        rows = [(key, json.dumps(value, separators=(",", ":"))) for key, value in items.items()]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO {} (key, value) VALUES (?, ?)"
+                                   .format(self.table), rows)
+
+
+class TieredCache(object):
+    """An in-process LRUCache in front of a persistent SqliteStore.
+    Intended for values that never change for a given key"""
+
+    def __init__(self, path, maxsize, table="kv"):
+        self._memory = LRUCache(maxsize)
+        self._store = SqliteStore(path, table)
+
+    def get_many(self, keys):
+        """Get cached values for keys. Missing keys are left out"""
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._memory.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            stored = self._store.get_many(missing)
+            for key, value in stored.items():
+                self._memory.set(key, value)
+            found.update(stored)
+        return found
+
+    def set_many(self, items):
+        """Cache a dict of key-values"""
+        for key, value in items.items():
+            self._memory.set(key, value)
+        self._store.set_many(items)
@@ -7,7 +7,6 @@ from rest_framework.response import Response
 from rest_framework import status
 import urllib
 import logging
-from threading import Thread
 
 LOGGER = logging.getLogger(__name__)
 
@@ -68,14 +67,3 @@ def view_response_decorator(func):
             return Response(response, status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response(response)
     return wrapper
-
-
-def new_thread_decorator(func):
-    """create a new daemon thread"""
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        LOGGER.info("starting new thread")
-        t = Thread(target=func, args=args, kwargs=kwargs)
-        t.daemon = True
-        t.start()
-    return wrapper
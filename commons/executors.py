@@ -0,0 +1,13 @@
+"""Bounded concurrency helpers"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def bounded_map(func, items, max_workers):
+    """Apply func to every item using at most max_workers threads.
+    Results are returned in the same order as items"""
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
@@ -0,0 +1,275 @@
+"""Keep-alive HTTP client with per-host connection pools"""
+
+import http.client
+import io
+import logging
+import ssl
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.parse import urlsplit, urljoin
+
+from GTAnalyzer.settings import HTTP_CLIENT
+from commons.cache import LRUCache
+from commons.ratelimit import hash_token
+
+LOGGER = logging.getLogger(__name__)
+
+# errors raised when the server has silently dropped an idle connection
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                           ConnectionResetError, ConnectionAbortedError, BrokenPipeError,
+                           ssl.SSLEOFError, ssl.SSLZeroReturnError)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# headers of a 304 that must not replace those of the cached response
+ENTITY_HEADERS = ("Content-Length", "Content-Type", "Transfer-Encoding", "Content-Encoding")
+
+
+class PooledResponse(object):
+    """A fully read HTTP response. File-like, so json.load() works on it"""
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self._fp = io.BytesIO(body)
+
+    def read(self, amt=None):
+        return self._fp.read(amt)
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def geturl(self):
+        return self.url
+
+
+class ConditionalCache(object):
+    """Bodies of GET responses kept along with their ETag/Last-Modified
+    validators, so they can be revalidated with a conditional request.
+    GitHub doesn't count 304 Not Modified responses against the rate limit"""
+
+    def __init__(self, maxsize, max_bytes):
+        self._cache = LRUCache(maxsize, max_bytes, sizeof=lambda response: len(response.body))
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "bytes_saved": 0}
+
+    @staticmethod
+    def _make_key(url, headers):
+        # responses differ per user and per media type
+        return url, hash_token(headers.get("Authorization")), headers.get("Accept")
+
+    def add_validators(self, url, headers):
+        """Add If-None-Match/If-Modified-Since to headers if the url is cached.
+        Returns the cached entry, to be passed to update(); None if there is none"""
+        entry = self._cache.get(ConditionalCache._make_key(url, headers))
+        if entry is None:
+            return None
+        if entry.getheader("ETag") is not None:
+            headers["If-None-Match"] = entry.getheader("ETag")
+        if entry.getheader("Last-Modified") is not None:
+            headers["If-Modified-Since"] = entry.getheader("Last-Modified")
+        return entry
+
+    def update(self, url, headers, response, entry):
+        """Store a fresh response or, on 304, serve entry, the one the validators came from.
+        Holding on to entry means a 304 can be served even if it was evicted meanwhile"""
+        key = ConditionalCache._make_key(url, headers)
+        if response.status == 304:
+            if entry is None:
+                return response
+            merged = entry.headers.__class__()
+            for name, value in entry.headers.items():
+                merged[name] = value
+            # fresh rate-limit and caching headers
+            for name, value in response.headers.items():
+                if name not in ENTITY_HEADERS:
+                    del merged[name]
+                    merged[name] = value
+            with self._lock:
+                self._stats["hits"] += 1
+                self._stats["bytes_saved"] += len(entry.body)
+            # revalidated, so it's recently used again
+            self._cache.set(key, entry)
+            return PooledResponse(response.url, entry.status, entry.reason, merged, entry.body)
+        if response.status == 200:
+            with self._lock:
+                self._stats["misses"] += 1
+            if response.getheader("ETag") is not None or response.getheader("Last-Modified") is not None:
+                self._cache.set(key, response)
+        return response
+
+    def get_stats(self):
+        """Hit/miss counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["entries"] = len(self._cache)
+        stats["bytes"] = self._cache.num_bytes
+        return stats
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of idle keep-alive connections to a single host"""
+
+    def __init__(self, scheme, host, port, maxsize, timeout, ssl_context=None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        # LIFO stack of (connection, released_at); the most recently used
+        # connection is the one least likely to have been closed by the server
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout,
+                                               context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def get(self):
+        """Get an idle connection or open a new one.
+        Returns (connection, is_reused)"""
+        expired = []
+        conn = None
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                candidate, released_at = self._idle.pop()
+                if now - released_at > HTTP_CLIENT.get("IDLE_TIMEOUT"):
+                    expired.append(candidate)
+                    continue
+                conn = candidate
+                break
+        for candidate in expired:
+            candidate.close()
+        if conn is not None:
+            return conn, True
+        return self._new_connection(), False
+
+    def put(self, conn):
+        """Return a connection to the pool"""
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _released_at in idle:
+            conn.close()
+
+
+class HTTPClient(object):
+    """A thread-safe singleton HTTP client that reuses connections
+    through one ConnectionPool per (scheme, host, port)"""
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """Get the singleton instance"""
+        with HTTPClient.__instance_lock:
+            if HTTPClient.__instance is None:
+                HTTPClient.__instance = HTTPClient()
+            return HTTPClient.__instance
+
+    def __init__(self):
+        """Constructor"""
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context(cafile=HTTP_CLIENT.get("CA_FILE"))
+        self.conditional_cache = ConditionalCache(HTTP_CLIENT.get("CONDITIONAL_CACHE_SIZE"),
+                                                  HTTP_CLIENT.get("CONDITIONAL_CACHE_BYTES"))
+
+    def _get_pool(self, scheme, host, port):
+        key = (scheme, host, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(scheme, host, port,
+                                      HTTP_CLIENT.get("POOL_SIZE"),
+                                      HTTP_CLIENT.get("TIMEOUT"),
+                                      self._ssl_context if scheme == "https" else None)
+                self._pools[key] = pool
+            return pool
+
+    def urlopen(self, request_obj, conditional=False):
+        """Drop-in replacement for urllib.request.urlopen.
+        Raises urllib.error.HTTPError for 4xx/5xx responses.
+        With conditional, a GET is revalidated against the cached response"""
+        method = request_obj.get_method()
+        headers = dict(request_obj.header_items())
+        url = request_obj.full_url
+        data = request_obj.data
+        conditional = conditional and method == "GET"
+        entry = None
+        if conditional:
+            entry = self.conditional_cache.add_validators(url, headers)
+        for _redirect in range(HTTP_CLIENT.get("MAX_REDIRECTS") + 1):
+            response = self._request(method, url, data, headers)
+            location = response.getheader("Location")
+            if response.status not in REDIRECT_CODES or location is None:
+                break
+            url = urljoin(url, location)
+            if response.status == 303 or (response.status in (301, 302) and method == "POST"):
+                method, data = "GET", None
+                headers.pop("Content-type", None)
+                headers.pop("Content-length", None)
+        if conditional:
+            response = self.conditional_cache.update(request_obj.full_url, headers, response, entry)
+        if response.status >= 300:
+            raise HTTPError(url, response.status, response.reason,
+                            response.headers, response._fp)
+        return response
+
+    def _request(self, method, url, data, headers):
+        """Send a single request over a pooled connection"""
+        parts = urlsplit(url)
+        pool = self._get_pool(parts.scheme, parts.hostname, parts.port)
+        target = parts.path or "/"
+        if parts.query:
+            target = "{}?{}".format(target, parts.query)
+        while True:
+            conn, is_reused = pool.get()
+            sent = False
+            try:
+                conn.request(method, target, body=data, headers=headers)
+                sent = True
+                raw = conn.getresponse()
+                body = raw.read()
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                # a reused connection may have been closed by the server while idle;
+                # retry on a fresh one unless the request may already have been processed
+                if is_reused and (not sent or method in IDEMPOTENT_METHODS):
+                    LOGGER.debug("stale connection to %s, retrying", parts.hostname)
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if raw.will_close:
+                conn.close()
+            else:
+                pool.put(conn)
+            return PooledResponse(url, raw.status, raw.reason, raw.headers, body)
+
+    def close(self):
+        """Close all pooled connections"""
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+
+def urlopen(request_obj, conditional=False):
+    """Open a urllib Request through the shared keep-alive client"""
+    return HTTPClient.get_instance().urlopen(request_obj, conditional)
@@ -0,0 +1,171 @@
+"""Incremental reading of large JSON documents"""
+
+import json
+import re
+
+WHITESPACE = " \t\n\r"
+# characters that matter when skipping over a value
+STRUCTURAL = re.compile(r'["{}\[\]]')
+STRING_SPECIAL = re.compile(r'["\\]')
+# characters that can follow a number or literal
+SCALAR_END = re.compile(r'[\s,\]}:]')
+DECODER = json.JSONDecoder()
+
+
+class JSONStreamReader(object):
+    """Reads the top-level object of a JSON document from a text file in chunks.
+    Only the buffer and the value being decoded are held in memory; skipped
+    values, however large, are scanned over without being decoded"""
+
+    def __init__(self, fileobj, chunk_size):
+        self._file = fileobj
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size=None):
+        """Read more of the file into the buffer. False at the end of the file"""
+        if self._eof:
+            return False
+        if self._pos > self._chunk_size:
+            # drop what has been consumed
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        chunk = self._file.read(size or self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+
+    def _peek(self):
+        """Next non-whitespace character, without consuming it. '' at the end of the file"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError("Expected '{}' at offset {} of the buffer".format(char, self._pos))
+        self._pos += 1
+
+    def _decode(self):
+        """Decode the next value, reading as much of the file as it needs"""
+        if self._peek() not in '{["':
+            # a number or literal: it must not be cut short at the end of the buffer
+            while SCALAR_END.search(self._buf, self._pos) is None and self._fill():
+                pass
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # the value runs past the buffer; grow it geometrically so
+                # a large value isn't re-decoded once per chunk
+                if not self._fill(max(self._chunk_size, len(self._buf) - self._pos)):
+                    raise
+                continue
+            self._pos = end
+            return value
+
+    def _skip(self):
+        """Move past the next value without decoding it"""
+        char = self._peek()
+        if char == '"':
+            self._skip_string()
+            return
+        if char not in "{[":
+            self._decode()
+            return
+        self._pos += 1
+        depth = 1
+        while depth:
+            match = STRUCTURAL.search(self._buf, self._pos)
+            if match is None:
+                self._pos = len(self._buf)
+                if not self._fill():
+                    raise ValueError("Unexpected end of JSON document")
+                continue
+            self._pos = match.start()
+            char = match.group()
+            if char == '"':
+                self._skip_string()
+                continue
+            self._pos += 1
+            depth += 1 if char in "{[" else -1
+
+    def _skip_string(self):
+        """Move past the string starting at the current position"""
+        self._pos += 1
+        while True:
+            match = STRING_SPECIAL.search(self._buf, self._pos)
+            if match is None:
+                self._pos = len(self._buf)
+            elif match.group() == '"':
+                self._pos = match.end()
+                return
+            elif match.end() < len(self._buf):
+                # move past the escaped character
+                self._pos = match.end() + 1
+                continue
+            else:
+                # the escaped character is in the next chunk
+                self._pos = match.start()
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def _read_object(self, skip_keys):
+        """Decode the object at the current position, leaving out skip_keys"""
+        self._expect("{")
+        obj = dict()
+        if self._peek() == "}":
+            self._pos += 1
+            return obj
+        while True:
+            key = self._decode()
+            self._expect(":")
+            if key in skip_keys:
+                self._skip()
+            else:
+                obj[key] = self._decode()
+            if self._peek() == ",":
+                self._pos += 1
+                continue
+            self._expect("}")
+            return obj
+
+    def iter_arrays(self, keys, skip_keys=()):
+        """Yield (key, element) for every element of the top-level arrays named in keys.
+        Other top-level values are skipped, as are skip_keys of object elements"""
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._decode()
+            self._expect(":")
+            if key in keys and self._peek() == "[":
+                self._pos += 1
+                if self._peek() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        if self._peek() == "{":
+                            yield key, self._read_object(skip_keys)
+                        else:
+                            yield key, self._decode()
+                        if self._peek() == ",":
+                            self._pos += 1
+                            continue
+                        self._expect("]")
+                        break
+            else:
+                self._skip()
+            if self._peek() == ",":
+                self._pos += 1
+                continue
+            self._expect("}")
+            return
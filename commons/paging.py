@@ -0,0 +1,33 @@
+"""Lazy iteration over paginated API listings"""
+
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PageIterator(object):
+    """Iterate over the items of a paginated listing. get_page(url) returns
+    ((page, next_url), is_error), as an http_error_decorator'd call does; next_url
+    is None on the last page. Pages are fetched only as iteration reaches them.
+    An error on a later page ends the iteration early and is kept in `error`"""
+
+    def __init__(self, first_page, next_url, get_page):
+        self.error = None
+        self._first_page = first_page
+        self._next_url = next_url
+        self._get_page = get_page
+
+    def __iter__(self):
+        page, next_url = self._first_page, self._next_url
+        # don't hold on to the first page once it has been handed out
+        self._first_page = None
+        while True:
+            yield from page
+            if next_url is None:
+                return
+            result, is_error = self._get_page(next_url)
+            if is_error:
+                LOGGER.info("Error fetching page %s", next_url)
+                self.error = result
+                return
+            page, next_url = result
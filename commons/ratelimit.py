@@ -0,0 +1,176 @@
+"""Rate-limit aware request scheduling"""
+
+import hashlib
+import logging
+import random
+import threading
+import time
+from urllib.error import HTTPError
+
+from GTAnalyzer.settings import GH_RATE_LIMIT
+
+LOGGER = logging.getLogger(__name__)
+
+
+def hash_token(token):
+    """Short, non-reversible key for a token"""
+    return hashlib.sha256(str(token).encode("utf-8")).hexdigest()[:16]
+
+
+class RateLimitExceeded(HTTPError):
+    """Raised instead of sending a request the token's budget can't cover within MAX_WAIT"""
+
+    def __init__(self, delay):
+        HTTPError.__init__(self, None, 429,
+                           "Rate limit exhausted, retry in {:.0f}s".format(delay), None, None)
+        self.delay = delay
+
+
+class TokenBudget(object):
+    """Rate-limit state of a single token, as last reported by the server"""
+
+    def __init__(self, max_concurrency):
+        self.limit = None  # Int
+        self.remaining = None  # Int
+        self.reset = None  # Float, epoch seconds
+        self.blocked_until = 0.0  # Float, epoch seconds
+        self.next_slot = 0.0  # Float, epoch seconds
+        self.in_flight = 0  # Int
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset": self.reset,
+            "blocked_until": self.blocked_until or None,
+            "in_flight": self.in_flight
+        }
+
+
+class RateLimitScheduler(object):
+    """A thread-safe singleton that paces requests per token.
+    Tracks the remaining budget from X-RateLimit-* headers, spreads requests
+    out when the budget runs low, caps concurrent requests per token and
+    retries rate-limited (403/429) responses with jittered backoff"""
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """Get the singleton instance"""
+        with RateLimitScheduler.__instance_lock:
+            if RateLimitScheduler.__instance is None:
+                RateLimitScheduler.__instance = RateLimitScheduler()
+            return RateLimitScheduler.__instance
+
+    def __init__(self):
+        """Constructor"""
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def _get_budget(self, token, resource):
+        # GitHub meters each resource (REST 'core', 'graphql', ...) separately
+        key = (hash_token(token), resource)
+        with self._lock:
+            budget = self._budgets.get(key)
+            if budget is None:
+                budget = TokenBudget(GH_RATE_LIMIT["MAX_CONCURRENCY"])
+                self._budgets[key] = budget
+            return budget
+
+    def get_budget(self, token, resource="core"):
+        """Current rate-limit budget of a token"""
+        budget = self._get_budget(token, resource)
+        with budget.lock:
+            return budget.to_dict()
+
+    def call(self, token, send, resource="core"):
+        """Call send() once the token's budget for resource allows it.
+        send must return a response or raise urllib.error.HTTPError.
+        Raises RateLimitExceeded without calling send() if that would take over MAX_WAIT"""
+        budget = self._get_budget(token, resource)
+        attempt = 0
+        while True:
+            self._wait(budget)
+            with budget.slots:
+                with budget.lock:
+                    budget.in_flight += 1
+                try:
+                    response = send()
+                except HTTPError as http_e:
+                    self._update(budget, http_e.headers)
+                    if not self._is_rate_limited(http_e) or attempt >= GH_RATE_LIMIT["MAX_RETRIES"]:
+                        raise
+                    delay = self._backoff_delay(budget, http_e.headers, attempt)
+                    LOGGER.warning("rate limited (HTTP %s), retrying in %.1fs", http_e.code, delay)
+                    with budget.lock:
+                        budget.blocked_until = max(budget.blocked_until, time.time() + delay)
+                    attempt += 1
+                    continue
+                finally:
+                    with budget.lock:
+                        budget.in_flight -= 1
+            self._update(budget, response.headers)
+            return response
+
+    @staticmethod
+    def _wait(budget):
+        """Sleep until the next request for this token may be sent.
+        Raises RateLimitExceeded if that is more than MAX_WAIT away"""
+        with budget.lock:
+            now = time.time()
+            start = max(now, budget.blocked_until, budget.next_slot)
+            next_slot = budget.next_slot
+            if budget.remaining is not None and budget.reset is not None and budget.reset > now:
+                spendable = budget.remaining - GH_RATE_LIMIT["RESERVE"]
+                if spendable <= 0:
+                    # budget exhausted, queue until the window resets
+                    start = max(start, budget.reset)
+                elif budget.remaining < GH_RATE_LIMIT["PACE_BELOW"]:
+                    # budget running low, spread what's left over the rest of the window
+                    next_slot = start + (budget.reset - now) / spendable
+            delay = start - now
+            if delay <= GH_RATE_LIMIT["MAX_WAIT"]:
+                budget.next_slot = next_slot
+        if delay > GH_RATE_LIMIT["MAX_WAIT"]:
+            # sending anyway would only earn a 403 and eat into the reserve
+            LOGGER.warning("rate limit wait of %.0fs exceeds MAX_WAIT, not sending", delay)
+            raise RateLimitExceeded(delay)
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def _update(budget, headers):
+        """Update the budget from X-RateLimit-* response headers"""
+        if headers is None or headers.get("X-RateLimit-Remaining") is None:
+            return
+        with budget.lock:
+            budget.limit = int(headers.get("X-RateLimit-Limit", budget.limit or 0))
+            budget.remaining = int(headers.get("X-RateLimit-Remaining"))
+            budget.reset = float(headers.get("X-RateLimit-Reset", budget.reset or 0))
+
+    @staticmethod
+    def _is_rate_limited(http_e):
+        if http_e.code == 429:
+            return True
+        if http_e.code != 403 or http_e.headers is None:
+            return False
+        # a plain 403 is a permission error and must not be retried
+        return http_e.headers.get("Retry-After") is not None or \
+            http_e.headers.get("X-RateLimit-Remaining") == "0"
+
+    @staticmethod
+    def _backoff_delay(budget, headers, attempt):
+        """Seconds to wait before retrying a rate-limited request"""
+        jitter = random.uniform(0, GH_RATE_LIMIT["BACKOFF_BASE"])
+        retry_after = headers.get("Retry-After") if headers is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return int(retry_after) + jitter
+        with budget.lock:
+            if budget.remaining == 0 and budget.reset is not None:
+                return max(budget.reset - time.time(), 0) + jitter
+        # secondary limit without a hint: exponential backoff with full jitter
+        return random.uniform(0, min(GH_RATE_LIMIT["BACKOFF_MAX"],
+                                     GH_RATE_LIMIT["BACKOFF_BASE"] * 2 ** (attempt + 1)))
@@ -0,0 +1,384 @@
+"""Backends that hold analysis results. In every backend, a request's results
+expire TTL seconds after its last write; reading them doesn't extend that"""
+
+import json
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from GTAnalyzer.settings import ANALYSIS_RESULTS
+
+LOGGER = logging.getLogger(__name__)
+
+# key suffix of the redis list of group ids in the order they were written
+LOG_SUFFIX = ":log"
+# condition on analysis_results rows of a request that hasn't expired, given the expiry cutoff;
+# expired requests are deleted on the next write, until then reads skip them
+LIVE_REQUEST = ("EXISTS (SELECT 1 FROM analysis_requests q WHERE q.request_id = analysis_results.request_id "
+                "AND q.written_at >= ?)")
+
+
+def create_result_backend():
+    """Create the result backend selected in settings"""
+    backend = ANALYSIS_RESULTS["BACKEND"]
+    if backend == "memory":
+        return MemoryResultBackend()
+    if backend == "sqlite":
+        return SqliteResultBackend(ANALYSIS_RESULTS["SQLITE_PATH"])
+    if backend == "redis":
+        return RedisResultBackend(RedisClient(ANALYSIS_RESULTS["REDIS_URL"]))
+    raise ValueError("Unknown analysis result backend '{}'".format(backend))
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _make_usage(request_id, num_bytes, num_groups, expires_at):
+    return {"request_id": request_id, "bytes": num_bytes, "groups": num_groups,
+            "expires_in": max(int(expires_at - time.time()), 0)}
+
+
+class MemoryResultBackend(object):
+    """Results kept in this process only. Not visible to other workers"""
+
+    def __init__(self):
+        # request_id to {"groups": {group_id: serialised result}, "seqs": {group_id: Int}, "seq": Int,
+        # "bytes": Int, "written_at": Float}, least recently written first
+        self._requests = OrderedDict()
+        self._num_bytes = 0
+        # shared by every request and never reset, so a request that is evicted
+        # and written again doesn't reuse sequence numbers its clients have seen
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _evict(self, keep):
+        """Drop expired requests, then the least recently written ones while
+        over the byte budget. Caller holds the lock"""
+        expired_before = time.time() - ANALYSIS_RESULTS["TTL"]
+        for request_id, entry in list(self._requests.items()):
+            if request_id == keep:
+                continue
+            if entry["written_at"] >= expired_before and self._num_bytes <= ANALYSIS_RESULTS["MAX_BYTES"]:
+                break
+            self._num_bytes -= entry["bytes"]
+            del self._requests[request_id]
+
+    def _live_entry(self, request_id):
+        """A request's entry, None if there is none or it has expired but
+        hasn't been evicted yet. Caller holds the lock"""
+        entry = self._requests.get(request_id)
+        if entry is None or entry["written_at"] < time.time() - ANALYSIS_RESULTS["TTL"]:
+            return None
+        return entry
+
+    def set(self, request_id, group_id, value):
+        request_id = str(request_id)
+        value = _dumps(value)
+        with self._lock:
+            entry = self._requests.get(request_id)
+            if entry is None:
+                entry = self._requests[request_id] = {"groups": {}, "seqs": {}, "seq": 0, "bytes": 0}
+            entry["written_at"] = time.time()
+            self._requests.move_to_end(request_id)
+            size = len(value) - len(entry["groups"].get(group_id, ""))
+            entry["groups"][group_id] = value
+            self._seq += 1
+            entry["seq"] = entry["seqs"][group_id] = self._seq
+            entry["bytes"] += size
+            self._num_bytes += size
+            self._evict(request_id)
+
+    def get(self, request_id, group_id=None):
+        with self._lock:
+            entry = self._live_entry(str(request_id))
+            results = {} if entry is None else dict(entry["groups"])
+        if group_id is not None:
+            return json.loads(results[group_id]) if group_id in results else None
+        return {key: json.loads(value) for key, value in results.items()}
+
+    def get_since(self, request_id, cursor):
+        with self._lock:
+            entry = self._live_entry(str(request_id))
+            if entry is None:
+                return {}, cursor
+            results = {key: entry["groups"][key] for key, seq in entry["seqs"].items() if seq > cursor}
+            cursor = max(cursor, entry["seq"])
+        return {key: json.loads(value) for key, value in results.items()}, cursor
+
+    def delete(self, request_id):
+        with self._lock:
+            entry = self._requests.pop(str(request_id), None)
+            if entry is not None:
+                self._num_bytes -= entry["bytes"]
+
+    def get_usage(self, request_id):
+        with self._lock:
+            entry = self._live_entry(str(request_id))
+            if entry is None:
+                return None
+            return _make_usage(request_id, entry["bytes"], len(entry["groups"]),
+                               entry["written_at"] + ANALYSIS_RESULTS["TTL"])
+
+
+class SqliteResultBackend(object):
+    """Results kept in a sqlite file in WAL mode, shared by
+    every worker process on the machine. Reads don't write, so long-poll
+    checks never wait on the write lock"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS analysis_results "
+                               "(request_id TEXT NOT NULL, group_id TEXT NOT NULL, value TEXT NOT NULL, "
+                               "seq INTEGER NOT NULL, PRIMARY KEY (request_id, group_id))")
+            # the last sequence number handed out, shared by every request and never reset,
+            # so a request that is evicted and written again doesn't reuse ones its clients have seen
+            self._conn.execute("CREATE TABLE IF NOT EXISTS analysis_sequence "
+                               "(id INTEGER PRIMARY KEY CHECK (id = 0), seq INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO analysis_sequence (id, seq) "
+                               "SELECT 0, COALESCE(MAX(seq), 0) FROM analysis_results")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS analysis_requests "
+                               "(request_id TEXT PRIMARY KEY, bytes INTEGER NOT NULL, "
+                               "written_at REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS analysis_requests_written_at "
+                               "ON analysis_requests (written_at)")
+
+    @staticmethod
+    def _expired_before():
+        return time.time() - ANALYSIS_RESULTS["TTL"]
+
+    def _delete(self, request_id):
+        """Caller holds the lock and a transaction"""
+        self._conn.execute("DELETE FROM analysis_results WHERE request_id = ?", (request_id,))
+        self._conn.execute("DELETE FROM analysis_requests WHERE request_id = ?", (request_id,))
+
+    def _evict(self, keep):
+        """Drop expired requests, then the least recently written ones while
+        over the byte budget. Caller holds the lock and a transaction"""
+        expired = self._conn.execute("SELECT request_id FROM analysis_requests "
+                                     "WHERE written_at < ? AND request_id != ?",
+                                     (SqliteResultBackend._expired_before(), keep)).fetchall()
+        for (request_id,) in expired:
+            self._delete(request_id)
+        num_bytes = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM analysis_requests").fetchone()[0]
+        while num_bytes > ANALYSIS_RESULTS["MAX_BYTES"]:
+            row = self._conn.execute("SELECT request_id, bytes FROM analysis_requests WHERE request_id != ? "
+                                     "ORDER BY written_at LIMIT 1", (keep,)).fetchone()
+            if row is None:
+                return
+            self._delete(row[0])
+            num_bytes -= row[1]
+
+    def set(self, request_id, group_id, value):
+        request_id = str(request_id)
+        value = _dumps(value)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT length(CAST(value AS BLOB)) FROM analysis_results "
+                                     "WHERE request_id = ? AND group_id = ?", (request_id, group_id)).fetchone()
+            size = len(value.encode("utf-8")) - (row[0] if row else 0)
+            self._conn.execute("UPDATE analysis_sequence SET seq = seq + 1 WHERE id = 0")
+            self._conn.execute("INSERT OR REPLACE INTO analysis_results (request_id, group_id, value, seq) "
+                               "VALUES (?, ?, ?, (SELECT seq FROM analysis_sequence WHERE id = 0))",
+                               (request_id, group_id, value))
+            self._conn.execute("INSERT INTO analysis_requests (request_id, bytes, written_at) VALUES (?, ?, ?) "
+                               "ON CONFLICT (request_id) DO UPDATE SET bytes = bytes + excluded.bytes, "
+                               "written_at = excluded.written_at", (request_id, size, time.time()))
+            self._evict(request_id)
+
+    def get(self, request_id, group_id=None):
+        request_id = str(request_id)
+        with self._lock:
+            if group_id is not None:
+                row = self._conn.execute("SELECT value FROM analysis_results "
+                                         "WHERE request_id = ? AND group_id = ? AND " + LIVE_REQUEST,
+                                         (request_id, group_id, SqliteResultBackend._expired_before())).fetchone()
+            else:
+                rows = self._conn.execute("SELECT group_id, value FROM analysis_results "
+                                          "WHERE request_id = ? AND " + LIVE_REQUEST,
+                                          (request_id, SqliteResultBackend._expired_before())).fetchall()
+        if group_id is not None:
+            return None if row is None else json.loads(row[0])
+        return {key: json.loads(value) for key, value in rows}
+
+    def get_since(self, request_id, cursor):
+        request_id = str(request_id)
+        with self._lock:
+            rows = self._conn.execute("SELECT group_id, value, seq FROM analysis_results "
+                                      "WHERE request_id = ? AND seq > ? AND " + LIVE_REQUEST,
+                                      (request_id, cursor, SqliteResultBackend._expired_before())).fetchall()
+        return {key: json.loads(value) for key, value, _seq in rows}, max([cursor] + [row[2] for row in rows])
+
+    def delete(self, request_id):
+        with self._lock, self._conn:
+            self._delete(str(request_id))
+
+    def get_usage(self, request_id):
+        with self._lock:
+            row = self._conn.execute("SELECT bytes, written_at, (SELECT COUNT(*) FROM analysis_results r "
+                                     "WHERE r.request_id = q.request_id) FROM analysis_requests q "
+                                     "WHERE request_id = ? AND written_at >= ?",
+                                     (str(request_id), SqliteResultBackend._expired_before())).fetchone()
+        if row is None:
+            return None
+        return _make_usage(request_id, row[0], row[2], row[1] + ANALYSIS_RESULTS["TTL"])
+
+
+class RedisResultBackend(object):
+    """Results kept in a Redis-compatible server, one hash per request,
+    shared by every worker on every node. The byte budget is left to the server's maxmemory policy.
+    A list per request logs the groups in the order they were written;
+    a group's sequence number is its position in the log"""
+
+    def __init__(self, client):
+        self._client = client
+
+    @staticmethod
+    def _key(request_id):
+        return "{}{}".format(ANALYSIS_RESULTS["REDIS_PREFIX"], request_id)
+
+    def _expire(self, key):
+        self._client.execute("EXPIRE", key, ANALYSIS_RESULTS["TTL"])
+        self._client.execute("EXPIRE", key + LOG_SUFFIX, ANALYSIS_RESULTS["TTL"])
+
+    def set(self, request_id, group_id, value):
+        key = RedisResultBackend._key(request_id)
+        # the value is written before it is logged, so a reader
+        # that sees the log entry also sees the value
+        self._client.execute("HSET", key, group_id, _dumps(value))
+        self._client.execute("RPUSH", key + LOG_SUFFIX, group_id)
+        self._expire(key)
+
+    def get(self, request_id, group_id=None):
+        key = RedisResultBackend._key(request_id)
+        if group_id is not None:
+            value = self._client.execute("HGET", key, group_id)
+            return None if value is None else json.loads(value)
+        reply = self._client.execute("HGETALL", key)
+        return {reply[i].decode("utf-8"): json.loads(reply[i + 1]) for i in range(0, len(reply), 2)}
+
+    def get_since(self, request_id, cursor):
+        key = RedisResultBackend._key(request_id)
+        groups = [group_id.decode("utf-8")
+                  for group_id in self._client.execute("LRANGE", key + LOG_SUFFIX, cursor, -1)]
+        if not groups:
+            # a log shorter than the cursor expired and was written again; start over
+            if cursor and self._client.execute("LLEN", key + LOG_SUFFIX) < cursor:
+                return self.get_since(request_id, 0)
+            return {}, cursor
+        groups_set = list(set(groups))
+        values = self._client.execute("HMGET", key, *groups_set)
+        return {group_id: json.loads(value) for group_id, value in zip(groups_set, values)
+                if value is not None}, cursor + len(groups)
+
+    def delete(self, request_id):
+        key = RedisResultBackend._key(request_id)
+        self._client.execute("DEL", key, key + LOG_SUFFIX)
+
+    def get_usage(self, request_id):
+        key = RedisResultBackend._key(request_id)
+        reply = self._client.execute("HGETALL", key)
+        if not reply:
+            return None
+        ttl = self._client.execute("TTL", key)
+        return _make_usage(request_id, sum(len(value) for value in reply[1::2]), len(reply) // 2,
+                           time.time() + max(ttl, 0))
+
+
+class RedisError(Exception):
+    """Error reply from a Redis server"""
+
+
+class RedisClient(object):
+    """A minimal, thread-safe client for the Redis protocol (RESP),
+    just enough for the result backend"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.lstrip("/") or 0)
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+
+    def execute(self, *args):
+        """Send a command and return its reply. On a reused connection, a command that
+        can't be sent or gets no reply is sent again, once, on a new connection"""
+        with self._lock:
+            if self._sock is not None:
+                try:
+                    return self._send(args)
+                except socket.timeout:
+                    # the server is slow, not gone, and may still run the command
+                    self._close()
+                    raise
+                except OSError:
+                    # the server (or a proxy) closed the connection while it was idle;
+                    # the send often still succeeds and only the read fails
+                    LOGGER.info("Redis connection to %s:%s went stale, reconnecting", self.host, self.port)
+                    self._close()
+            self._connect()
+            try:
+                return self._send(args)
+            except OSError:
+                self._close()
+                raise
+
+    def _send(self, args):
+        self._sock.sendall(RedisClient._encode(args))
+        return self._read_reply()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=30)
+        self._file = self._sock.makefile("rb")
+        try:
+            if self.password:
+                self._send(("AUTH", self.password))
+            if self.db:
+                self._send(("SELECT", self.db))
+        except (OSError, RedisError):
+            self._close()
+            raise
+
+    def _close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+        self._sock = None
+        self._file = None
+
+    @staticmethod
+    def _encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the Redis server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length == -1 else self._file.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length == -1 else [self._read_reply() for _ in range(length)]
+        raise RedisError("Unexpected reply: {!r}".format(line))
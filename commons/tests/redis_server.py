@@ -0,0 +1,170 @@
+"""Local server standing in for Redis in tests: the commands the result backend uses, over RESP"""
+
+import socket
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        socketserver.StreamRequestHandler.setup(self)
+        self.server.stand_in._connection_opened(self.connection)
+
+    def handle(self):
+        while True:
+            try:
+                command = self._read_command()
+            except OSError:
+                return
+            if command is None:
+                return
+            self.server.stand_in.commands.append(command)
+            self.wfile.write(self.server.stand_in.execute(command))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line[:1] == b"*", line
+        command = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            command.append(self.rfile.read(length + 2)[:-2])
+        command[0] = command[0].decode("utf-8").upper()
+        return command
+
+
+def _encode(reply):
+    if isinstance(reply, Exception):
+        return b"-ERR %s\r\n" % str(reply).encode("utf-8")
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, bool):
+        return b"+OK\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+class RedisStandIn(object):
+    """Serves strings, hashes and lists with expiry, in memory. Every command
+    received is kept in `commands` as a list of bytes, its name decoded and upper-cased.
+    advance() moves its clock forward to expire keys"""
+
+    def __init__(self):
+        self.commands = []
+        self.connections = []
+        self._data = {}
+        self._expires_at = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return "redis://127.0.0.1:{}/0".format(self._server.server_address[1])
+
+    def advance(self, seconds):
+        with self._lock:
+            self._offset += seconds
+
+    def _connection_opened(self, connection):
+        with self._lock:
+            self.connections.append(connection)
+
+    def drop_connections(self):
+        """Close every open connection, like a server closing idle clients"""
+        with self._lock:
+            connections, self.connections = self.connections, []
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def execute(self, command):
+        """The encoded reply to a command"""
+        name, args = command[0], command[1:]
+        handler = getattr(self, "_{}".format(name.lower()), None)
+        if handler is None:
+            return _encode(ValueError("unknown command '{}'".format(name)))
+        with self._lock:
+            now = time.time() + self._offset
+            for key in [key for key, expires_at in self._expires_at.items() if expires_at <= now]:
+                del self._data[key]
+                del self._expires_at[key]
+            return _encode(handler(now, *args))
+
+    @staticmethod
+    def _auth(_now, _password):
+        return True
+
+    @staticmethod
+    def _select(_now, _db):
+        return True
+
+    def _hset(self, _now, key, *pairs):
+        values = self._data.setdefault(key, {})
+        added = len([field for field in pairs[::2] if field not in values])
+        values.update(zip(pairs[::2], pairs[1::2]))
+        return added
+
+    def _hget(self, _now, key, field):
+        return self._data.get(key, {}).get(field)
+
+    def _hmget(self, _now, key, *fields):
+        return [self._data.get(key, {}).get(field) for field in fields]
+
+    def _hgetall(self, _now, key):
+        return [item for pair in self._data.get(key, {}).items() for item in pair]
+
+    def _rpush(self, _now, key, *values):
+        items = self._data.setdefault(key, [])
+        items.extend(values)
+        return len(items)
+
+    def _lrange(self, _now, key, start, stop):
+        items = self._data.get(key, [])
+        start, stop = int(start), int(stop)
+        stop = len(items) + stop if stop < 0 else stop
+        return items[max(len(items) + start if start < 0 else start, 0):stop + 1]
+
+    def _llen(self, _now, key):
+        return len(self._data.get(key, []))
+
+    def _expire(self, now, key, seconds):
+        if key not in self._data:
+            return 0
+        self._expires_at[key] = now + int(seconds)
+        return 1
+
+    def _ttl(self, now, key):
+        if key not in self._data:
+            return -2
+        if key not in self._expires_at:
+            return -1
+        return int(round(self._expires_at[key] - now))
+
+    def _del(self, _now, *keys):
+        deleted = 0
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                deleted += 1
+            self._expires_at.pop(key, None)
+        return deleted
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.drop_connections()
@@ -0,0 +1,147 @@
+"""Local HTTP(S) server standing in for GitHub/Taiga in tests and benchmarks"""
+
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+def make_certificate(directory):
+    """Self-signed certificate for localhost/127.0.0.1. Returns (certfile, keyfile).
+    Needs the openssl command line tool"""
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+                    "-keyout", keyfile, "-out", certfile],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+def has_openssl():
+    return shutil.which("openssl") is not None
+
+
+class StandInRequest(object):
+    """What the stand-in received"""
+
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        parts = urlsplit(path)
+        self.route = parts.path
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send each response in one write; separate small writes on a
+    # keep-alive connection stall on Nagle's algorithm and delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.stand_in._connection_opened(self.connection)
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = StandInRequest(self.command, self.path, self.headers,
+                                 self.rfile.read(length) if length else b"")
+        self.server.stand_in.requests.append(request)
+        response = self.server.stand_in.handler(request)
+        if response is None:
+            # hang up without answering
+            self.close_connection = True
+            return
+        status, headers, body = response
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+            headers = dict({"Content-Type": "application/json"}, **headers)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+class StandInServer(object):
+    """Serves handler(StandInRequest) -> (status, headers, body) or None to hang up.
+    A JSON-able body is sent as JSON. With certfile/keyfile it speaks HTTPS"""
+
+    def __init__(self, handler, certfile=None, keyfile=None):
+        self.handler = handler
+        self.requests = []
+        self.connections = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self.scheme = "http"
+        if certfile is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+            self.scheme = "https"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host = "localhost" if self.scheme == "https" else "127.0.0.1"
+        return "{}://{}:{}".format(self.scheme, host, self._server.server_port)
+
+    def _connection_opened(self, connection):
+        with self._lock:
+            self.connections.append(connection)
+
+    def drop_connections(self):
+        """Close every open connection, like a server dropping idle keep-alive connections"""
+        with self._lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(2)
+            except OSError:
+                pass
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class TemporaryCertificate(object):
+    """Context manager: a self-signed certificate in a temporary directory"""
+
+    def __enter__(self):
+        self._directory = tempfile.mkdtemp()
+        self.certfile, self.keyfile = make_certificate(self._directory)
+        return self
+
+    def __exit__(self, *exc_info):
+        shutil.rmtree(self._directory, ignore_errors=True)
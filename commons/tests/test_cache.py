@@ -0,0 +1,34 @@
+"""Tests of the cache implementations"""
+
+import unittest
+
+from commons.cache import LRUCache
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_bounds_bytes(self):
+        cache = LRUCache(100, max_bytes=10, sizeof=len)
+        cache.set("a", "xxxx")
+        cache.set("b", "xxxx")
+        cache.set("c", "xxxx")
+        self.assertEqual((cache.get("a"), len(cache), cache.num_bytes), (None, 2, 8))
+        # replacing a value accounts for the old one
+        cache.set("c", "xx")
+        self.assertEqual(cache.num_bytes, 6)
+        cache.delete("b")
+        self.assertEqual(cache.num_bytes, 2)
+
+    def test_value_larger_than_max_bytes_is_not_kept(self):
+        cache = LRUCache(100, max_bytes=10, sizeof=len)
+        cache.set("a", "xxxx")
+        cache.set("big", "x" * 11)
+        self.assertEqual((cache.get("a"), cache.get("big"), cache.num_bytes), ("xxxx", None, 4))
@@ -0,0 +1,66 @@
+"""Tests of DateTimeFormatter's fast path against strptime"""
+
+import random
+import unittest
+from datetime import datetime, timezone
+
+from commons.utils import DateTimeFormatter, GITHUB_DATETIME_FORMAT, TAIGA_DATETIME_FORMAT
+
+
+def outcome(func, *args):
+    """func's result, or the type of the exception it raised"""
+    try:
+        return func(*args)
+    except ValueError as ex:
+        return type(ex)
+
+
+def make_inputs(rng, count):
+    """Well-formed timestamps with and without fractional seconds, with Z or an offset,
+    and near misses: out of range fields, short fields, truncated and padded strings"""
+    inputs = []
+    for _ in range(count):
+        stamp = datetime.fromtimestamp(rng.randint(0, 4102444800) + rng.random(), timezone.utc)
+        text = stamp.strftime("%Y-%m-%dT%H:%M:%S")
+        fraction = rng.choice(("", "." + str(rng.randint(0, 9)), stamp.strftime(".%f"),
+                               stamp.strftime(".%f")[:rng.randint(2, 7)], ".1234567", "."))
+        zone = rng.choice(("Z", "Z", "+00:00", "+0000", "-05:30", "", "z", "Z "))
+        inputs.append(text + fraction + zone)
+    inputs += ["2020-02-29T12:00:00Z", "2019-02-29T12:00:00Z", "2020-13-01T00:00:00Z",
+               "2020-12-32T00:00:00Z", "2020-12-31T24:00:00Z", "2020-12-31T23:60:00Z",
+               "2020-12-31T23:59:60Z", "2020-12-31T23:59:61.5Z", "2020-1-1T1:2:3Z",
+               "2020-01-01T01:02:03.Z", "0000-01-01T00:00:00Z", "2020-01-01 00:00:00Z",
+               "2020-01-01T00:00:00.000000Z", "2020-01-01T00:00:00.999999Z", " 2020-01-01T00:00:00Z",
+               "2020-01-01T00:00:00Z\n", "", "Z"]
+    return inputs
+
+
+class DateTimeFormatterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.inputs = make_inputs(random.Random(2021), 5000)
+
+    def test_dates_match_strptime(self):
+        for _format, func in ((GITHUB_DATETIME_FORMAT, DateTimeFormatter.format_github_date_to_str),
+                              (TAIGA_DATETIME_FORMAT, DateTimeFormatter.format_isodate_to_date)):
+            for date_str in self.inputs:
+                expected = outcome(lambda: datetime.strptime(date_str, _format).date().isoformat())
+                # twice: computed, then from the cache
+                self.assertEqual(outcome(func, date_str), expected, (_format, date_str))
+                self.assertEqual(outcome(func, date_str), expected, (_format, date_str))
+
+    def test_github_datetimes_match_strptime(self):
+        for date_str in self.inputs:
+            expected = outcome(lambda: datetime.strptime(date_str, GITHUB_DATETIME_FORMAT)
+                               .replace(tzinfo=timezone.utc))
+            self.assertEqual(outcome(DateTimeFormatter.parse_github_datetime, date_str), expected, date_str)
+
+    def test_inputs_cover_both_fast_paths(self):
+        parsed = {_format: sum(outcome(datetime.strptime, date_str, _format) is not ValueError
+                               for date_str in self.inputs)
+                  for _format in (GITHUB_DATETIME_FORMAT, TAIGA_DATETIME_FORMAT)}
+        self.assertGreater(min(parsed.values()), 200)
+
+    def test_none_is_passed_through(self):
+        self.assertIsNone(DateTimeFormatter.format_github_date_to_str(None))
+        self.assertIsNone(DateTimeFormatter.format_isodate_to_date(None))
@@ -0,0 +1,146 @@
+"""Tests of the keep-alive HTTP client"""
+
+import http.client
+import unittest
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import Request
+
+from GTAnalyzer.settings import HTTP_CLIENT
+from commons.http_client import HTTPClient
+from commons.tests.server import StandInServer, TemporaryCertificate, has_openssl
+
+
+def echo(request):
+    if request.route == "/hangup":
+        return None
+    if request.route == "/missing":
+        return 404, {}, {"message": "Not Found"}
+    return 200, {}, {"path": request.path, "method": request.method}
+
+
+class HTTPClientTestMixin(object):
+    """Runs against self.server through self.client"""
+
+    def _get_pool(self):
+        return next(iter(self.client._pools.values()))
+
+    def test_reuses_connection(self):
+        for i in range(5):
+            response = self.client.urlopen(Request("{}/item/{}".format(self.server.base_url, i)))
+            self.assertEqual(response.status, 200)
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_reconnects_after_server_closed_idle_connection(self):
+        self.client.urlopen(Request(self.server.base_url + "/first"))
+        self.server.drop_connections()
+        response = self.client.urlopen(Request(self.server.base_url + "/second"))
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(self.server.connections), 2)
+
+    def test_error_response_returns_connection_to_pool(self):
+        with self.assertRaises(HTTPError) as ctx:
+            self.client.urlopen(Request(self.server.base_url + "/missing"))
+        self.assertEqual(ctx.exception.code, 404)
+        self.assertEqual(len(self._get_pool()._idle), 1)
+        self.client.urlopen(Request(self.server.base_url + "/after"))
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_failed_request_doesnt_return_connection_to_pool(self):
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.client.urlopen(Request(self.server.base_url + "/hangup"))
+        self.assertEqual(self._get_pool()._idle, [])
+        response = self.client.urlopen(Request(self.server.base_url + "/after"))
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(self.server.connections), 2)
+
+    def test_post_retried_on_dropped_connection_only_if_unsent(self):
+        self.client.urlopen(Request(self.server.base_url + "/first"))
+        self.server.drop_connections()
+        try:
+            response = self.client.urlopen(Request(self.server.base_url + "/post", data=b"{}", method="POST"))
+        except (http.client.RemoteDisconnected, ConnectionError):
+            # sent on the dropped connection; the server may have processed it
+            self.assertEqual(self._get_pool()._idle, [])
+        else:
+            # the send itself failed, so it was safe to resend on a new connection
+            self.assertEqual(response.status, 200)
+            self.assertEqual([request.route for request in self.server.requests], ["/first", "/post"])
+
+class HTTPClientTest(HTTPClientTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(echo).start()
+        self.client = HTTPClient()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+
+@unittest.skipUnless(has_openssl(), "needs openssl to make a certificate")
+class HTTPSClientTest(HTTPClientTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.certificate = TemporaryCertificate().__enter__()
+        self.server = StandInServer(echo, self.certificate.certfile, self.certificate.keyfile).start()
+        with mock.patch.dict(HTTP_CLIENT, {"CA_FILE": self.certificate.certfile}):
+            self.client = HTTPClient()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        self.certificate.__exit__(None, None, None)
+
+
+class ConditionalCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.evict_before_answering = False
+        self.server = StandInServer(self._handle).start()
+        self.client = HTTPClient()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def _handle(self, request):
+        etag = '"v1"'
+        if request.headers.get("If-None-Match") == etag:
+            if self.evict_before_answering:
+                # another thread's response pushes the entry out while the 304 is on its way
+                self.client.conditional_cache._cache._data.clear()
+            return 304, {"ETag": etag, "X-RateLimit-Remaining": "99"}, b""
+        return 200, {"ETag": etag}, {"route": request.route, "padding": "x" * 1000}
+
+    def _get(self, route):
+        return self.client.urlopen(Request(self.server.base_url + route, headers={"Authorization": "token t"}),
+                                   conditional=True)
+
+    def test_not_modified_served_from_cache(self):
+        first = self._get("/list").read()
+        second = self._get("/list")
+        self.assertEqual(second.status, 200)
+        self.assertEqual(second.read(), first)
+        self.assertEqual(second.getheader("X-RateLimit-Remaining"), "99")
+        self.assertEqual(self.client.conditional_cache.get_stats()["hits"], 1)
+
+    def test_not_modified_served_after_entry_was_evicted(self):
+        first = self._get("/list").read()
+        self.evict_before_answering = True
+        second = self._get("/list")
+        self.assertEqual(second.status, 200)
+        self.assertEqual(second.read(), first)
+
+    def test_bytes_are_bounded(self):
+        with mock.patch.dict(HTTP_CLIENT, {"CONDITIONAL_CACHE_BYTES": 2500}):
+            self.client = HTTPClient()
+        for i in range(5):
+            self._get("/list/{}".format(i))
+        stats = self.client.conditional_cache.get_stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertLessEqual(stats["bytes"], 2500)
+        # the most recent ones are kept
+        self._get("/list/4")
+        self.assertEqual(self.client.conditional_cache.get_stats()["hits"], 1)
@@ -0,0 +1,99 @@
+"""Tests of the streaming JSON reader against json.loads"""
+
+import codecs
+import json
+import random
+import unittest
+
+from commons.jsonstream import JSONStreamReader
+
+KEYS = ("items", "tasks", "other", "attachments", "é", 'q"uote', "back\\slash")
+ARRAY_KEYS = ("items", "tasks")
+SKIP_KEYS = ("attachments", 'q"uote')
+# escapes, multibyte and astral (surrogate pair when escaped) characters
+CHARACTERS = 'ab "\\/\n\t\b\x00\x1fé€ \U0001F600\U00010348'
+
+
+class ChunkedFile(object):
+    """A UTF-8 text file read a few bytes at a time, so reads end inside
+    escapes and multibyte characters. Each read returns at most size characters"""
+
+    def __init__(self, data, rng, max_bytes):
+        self._data = data.encode("utf-8")
+        self._pos = 0
+        self._rng = rng
+        self._max_bytes = max_bytes
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""
+
+    def read(self, size):
+        while not self._pending and self._pos < len(self._data):
+            end = self._pos + self._rng.randint(1, self._max_bytes)
+            self._pending = self._decoder.decode(self._data[self._pos:end], end >= len(self._data))
+            self._pos = end
+        text, self._pending = self._pending[:size], self._pending[size:]
+        return text
+
+
+def random_string(rng):
+    return "".join(rng.choice(CHARACTERS) for _ in range(rng.randint(0, 12)))
+
+
+def random_value(rng, depth=0):
+    kind = rng.randint(0, 7 if depth < 3 else 4)
+    if kind == 0:
+        return rng.choice((True, False, None))
+    if kind == 1:
+        return rng.randint(-10 ** 12, 10 ** 12)
+    if kind == 2:
+        return rng.choice((rng.uniform(-1e6, 1e6), rng.uniform(-1e-6, 1e-6), 1e300, -0.0, 0.5))
+    if kind in (3, 4):
+        return random_string(rng)
+    if kind in (5, 6):
+        return {rng.choice(KEYS + (random_string(rng),)): random_value(rng, depth + 1)
+                for _ in range(rng.randint(0, 4))}
+    return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+
+
+def random_document(rng):
+    """A top-level object whose array keys hold mostly objects"""
+    document = dict()
+    for key in rng.sample(KEYS, rng.randint(0, len(KEYS))):
+        if key in ARRAY_KEYS and rng.random() < 0.8:
+            document[key] = [random_value(rng, 1) if rng.random() < 0.3 else
+                             {rng.choice(KEYS): random_value(rng, 2) for _ in range(rng.randint(0, 5))}
+                             for _ in range(rng.randint(0, 5))]
+        else:
+            document[key] = random_value(rng, 1)
+    return document
+
+
+def expected_items(text):
+    """What iter_arrays should yield, from json.loads"""
+    items = []
+    for key, value in json.loads(text).items():
+        if key in ARRAY_KEYS and isinstance(value, list):
+            items.extend((key, {k: v for k, v in element.items() if k not in SKIP_KEYS}
+                          if isinstance(element, dict) else element) for element in value)
+    return items
+
+
+class JSONStreamReaderTest(unittest.TestCase):
+
+    def test_matches_json_loads_on_random_documents(self):
+        rng = random.Random(2020)
+        for i in range(3000):
+            text = json.dumps(random_document(rng), ensure_ascii=rng.random() < 0.5,
+                              indent=rng.choice((None, None, 0, 2)),
+                              separators=rng.choice(((",", ":"), (", ", ": "), (" , ", " : "))))
+            chunk_size = rng.randint(1, 64)
+            reader = JSONStreamReader(ChunkedFile(text, rng, rng.randint(1, 8)), chunk_size)
+            with self.subTest(document=i, chunk_size=chunk_size, text=text):
+                self.assertEqual(list(reader.iter_arrays(ARRAY_KEYS, skip_keys=SKIP_KEYS)),
+                                 expected_items(text))
+
+    def test_escapes_split_at_every_offset(self):
+        text = json.dumps({"other": ["\\\"" * 3, "\U0001F600é"], "items": [{"a": "x\\\"\U0001F600"}]})
+        for chunk_size in range(1, len(text) + 1):
+            reader = JSONStreamReader(ChunkedFile(text, random.Random(chunk_size), 1), chunk_size)
+            self.assertEqual(list(reader.iter_arrays(ARRAY_KEYS)), [("items", {"a": "x\\\"\U0001F600"})])
@@ -0,0 +1,31 @@
+"""Tests of the paginated listing iterator"""
+
+import unittest
+
+from commons.paging import PageIterator
+
+
+class PageIteratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fetched = []
+
+    def _get_page(self, url):
+        self.fetched.append(url)
+        if url == "bad":
+            return {"type": "HTTPError", "message": "Not Found"}, True
+        number = int(url)
+        return ([number * 10, number * 10 + 1], str(number + 1) if number < 3 else None), False
+
+    def test_follows_next_urls_lazily(self):
+        pages = PageIterator([0, 1], "1", self._get_page)
+        items = iter(pages)
+        self.assertEqual([next(items), next(items)], [0, 1])
+        self.assertEqual(self.fetched, [])
+        self.assertEqual(list(items), [10, 11, 20, 21, 30, 31])
+        self.assertEqual((self.fetched, pages.error), (["1", "2", "3"], None))
+
+    def test_error_on_a_later_page_ends_iteration(self):
+        pages = PageIterator([0], "bad", self._get_page)
+        self.assertEqual(list(pages), [0])
+        self.assertEqual(pages.error, {"type": "HTTPError", "message": "Not Found"})
@@ -0,0 +1,62 @@
+"""Tests of the rate-limit scheduler"""
+
+import time
+import unittest
+from unittest import mock
+
+from GTAnalyzer.settings import GH_RATE_LIMIT
+from commons.decorators import http_error_decorator
+from commons.ratelimit import RateLimitScheduler, RateLimitExceeded
+
+
+class FakeResponse(object):
+
+    def __init__(self, remaining, reset):
+        self.headers = {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": str(remaining),
+                        "X-RateLimit-Reset": str(reset)}
+
+
+class RateLimitSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = RateLimitScheduler()
+        self.sent = []
+
+    def _send(self, remaining, reset):
+        def send():
+            self.sent.append(time.time())
+            return FakeResponse(remaining, reset)
+        return send
+
+    def test_fails_fast_when_budget_is_exhausted_past_max_wait(self):
+        reset = time.time() + GH_RATE_LIMIT["MAX_WAIT"] + 600
+        self.scheduler.call("token", self._send(GH_RATE_LIMIT["RESERVE"], reset))
+        with mock.patch("commons.ratelimit.time.sleep") as sleep:
+            with self.assertRaises(RateLimitExceeded) as ctx:
+                self.scheduler.call("token", self._send(0, reset))
+        self.assertEqual(len(self.sent), 1)
+        sleep.assert_not_called()
+        self.assertEqual(ctx.exception.code, 429)
+        self.assertGreater(ctx.exception.delay, GH_RATE_LIMIT["MAX_WAIT"])
+
+    def test_waits_for_reset_within_max_wait(self):
+        reset = time.time() + 60
+        self.scheduler.call("token", self._send(GH_RATE_LIMIT["RESERVE"], reset))
+        with mock.patch("commons.ratelimit.time.sleep") as sleep:
+            self.scheduler.call("token", self._send(4999, reset + 3600))
+        self.assertEqual(len(self.sent), 2)
+        self.assertAlmostEqual(sleep.call_args[0][0], 60, delta=2)
+
+    def test_other_tokens_are_unaffected(self):
+        reset = time.time() + GH_RATE_LIMIT["MAX_WAIT"] + 600
+        self.scheduler.call("token", self._send(0, reset))
+        self.scheduler.call("other", self._send(4999, reset))
+        self.assertEqual(len(self.sent), 2)
+
+    def test_reported_as_http_error(self):
+        reset = time.time() + GH_RATE_LIMIT["MAX_WAIT"] + 600
+        self.scheduler.call("token", self._send(0, reset))
+        result, is_error = http_error_decorator(self.scheduler.call)("token", self._send(0, reset))
+        self.assertTrue(is_error)
+        self.assertEqual(result["type"], "HTTPError")
+        self.assertIn("Rate limit exhausted", result["message"])
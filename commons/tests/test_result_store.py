@@ -0,0 +1,189 @@
+"""Tests of the analysis result backends"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from GTAnalyzer.settings import ANALYSIS_RESULTS
+from commons import result_store
+from commons.result_store import (MemoryResultBackend, SqliteResultBackend, RedisResultBackend, RedisClient,
+                                   RedisError)
+from commons.tests.redis_server import RedisStandIn
+
+
+class CursorAfterEvictionMixin(object):
+    """A request evicted and written again must not reuse
+    sequence numbers a client already holds as its cursor"""
+
+    def test_cursor_survives_eviction(self):
+        self.backend.set("r", "a", 1)
+        self.backend.set("r", "b", 2)
+        _results, cursor = self.backend.get_since("r", 0)
+        with mock.patch.dict(ANALYSIS_RESULTS, {"MAX_BYTES": 0}):
+            self.backend.set("other", "a", 1)
+        self.assertEqual(self.backend.get("r"), {})
+        self.backend.set("r", "c", 3)
+        self.assertEqual(self.backend.get_since("r", cursor)[0], {"c": 3})
+
+
+class TTLAfterWriteMixin(object):
+    """Results expire TTL seconds after the request's last write, whatever the backend;
+    reads don't extend it. advance(seconds) moves the backend's clock"""
+
+    def test_reads_do_not_extend_the_ttl(self):
+        self.backend.set("r", "a", 1)
+        self.advance(ANALYSIS_RESULTS["TTL"] - 10)
+        self.assertEqual(self.backend.get("r"), {"a": 1})
+        self.assertEqual(self.backend.get_since("r", 0)[0], {"a": 1})
+        self.assertIsNotNone(self.backend.get_usage("r"))
+        self.advance(20)
+        self.assertEqual(self.backend.get("r"), {})
+        self.assertIsNone(self.backend.get("r", "a"))
+        self.assertEqual(self.backend.get_since("r", 0)[0], {})
+        self.assertIsNone(self.backend.get_usage("r"))
+
+    def test_writes_extend_the_ttl(self):
+        self.backend.set("r", "a", 1)
+        self.advance(ANALYSIS_RESULTS["TTL"] - 10)
+        self.backend.set("r", "b", 2)
+        self.advance(20)
+        self.assertEqual(self.backend.get("r"), {"a": 1, "b": 2})
+
+
+class Clock(object):
+    """Stands in for the time module in commons.result_store"""
+
+    def __init__(self):
+        self.offset = 0
+
+    def time(self):
+        return time.time() + self.offset
+
+
+class ClockMixin(object):
+
+    def setUp(self):
+        self.clock = Clock()
+        patch = mock.patch.object(result_store, "time", self.clock)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def advance(self, seconds):
+        self.clock.offset += seconds
+
+
+class MemoryResultBackendTest(ClockMixin, CursorAfterEvictionMixin, TTLAfterWriteMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backend = MemoryResultBackend()
+
+
+class SqliteResultBackendTest(ClockMixin, CursorAfterEvictionMixin, TTLAfterWriteMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.backend = SqliteResultBackend(os.path.join(self.directory, "results.sqlite3"))
+
+    def tearDown(self):
+        self.backend._conn.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_get_since_returns_results_after_cursor(self):
+        self.backend.set("r", "a", {"x": 1})
+        results, cursor = self.backend.get_since("r", 0)
+        self.assertEqual(results, {"a": {"x": 1}})
+        self.backend.set("r", "b", [2])
+        self.assertEqual(self.backend.get_since("r", cursor), ({"b": [2]}, cursor + 1))
+        self.assertEqual(self.backend.get_since("r", cursor + 1), ({}, cursor + 1))
+
+    def test_reads_do_not_write(self):
+        self.backend.set("r", "a", 1)
+        changes = self.backend._conn.total_changes
+        for _ in range(5):
+            self.backend.get_since("r", 0)
+            self.backend.get("r")
+            self.backend.get("r", "a")
+            self.backend.get_usage("r")
+        self.assertEqual(self.backend._conn.total_changes, changes)
+        self.assertFalse(self.backend._conn.in_transaction)
+
+
+class RedisResultBackendTest(TTLAfterWriteMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.redis = RedisStandIn().start()
+        self.addCleanup(self.redis.stop)
+        self.client = RedisClient(self.redis.url)
+        self.addCleanup(self.client._close)
+        self.backend = RedisResultBackend(self.client)
+
+    def advance(self, seconds):
+        self.redis.advance(seconds)
+
+    def test_set_and_get(self):
+        self.backend.set("r", "a", {"x": 1})
+        self.backend.set("r", "b", [2])
+        self.backend.set("r", "a", {"x": 3})
+        self.assertEqual(self.backend.get("r"), {"a": {"x": 3}, "b": [2]})
+        self.assertEqual(self.backend.get("r", "b"), [2])
+        self.assertIsNone(self.backend.get("r", "c"))
+        self.assertEqual(self.backend.get("other"), {})
+        usage = self.backend.get_usage("r")
+        self.assertEqual((usage["groups"], usage["bytes"]), (2, len('{"x":3}[2]')))
+        self.backend.delete("r")
+        self.assertEqual(self.backend.get("r"), {})
+        self.assertIsNone(self.backend.get_usage("r"))
+
+    def test_requests_expire(self):
+        self.backend.set("r", "a", 1)
+        self.assertAlmostEqual(self.backend.get_usage("r")["expires_in"], ANALYSIS_RESULTS["TTL"], delta=1)
+        self.redis.advance(ANALYSIS_RESULTS["TTL"] + 1)
+        self.assertEqual(self.backend.get("r"), {})
+        self.assertEqual(self.backend.get_since("r", 0), ({}, 0))
+
+    def test_get_since_returns_results_after_cursor(self):
+        self.backend.set("r", "a", 1)
+        results, cursor = self.backend.get_since("r", 0)
+        self.assertEqual((results, cursor), ({"a": 1}, 1))
+        self.assertEqual(self.backend.get_since("r", cursor), ({}, cursor))
+        self.backend.set("r", "b", 2)
+        self.backend.set("r", "a", 3)
+        self.assertEqual(self.backend.get_since("r", cursor), ({"a": 3, "b": 2}, 3))
+
+    def test_cursor_past_an_expired_log_starts_over(self):
+        self.backend.set("r", "a", 1)
+        self.backend.set("r", "b", 2)
+        _results, cursor = self.backend.get_since("r", 0)
+        self.redis.advance(ANALYSIS_RESULTS["TTL"] + 1)
+        self.backend.set("r", "c", 3)
+        self.assertEqual(self.backend.get_since("r", cursor), ({"c": 3}, 1))
+
+    def test_reconnects_after_the_server_closes_an_idle_connection(self):
+        self.backend.set("r", "a", 1)
+        self.redis.drop_connections()
+        # the first command after the close goes through
+        with self.assertLogs("commons.result_store", "INFO"):
+            self.backend.set("r", "b", 2)
+        self.assertEqual(self.backend.get("r"), {"a": 1, "b": 2})
+        self.redis.drop_connections()
+        with self.assertLogs("commons.result_store", "INFO"):
+            self.assertEqual(self.backend.get_since("r", 0), ({"a": 1, "b": 2}, 2))
+        # once each
+        self.assertEqual([command[2] for command in self.redis.commands if command[0] == "RPUSH"], [b"a", b"b"])
+
+    def test_error_replies_keep_the_connection(self):
+        with self.assertRaises(RedisError):
+            self.client.execute("NOSUCHCOMMAND")
+        connections = len(self.redis.connections)
+        self.assertEqual(self.client.execute("LLEN", "missing"), 0)
+        self.assertEqual(len(self.redis.connections), connections)
+
+    def test_fresh_connection_failures_are_raised(self):
+        self.redis.stop()
+        with self.assertRaises(OSError):
+            self.client.execute("LLEN", "missing")
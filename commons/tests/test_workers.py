@@ -0,0 +1,101 @@
+"""Tests of the analysis worker pool and how jobs are assigned to users"""
+
+import threading
+import unittest
+from unittest import mock
+
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from GTAnalyzer.settings import ANALYSIS_WORKERS
+from commons.utils import Analyzer, AnalysisProgressTracker, DataExtractor
+from commons.workers import AnalysisWorkerPool
+
+
+class UserKeyTest(unittest.TestCase):
+
+    def test_credentials_identify_the_user(self):
+        self.assertEqual(Analyzer._get_user_key({"token": "t1"}, "10.0.0.1"),
+                         Analyzer._get_user_key({"token": "t1"}, "10.0.0.2"))
+        self.assertNotEqual(Analyzer._get_user_key({"token": "t1"}, "10.0.0.1"),
+                            Analyzer._get_user_key({"auth_token": "t2"}, "10.0.0.1"))
+
+    def test_anonymous_clients_are_told_apart_by_address(self):
+        self.assertNotEqual(Analyzer._get_user_key({}, "10.0.0.1"), Analyzer._get_user_key({}, "10.0.0.2"))
+        self.assertEqual(Analyzer._get_user_key({"token": None}, "10.0.0.1"),
+                         Analyzer._get_user_key({}, "10.0.0.1"))
+
+    def test_client_ident(self):
+        request = Request(RequestFactory().post("/", REMOTE_ADDR="10.0.0.7"))
+        self.assertEqual(DataExtractor.get_client_ident(request), "10.0.0.7")
+
+
+class AnalysisWorkerPoolTest(unittest.TestCase):
+
+    def test_users_are_served_round_robin(self):
+        pool = AnalysisWorkerPool(1)
+        self.addCleanup(pool.shutdown, 5)
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+        pool.submit("blocker", lambda: (started.set(), release.wait(5)))
+        started.wait(5)
+        for i in range(3):
+            pool.submit(Analyzer._get_user_key({}, "10.0.0.1"), order.append, ("first", i))
+        pool.submit(Analyzer._get_user_key({}, "10.0.0.2"), order.append, ("second", 0))
+        release.set()
+        pool.shutdown(5)
+        # the second anonymous client doesn't wait behind all of the first one's jobs
+        self.assertEqual(order[:2], [("first", 0), ("second", 0)])
+
+
+class FailingPerformer(object):
+    """Analyses an entity to its name in upper case, and fails on "broken" """
+
+    @staticmethod
+    def perform_analysis(entity, data):
+        if entity["name"] == "broken":
+            raise ValueError("no such repository")
+        return entity["name"].upper()
+
+
+class ResultRecorder(object):
+    """Stands in for the AnalysisProgressTracker; fails to store the results of the groups in failing"""
+
+    def __init__(self, failing=()):
+        self.results = {}
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+
+    def set_analysis_results(self, request_id, group_id, value):
+        if group_id in self.failing:
+            raise OSError("disk full")
+        with self.lock:
+            self.results[(request_id, group_id)] = value
+
+
+class PerformAnalysisThreadedTest(unittest.TestCase):
+
+    def perform(self, names, tracker, width):
+        data = {"request_id": "r1", "repositories": [{"name": name} for name in names]}
+        with mock.patch.object(AnalysisProgressTracker, "get_instance", return_value=tracker), \
+                mock.patch.dict(ANALYSIS_WORKERS, {"ENTITY_WIDTH": width}), \
+                self.assertLogs("commons.utils", "ERROR") as logs:
+            Analyzer._perform_analysis_threaded(data, "repositories", "name", FailingPerformer)
+        return logs.output
+
+    def test_failing_entity_gets_an_error_and_the_others_their_results(self):
+        for width in (1, 4):
+            tracker = ResultRecorder()
+            self.perform(["a", "broken", "b", "c"], tracker, width)
+            error = tracker.results.pop(("r1", "broken"))
+            self.assertEqual(error["type"], "Exception")
+            self.assertTrue(error["message"])
+            self.assertEqual(tracker.results, {("r1", "a"): "A", ("r1", "b"): "B", ("r1", "c"): "C"})
+
+    def test_failing_store_does_not_abort_the_job(self):
+        for width in (1, 4):
+            tracker = ResultRecorder(failing={"a"})
+            output = self.perform(["a", "b", "c"], tracker, width)
+            self.assertEqual(tracker.results, {("r1", "b"): "B", ("r1", "c"): "C"})
+            self.assertTrue(any("Results of 'a' couldn't be stored" in line for line in output))
@@ -1,15 +1,38 @@
 """Support methods"""
+import functools
 import json
 import logging
+import math
+import re
+import sys
+import threading
+import time
+import traceback
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timezone
 
+from rest_framework.throttling import BaseThrottle
+
+from GTAnalyzer.settings import ANALYSIS_RESULTS, ANALYSIS_WORKERS
 from TAnalyzer.APIPayloadKeyConstants import *
 from GAnalyzer.APIPayloadKeyConstants import *
-from commons.decorators import new_thread_decorator
+from commons.executors import bounded_map
+from commons.ratelimit import hash_token
+from commons.result_store import create_result_backend
+from commons.workers import AnalysisWorkerPool
 
 LOGGER = logging.getLogger(__name__)
 
+GITHUB_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+TAIGA_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+# the fixed-width timestamps of the GitHub and Taiga APIs, parsed without strptime
+FAST_DATETIME_PATTERNS = {
+    GITHUB_DATETIME_FORMAT: re.compile(r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})Z\Z"),
+    TAIGA_DATETIME_FORMAT: re.compile(r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})\.\d{1,6}Z\Z"),
+}
+# distinct timestamps remembered; history events and commits often share them
+DATE_CACHE_SIZE = 8192
+
 
 class FieldExtractor(object):
     """Extract field from payload"""
@@ -120,34 +143,65 @@ class DataExtractor(object):
     def get_file_upload_object(request):
         return request.FILES
 
+    @staticmethod
+    def get_client_ident(request):
+        """Address of the client, honouring X-Forwarded-For as far as NUM_PROXIES allows"""
+        return BaseThrottle().get_ident(request)
+
 
 class AnalysisProgressTracker(object):
-    """A non-thread safe singleton class to track the progress of an analysis"""
+    """A thread-safe singleton class to track the progress of an analysis
+    Results live in the result backend chosen in settings; with a shared
+    backend (sqlite, redis) a result written by any worker is readable by all"""
     __instance = None
-    # dict of dict
-    __analysis_results = None
+    __instance_lock = threading.Lock()
+    __backend = None
 
     @staticmethod
     def get_instance():
         """Get the singleton instance"""
-        if AnalysisProgressTracker.__instance is None:
-            return AnalysisProgressTracker()
-        return AnalysisProgressTracker.__instance
+        with AnalysisProgressTracker.__instance_lock:
+            if AnalysisProgressTracker.__instance is None:
+                return AnalysisProgressTracker()
+            return AnalysisProgressTracker.__instance
 
     def __init__(self):
         """Constructor"""
         if AnalysisProgressTracker.__instance is not None:
             raise Exception('Trying to initialize a Singleton class.')
         AnalysisProgressTracker.__instance = self
-        self.__analysis_results = defaultdict(dict)
+        self.__backend = create_result_backend()
+        # notified on every write from this process
+        self.__changed = threading.Condition()
 
     def get_analysis_results(self, request_id, group_id=None):
-        if group_id is not None:
-            return self.__analysis_results[request_id][group_id]
-        return self.__analysis_results[request_id]
+        return self.__backend.get(request_id, group_id)
 
     def set_analysis_results(self, request_id, group_id, value):
-        self.__analysis_results[request_id][group_id] = value
+        self.__backend.set(request_id, group_id, value)
+        with self.__changed:
+            self.__changed.notify_all()
+
+    def wait_for_analysis_results(self, request_id, cursor, timeout):
+        """Results written after cursor, waiting up to timeout seconds for some.
+        Returns (results, cursor to pass next time)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            results, new_cursor = self.__backend.get_since(request_id, cursor)
+            remaining = deadline - time.monotonic()
+            if results or new_cursor != cursor or remaining <= 0:
+                return results, new_cursor
+            # writes from this process wake us at once, writes from
+            # other processes are picked up at the next check
+            with self.__changed:
+                self.__changed.wait(min(remaining, ANALYSIS_RESULTS["LONG_POLL_INTERVAL"]))
+
+    def delete_analysis_results(self, request_id):
+        self.__backend.delete(request_id)
+
+    def get_usage(self, request_id):
+        """Size of the stored results of a request, None if there are none"""
+        return self.__backend.get_usage(request_id)
 
 
 class CreateRepoResponse(object):
@@ -167,115 +221,220 @@ class AnalysisResultsPoller(object):
     def poll(data):
         request_id = data.get('request_id')
         apt_object = AnalysisProgressTracker.get_instance()
-        return apt_object.get_analysis_results(request_id), False
+        results = apt_object.get_analysis_results(request_id)
+        # the client is done with the results, free them instead of waiting for the TTL
+        if data.get('delete'):
+            apt_object.delete_analysis_results(request_id)
+        return results, False
+
+    @staticmethod
+    def long_poll(data):
+        """Only the results newer than data['cursor'], waiting for some if there are none yet.
+        An invalid cursor or timeout is an error"""
+        request_id = data.get('request_id')
+        try:
+            cursor = int(data.get('cursor') or 0)
+            timeout = float(data.get('timeout', ANALYSIS_RESULTS["LONG_POLL_TIMEOUT"]))
+        except (TypeError, ValueError):
+            return {'error': "cursor must be an integer and timeout a number of seconds"}, True
+        if cursor < 0 or not math.isfinite(timeout):
+            return {'error': "cursor must not be negative and timeout must be finite"}, True
+        timeout = min(timeout, ANALYSIS_RESULTS["LONG_POLL_TIMEOUT"])
+        apt_object = AnalysisProgressTracker.get_instance()
+        results, cursor = apt_object.wait_for_analysis_results(request_id, cursor, max(timeout, 0))
+        return {'results': results, 'cursor': cursor}, False
+
+    @staticmethod
+    def get_usage(data):
+        request_id = data.get('request_id')
+        usage = AnalysisProgressTracker.get_instance().get_usage(request_id)
+        if usage is None:
+            return {'error': "No results for request '{}'".format(request_id)}, True
+        return usage, False
 
 
 class Analyzer(object):
     """Perform analysis"""
 
     @staticmethod
-    def perform_analysis_async(data, list_key, entity_key, performer_class):
+    def perform_analysis_async(data, list_key, entity_key, performer_class, client_ident):
+        """Queue the analysis on the shared worker pool.
+        client_ident tells apart requests that carry no credentials.
+        Raises AnalysisQueueFull if it can't be queued"""
         # number of entities to Analyse
         num_combinations = len(data.get(list_key))
         request_id = data.get('request_id')
-        Analyzer._perform_analysis_threaded(data, list_key,
-                                            entity_key, performer_class)
+        AnalysisWorkerPool.get_instance().submit(Analyzer._get_user_key(data, client_ident),
+                                                 Analyzer._perform_analysis_threaded,
+                                                 data, list_key, entity_key, performer_class)
         return {'saved': True,
                 'combinations': num_combinations,
                 'request_id': request_id}, False
 
     @staticmethod
-    @new_thread_decorator
+    def _get_user_key(data, client_ident):
+        """Identify the requesting user by their (GitHub or Taiga) credentials,
+        or by their address if there are none, so anonymous clients don't share a queue"""
+        credentials = data.get(GH_TOKEN) or data.get(TG_AUTH_TOKEN)
+        if not credentials:
+            return "client:{}".format(client_ident)
+        return hash_token(credentials)
+
+    @staticmethod
     def _perform_analysis_threaded(data, list_key, entity_key,
                                    performer_class):
-        # loop through each group in data and
-        # perform analysis of each group sequentially
-        # get singleton object
+        # analyse up to ENTITY_WIDTH groups at once, each result is saved as soon as it is ready.
+        # GitHub requests of all groups go through the same per-token RateLimitScheduler budget
         apt_object = AnalysisProgressTracker.get_instance()
-        for entity in data.pop(list_key):
+
+        def analyse(entity):
             entity_name = entity.get(entity_key)
-            result = performer_class.perform_analysis(entity, data)
-            apt_object.set_analysis_results(data['request_id'],
-                                            entity_name,
-                                            result)
-        return
+            try:
+                result = performer_class.perform_analysis(entity, data)
+            #pylint: disable=broad-except
+            except Exception:
+                # one failing group must not lose the results of the others
+                LOGGER.exception("Analysis of '%s' failed", entity_name)
+                _exc_type, _exc_value, exc_traceback = sys.exc_info()
+                result = {'type': 'Exception',
+                          'message': traceback.format_tb(exc_traceback)}
+            try:
+                apt_object.set_analysis_results(data['request_id'],
+                                                entity_name,
+                                                result)
+            #pylint: disable=broad-except
+            except Exception:
+                # nor one result the backend can't store
+                LOGGER.exception("Results of '%s' couldn't be stored", entity_name)
+
+        bounded_map(analyse, data.pop(list_key), ANALYSIS_WORKERS["ENTITY_WIDTH"])
 
 
 class TaigaDetails(object):
-    """Taiga Details"""
-    def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__,
-                          sort_keys=True, indent=4)
+    """Taiga Details. Fields are listed in __slots__ and default to None;
+    those in _NESTED hold lists of details"""
+    __slots__ = ()
+    _NESTED = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError("Unknown fields: {}".format(", ".join(fields)))
+
+    def to_dict(self):
+        """Plain dict of all fields, nested details included; ready to serialise"""
+        plain = {name: getattr(self, name) for name in self.__slots__}
+        for name in self._NESTED:
+            if plain[name] is not None:
+                plain[name] = [details.to_dict() for details in plain[name]]
+        return plain
 
 
 class ProjectDetails(TaigaDetails):
     """Project Details Object"""
-    id = None,  # String
-    name = None,  # String
-    members = None,  # List
-    milestones = None,  # List of MilestoneDetails object
+    __slots__ = (
+        "id",  # String
+        "name",  # String
+        "members",  # List
+        "milestones",  # List of MilestoneDetails object
+    )
+    _NESTED = ("milestones",)
 
 
 class MilestoneDetails(TaigaDetails):
     """Milestone Details object"""
-    id = None,  # String
-    name = None,  # String
-    slug = None,  # String
-    is_closed = None,  # Bool
-    closed_points = None,  # Int
-    total_points = None,  # Int
-    created_date = None,  # String
-    modified_date = None,  # String
-    estimated_finish = None,  # String
-    estimated_start = None,  # String
-    user_stories = None,  # List of UserStoryDetails object
+    __slots__ = (
+        "id",  # String
+        "name",  # String
+        "slug",  # String
+        "is_closed",  # Bool
+        "closed_points",  # Int
+        "total_points",  # Int
+        "created_date",  # String
+        "modified_date",  # String
+        "estimated_finish",  # String
+        "estimated_start",  # String
+        "user_stories",  # List of UserStoryDetails object
+    )
+    _NESTED = ("user_stories",)
 
 
 class UserStoryDetails(TaigaDetails):
     """User Story Details"""
-    id = None,  # String
-    ref = None,  # String
-    assigned_to = None,  # String (username)
-    status = None,  # String
-    subject = None,  # String
-    total_points = None,  # Int
-    created_date = None,  # String
-    modified_date = None,  # String
-    finish_date = None,  # String
-    is_closed = None,  # Bool
-    history = None,
-    tasks = None,  # List of TaskDetails Object
+    __slots__ = (
+        "id",  # String
+        "ref",  # String
+        "assigned_to",  # String (username)
+        "status",  # String
+        "subject",  # String
+        "total_points",  # Int
+        "created_date",  # String
+        "modified_date",  # String
+        "finish_date",  # String
+        "is_closed",  # Bool
+        "history",  # List of HistoryEventDetails object
+        "tasks",  # List of TaskDetails Object
+    )
+    _NESTED = ("history", "tasks")
 
 
 class TaskDetails(TaigaDetails):
     """Task Details"""
-    id = None,  # String
-    ref = None,  # String
-    assigned_to = None,  # String (username)
-    status = None,  # String
-    subject = None,  # String
-    user_story = None,  # String
-    created_date = None,  # String
-    modified_date = None,  # String
-    finished_date = None,  # String
-    due_date = None,  # String
-    is_closed = None,  # Bool
-    history = None,  # List
+    __slots__ = (
+        "id",  # String
+        "ref",  # String
+        "assigned_to",  # String (username)
+        "status",  # String
+        "subject",  # String
+        "user_story",  # String
+        "created_date",  # String
+        "modified_date",  # String
+        "finished_date",  # String
+        "due_date",  # String
+        "is_closed",  # Bool
+        "history",  # List of HistoryEventDetails object
+    )
+    _NESTED = ("history",)
 
 
 class HistoryEventDetails(TaigaDetails):
     """History Event Details"""
-    created_at = None,  # String
-    diff = None,  # Dict
+    __slots__ = (
+        "created_at",  # String
+        "diff",  # Dict
+    )
 
 
 class DateTimeFormatter(object):
     """Format datetime objects"""
 
     @staticmethod
-    def format_isodate_to_date(date_str, _format="%Y-%m-%dT%H:%M:%S.%fZ"):
-        return date_str if date_str is None else datetime.strptime(date_str, _format).date().isoformat()
+    def format_isodate_to_date(date_str, _format=TAIGA_DATETIME_FORMAT):
+        return date_str if date_str is None else DateTimeFormatter._to_date_str(date_str, _format)
+
+    @staticmethod
+    def format_github_date_to_str(date_str, _format=GITHUB_DATETIME_FORMAT):
+        return date_str if date_str is None else DateTimeFormatter._to_date_str(date_str, _format)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+    def parse_github_datetime(date_str):
+        """Aware UTC datetime of a GitHub timestamp"""
+        match = FAST_DATETIME_PATTERNS[GITHUB_DATETIME_FORMAT].match(date_str)
+        if match is None:
+            return datetime.strptime(date_str, GITHUB_DATETIME_FORMAT).replace(tzinfo=timezone.utc)
+        return datetime(*map(int, match.groups()), tzinfo=timezone.utc)
 
     @staticmethod
-    def format_github_date_to_str(date_str, _format="%Y-%m-%dT%H:%M:%SZ"):
-        return date_str if date_str is None else datetime.strptime(date_str, _format).date().isoformat()
+    @functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+    def _to_date_str(date_str, _format):
+        """The ISO date of a timestamp in _format"""
+        pattern = FAST_DATETIME_PATTERNS.get(_format)
+        match = None if pattern is None else pattern.match(date_str)
+        if match is None:
+            # other formats, and strptime's error for malformed timestamps
+            return datetime.strptime(date_str, _format).date().isoformat()
+        # range checks, as strptime would do
+        datetime(*map(int, match.groups()))
+        return date_str[:10]
@@ -0,0 +1,126 @@
+"""Process-wide pool of background analysis workers"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from GTAnalyzer.settings import ANALYSIS_WORKERS
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AnalysisQueueFull(Exception):
+    """Raised when a job can't be queued"""
+
+
+class AnalysisWorkerPool(object):
+    """A thread-safe singleton pool of worker threads fed from per-user job queues.
+    Workers serve users round-robin, so one user's burst can't starve the others"""
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """Get the singleton instance"""
+        with AnalysisWorkerPool.__instance_lock:
+            if AnalysisWorkerPool.__instance is None:
+                AnalysisWorkerPool.__instance = AnalysisWorkerPool(ANALYSIS_WORKERS["SIZE"])
+            return AnalysisWorkerPool.__instance
+
+    @staticmethod
+    def shutdown_instance(timeout=None):
+        """Drain the singleton instance, if it was ever started"""
+        with AnalysisWorkerPool.__instance_lock:
+            instance = AnalysisWorkerPool.__instance
+        if instance is not None:
+            instance.shutdown(timeout)
+
+    def __init__(self, size):
+        """Constructor"""
+        # user key to deque of (func, args, kwargs); order of keys is the round-robin order
+        self._queues = OrderedDict()
+        self._num_queued = 0
+        self._num_active = 0
+        self._accepting = True
+        self._condition = threading.Condition()
+        self._workers = []
+        for i in range(size):
+            worker = threading.Thread(target=self._run, name="analysis-worker-{}".format(i))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        atexit.register(self.shutdown, ANALYSIS_WORKERS["DRAIN_TIMEOUT"])
+
+    def submit(self, user_key, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) on behalf of a user.
+        Raises AnalysisQueueFull if the pool or the user's queue is full"""
+        with self._condition:
+            if not self._accepting:
+                raise AnalysisQueueFull("Shutting down, not accepting new analyses.")
+            if self._num_queued >= ANALYSIS_WORKERS["MAX_QUEUED"]:
+                raise AnalysisQueueFull("Too many analyses queued, try again later.")
+            queue = self._queues.setdefault(user_key, deque())
+            if len(queue) >= ANALYSIS_WORKERS["MAX_QUEUED_PER_USER"]:
+                raise AnalysisQueueFull("Too many of your analyses queued, try again later.")
+            queue.append((func, args, kwargs))
+            self._num_queued += 1
+            self._condition.notify()
+
+    def _next_job(self):
+        """Block until there is a job; None once shut down and drained"""
+        with self._condition:
+            while not self._queues:
+                if not self._accepting:
+                    return None
+                self._condition.wait()
+            user_key, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            # next job of this user goes to the back of the line
+            if queue:
+                self._queues.move_to_end(user_key)
+            else:
+                del self._queues[user_key]
+            self._num_queued -= 1
+            self._num_active += 1
+            return job
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            func, args, kwargs = job
+            try:
+                func(*args, **kwargs)
+            #pylint: disable=broad-except
+            except Exception:
+                LOGGER.exception("Analysis job failed")
+            finally:
+                with self._condition:
+                    self._num_active -= 1
+
+    def shutdown(self, timeout=None):
+        """Stop accepting jobs, then wait up to timeout seconds
+        for the queued and running ones to finish"""
+        with self._condition:
+            if not self._accepting:
+                return
+            self._accepting = False
+            self._condition.notify_all()
+            LOGGER.info("Draining analysis workers: %s queued, %s running",
+                        self._num_queued, self._num_active)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        with self._condition:
+            if self._num_queued or self._num_active:
+                LOGGER.warning("Analysis workers not drained: %s queued, %s running",
+                               self._num_queued, self._num_active)
+
+    def get_stats(self):
+        """Queue depth and activity"""
+        with self._condition:
+            return {"queued": self._num_queued, "active": self._num_active,
+                    "users": len(self._queues), "workers": len(self._workers)}
@@ -0,0 +1,21 @@
+"""gunicorn configuration"""
+
+import os
+
+from GTAnalyzer.settings import ANALYSIS_WORKERS
+
+# give the analysis workers time to drain before the master kills the worker
+graceful_timeout = ANALYSIS_WORKERS["DRAIN_TIMEOUT"] + 5
+
+# A results/stream/ request holds its worker for up to LONG_POLL_TIMEOUT seconds.
+# With the default sync workers a handful of waiting clients would block every
+# other request, so each worker serves GUNICORN_THREADS requests at once. The views
+# only wait on I/O and locks, and the analysis pool is per process, so threads are safe
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+
+def worker_exit(server, worker):
+    """Let queued and running analyses finish before the worker process exits"""
+    from commons.workers import AnalysisWorkerPool
+    AnalysisWorkerPool.shutdown_instance(ANALYSIS_WORKERS["DRAIN_TIMEOUT"])